@@ -0,0 +1,262 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from Scraper.database import Database
+from Scraper.models import StatTotals, PlayerSeasonStats, TeamMatchStats, TeamSeasonStats
+from Scraper.logger import logger
+from Scraper.records import schema_for
+from Scraper.constants import (MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PLAYER_SEASON_STATS_TABLE_NAME,
+                               TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME)
+
+# summed player_stats columns, the same in every aggregate table
+TOTAL_COLUMNS = list(StatTotals.model_fields)
+# season totals also stored per 90 minutes in player_season_stats
+PER90_COLUMNS = ["goals", "assists", "xg", "xg_assist", "sca", "gca", "progressive_passes"]
+
+AGGREGATE_TABLES = {
+    PLAYER_SEASON_STATS_TABLE_NAME: PlayerSeasonStats,
+    TEAM_MATCH_STATS_TABLE_NAME: TeamMatchStats,
+    TEAM_SEASON_STATS_TABLE_NAME: TeamSeasonStats,
+}
+
+
+class Frame:
+    """
+    Rows to aggregate: group key and label (text) columns, a date per row and a float matrix of counted columns.
+    Missing stats (None) count as 0.
+    """
+    def __init__(self, keys: List[tuple], labels: List[tuple], dates: Sequence[Any], values: Sequence[Sequence[Any]],
+                 width: int):
+        self.keys = keys
+        self.labels = labels
+        self.dates = np.array(dates, dtype="datetime64[D]").reshape(-1)
+        self.values = np.nan_to_num(np.array(values, dtype=float).reshape(-1, width))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def concat(self, other: "Frame") -> "Frame":
+        frame = Frame.__new__(Frame)
+        frame.keys = self.keys + other.keys
+        frame.labels = self.labels + other.labels
+        frame.dates = np.concatenate([self.dates, other.dates])
+        frame.values = np.concatenate([self.values, other.values])
+        return frame
+
+    def group_by(self) -> Tuple[List[tuple], List[tuple], np.ndarray, np.ndarray]:
+        """
+        Sums values of rows with the same key.
+        Returns the distinct keys, labels and date of the latest row of every key and the summed values.
+        """
+        if not len(self):
+            return [], [], self.dates, self.values
+        groups: Dict[tuple, int] = {}
+        inverse = np.fromiter((groups.setdefault(k, len(groups)) for k in self.keys), dtype=np.intp, count=len(self.keys))
+        # rows of a group next to each other, oldest first
+        order = np.lexsort((self.dates, inverse))
+        sorted_groups = inverse[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        totals = np.add.reduceat(self.values[order], starts, axis=0)
+        latest = order[np.r_[starts[1:], len(order)] - 1]
+        return list(groups), [self.labels[i] for i in latest], self.dates[latest], totals
+
+
+class AggregateStore:
+    """
+    Summary tables computed from player_stats: player totals of a season (with per 90 rates), team totals of a match
+    and team totals of a season. Dashboards read a season in O(players) rows instead of summing every player row.
+
+    update adds only the given (newly inserted) matches to the stored totals. team_match_stats works as the ledger
+    of aggregated matches, a match already there is skipped, so an update can be repeated safely.
+    recompute builds all the tables from the raw rows, rebuild replaces the stored tables with it and validate
+    compares both, e.g. after re-scraped matches changed rows of already aggregated matches.
+    """
+    def __init__(self, db: Database):
+        self.db = db
+        for table, model in AGGREGATE_TABLES.items():
+            self.db.create_table(model, table)
+        self.schemas = {table: schema_for(model) for table, model in AGGREGATE_TABLES.items()}
+
+    def update(self, match_ids: Iterable[str]) -> int:
+        """ Adds matches to the aggregates in one transaction, returns the number of matches added. """
+        match_ids = list(dict.fromkeys(match_ids))
+        aggregated = {row[0] for row in self._select_in(
+            f"SELECT DISTINCT match_id FROM {TEAM_MATCH_STATS_TABLE_NAME}", "match_id", match_ids)}
+        new_ids = [m for m in match_ids if m not in aggregated]
+        players = self._player_rows(new_ids)
+        if not len(players):
+            return 0
+        team_match = self._team_match_rows(players)
+        player_frame = self._player_season_frame(players)
+        team_frame = self._team_season_frame(team_match)
+        player_frame = self._stored_player_season(player_frame.keys).concat(player_frame)
+        team_frame = self._stored_team_season(team_frame.keys).concat(team_frame)
+        with self.db.transaction():
+            self._write(TEAM_MATCH_STATS_TABLE_NAME, team_match)
+            self._write(PLAYER_SEASON_STATS_TABLE_NAME, self._player_season_rows(player_frame))
+            self._write(TEAM_SEASON_STATS_TABLE_NAME, self._team_season_rows(team_frame))
+        added = len({row[0] for row in team_match})
+        logger.info(f"Aggregates updated with {added} matches")
+        return added
+
+    def recompute(self) -> Dict[str, List[tuple]]:
+        """ All aggregate rows computed from scratch, by table, without writing them. """
+        players = self._player_rows(None)
+        team_match = self._team_match_rows(players)
+        return {
+            PLAYER_SEASON_STATS_TABLE_NAME: self._player_season_rows(self._player_season_frame(players)),
+            TEAM_MATCH_STATS_TABLE_NAME: team_match,
+            TEAM_SEASON_STATS_TABLE_NAME: self._team_season_rows(self._team_season_frame(team_match)),
+        }
+
+    def rebuild(self) -> None:
+        """ Replaces the stored aggregates with recomputed ones. """
+        tables = self.recompute()
+        with self.db.transaction():
+            for table, rows in tables.items():
+                self.db.execute(f"DELETE FROM {table}")
+                self._write(table, rows)
+        logger.info(f"Aggregates rebuilt: " + ", ".join(f"{t} {len(r)} rows" for t, r in tables.items()))
+
+    def validate(self, tolerance: float = 1e-6) -> List[Tuple[str, tuple]]:
+        """ Compares stored aggregates with recomputed ones, returns (table, key) of every differing row. """
+        differences = []
+        for table, rows in self.recompute().items():
+            schema = self.schemas[table]
+            key = [schema.columns.index(c) for c in AGGREGATE_TABLES[table].unique]
+            expected = {tuple(row[i] for i in key): row for row in rows}
+            stored = {tuple(row[i] for i in key): row for row in self._read(table)}
+            for k in expected.keys() | stored.keys():
+                if not _rows_equal(expected.get(k), stored.get(k), tolerance):
+                    differences.append((table, k))
+        if differences:
+            logger.warning(f"{len(differences)} aggregate rows differ from the raw data")
+        return differences
+
+    def player_season(self, competition: str, season: str) -> List[PlayerSeasonStats]:
+        return self._read_models(PLAYER_SEASON_STATS_TABLE_NAME, "competition = ? AND season = ?", (competition, season))
+
+    def team_season(self, competition: str, season: str) -> List[TeamSeasonStats]:
+        return self._read_models(TEAM_SEASON_STATS_TABLE_NAME, "competition = ? AND season = ?", (competition, season))
+
+    def team_match(self, match_id: str) -> List[TeamMatchStats]:
+        return self._read_models(TEAM_MATCH_STATS_TABLE_NAME, "match_id = ?", (match_id,))
+
+    def _player_rows(self, match_ids: Optional[List[str]]) -> Frame:
+        """ Player rows of the matches (all matches for None) with their match data, keyed by match and team. """
+        columns = ", ".join(f"p.{c}" for c in TOTAL_COLUMNS)
+        sql = (f"SELECT p.match_id, p.team, m.competition, m.season, p.player_id, p.player, m.date, {columns} "
+               f"FROM {PLAYER_STATS_TABLE_NAME} p JOIN {MATCHES_TABLE_NAME} m ON m.match_id = p.match_id")
+        rows = self.db.get_custom_query(sql) if match_ids is None else self._select_in(sql, "p.match_id", match_ids)
+        # count column first: every player row is one appearance
+        return Frame([r[:4] for r in rows], [r[2:6] for r in rows], [r[6] for r in rows],
+                     [(1,) + tuple(r[7:]) for r in rows], len(TOTAL_COLUMNS) + 1)
+
+    def _team_match_rows(self, players: Frame) -> List[tuple]:
+        keys, labels, dates, totals = players.group_by()
+        return self._coerce(TEAM_MATCH_STATS_TABLE_NAME, (
+            {**dict(zip(TOTAL_COLUMNS, t[1:])), "match_id": k[0], "team": k[1], "competition": k[2], "season": k[3],
+             "date": d, "players": t[0]}
+            for k, d, t in zip(keys, dates.tolist(), totals.tolist())))
+
+    def _player_season_frame(self, players: Frame) -> Frame:
+        # (match_id, team, competition, season) -> (competition, season, player_id), labels player and team
+        return Frame([(l[0], l[1], l[2]) for l in players.labels], [(l[3], k[1]) for k, l in zip(players.keys, players.labels)],
+                     players.dates, players.values, players.values.shape[1])
+
+    def _team_season_frame(self, team_match: List[tuple]) -> Frame:
+        columns = self.schemas[TEAM_MATCH_STATS_TABLE_NAME].columns
+        rows = [dict(zip(columns, row)) for row in team_match]
+        return Frame([(r["competition"], r["season"], r["team"]) for r in rows], [() for _ in rows],
+                     [r["date"] for r in rows], [(1,) + tuple(r[c] for c in TOTAL_COLUMNS) for r in rows],
+                     len(TOTAL_COLUMNS) + 1)
+
+    def _player_season_rows(self, frame: Frame) -> List[tuple]:
+        keys, labels, dates, totals = frame.group_by()
+        minutes = totals[:, 1 + TOTAL_COLUMNS.index("minutes")]
+        played = minutes > 0
+        per90 = {}
+        for column in PER90_COLUMNS:
+            rate = np.divide(totals[:, 1 + TOTAL_COLUMNS.index(column)] * 90, minutes, out=np.zeros(len(minutes)), where=played)
+            per90[f"{column}_per90"] = np.where(played, rate, np.nan).tolist()
+        return self._coerce(PLAYER_SEASON_STATS_TABLE_NAME, (
+            {**dict(zip(TOTAL_COLUMNS, t[1:])), "competition": k[0], "season": k[1], "player_id": k[2],
+             "player": l[0], "team": l[1], "matches": t[0], "last_match_date": d,
+             **{c: None if np.isnan(v[i]) else v[i] for c, v in per90.items()}}
+            for i, (k, l, d, t) in enumerate(zip(keys, labels, dates.tolist(), totals.tolist()))))
+
+    def _team_season_rows(self, frame: Frame) -> List[tuple]:
+        keys, _, dates, totals = frame.group_by()
+        return self._coerce(TEAM_SEASON_STATS_TABLE_NAME, (
+            {**dict(zip(TOTAL_COLUMNS, t[1:])), "competition": k[0], "season": k[1], "team": k[2],
+             "matches": t[0], "last_match_date": d}
+            for k, d, t in zip(keys, dates.tolist(), totals.tolist())))
+
+    def _stored_player_season(self, keys: List[tuple]) -> Frame:
+        """ Stored rows of the (competition, season, player_id) keys, as a frame to add new rows to. """
+        columns = ["competition", "season", "player_id", "player", "team", "last_match_date", "matches"] + TOTAL_COLUMNS
+        rows = []
+        for (competition, season), player_ids in _split_by_season(keys).items():
+            rows += self._select_in(
+                f"SELECT {','.join(columns)} FROM {PLAYER_SEASON_STATS_TABLE_NAME} WHERE competition = ? AND season = ?",
+                "player_id", player_ids, (competition, season))
+        return Frame([r[:3] for r in rows], [r[3:5] for r in rows], [r[5] for r in rows], [r[6:] for r in rows],
+                     len(TOTAL_COLUMNS) + 1)
+
+    def _stored_team_season(self, keys: List[tuple]) -> Frame:
+        columns = ["competition", "season", "team", "last_match_date", "matches"] + TOTAL_COLUMNS
+        rows = []
+        for (competition, season), teams in _split_by_season(keys).items():
+            rows += self._select_in(
+                f"SELECT {','.join(columns)} FROM {TEAM_SEASON_STATS_TABLE_NAME} WHERE competition = ? AND season = ?",
+                "team", teams, (competition, season))
+        return Frame([r[:3] for r in rows], [() for _ in rows], [r[3] for r in rows], [r[4:] for r in rows],
+                     len(TOTAL_COLUMNS) + 1)
+
+    def _select_in(self, sql: str, column: str, values: List[Any], params: Tuple[Any, ...] = ()) -> List[tuple]:
+        """ Runs sql filtered by column IN values, in chunks of the database max_query_params. """
+        rows = []
+        chunk_size = self.db.max_query_params - len(params)
+        where = " AND " if " WHERE " in sql else " WHERE "
+        for i in range(0, len(values), chunk_size):
+            chunk = values[i:i + chunk_size]
+            rows += self.db.get_custom_query(f"{sql}{where}{column} IN ({','.join('?' * len(chunk))})", params + tuple(chunk))
+        return rows
+
+    def _coerce(self, table: str, values: Iterable[Dict[str, Any]]) -> List[tuple]:
+        """ Row tuples of a table from computed values, floats of integer columns become ints. """
+        columns = self.schemas[table].columns
+        return self.schemas[table].validate_rows([v[c] for c in columns] for v in values)
+
+    def _write(self, table: str, rows: List[tuple]) -> None:
+        if rows:
+            self.db.insert_to_db(table, list(self.schemas[table].columns), rows)
+
+    def _read(self, table: str, where: str = "", params: Tuple[Any, ...] = ()) -> List[tuple]:
+        schema = self.schemas[table]
+        sql = f"SELECT {','.join(schema.columns)} FROM {table}" + (f" WHERE {where}" if where else "")
+        return schema.validate_rows(self.db.get_custom_query(sql, params))
+
+    def _read_models(self, table: str, where: str, params: Tuple[Any, ...]) -> list:
+        schema = self.schemas[table]
+        return [schema.to_model(row) for row in self._read(table, where, params)]
+
+
+def _split_by_season(keys: List[tuple]) -> Dict[Tuple[str, str], List[str]]:
+    by_season: Dict[Tuple[str, str], List[str]] = {}
+    for competition, season, name in dict.fromkeys(keys):
+        by_season.setdefault((competition, season), []).append(name)
+    return by_season
+
+
+def _rows_equal(a: Optional[tuple], b: Optional[tuple], tolerance: float) -> bool:
+    if a is None or b is None:
+        return a is b
+    for x, y in zip(a, b):
+        if isinstance(x, float) or isinstance(y, float):
+            if x is None or y is None or abs(x - y) > tolerance:
+                return False
+        elif x != y:
+            return False
+    return True
@@ -1,55 +1,70 @@
 import requests
-from requests.adapters import HTTPAdapter, Retry
 
 import datetime
-from time import sleep
+from typing import Optional
 
+from Scraper.transport import Transport, PooledTransport
+from Scraper.cache import ResponseCache
+from Scraper.archive import PageArchive
+from Scraper.limiter import RateLimiter, parse_retry_after
+from Scraper.metrics import metrics
 #from Scraper.logger import logger
 
 class APIConsumer:
     """Interact with website, handling HTTP responses."""
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, transport: Optional[Transport]=None, cache: Optional[ResponseCache]=None,
+                 limiter: Optional[RateLimiter]=None, archive: Optional[PageArchive]=None):
         self.config = config
-        self.request_count_per_batch = 0
-        self.start_time = None
+        # one transport for the whole run, so connections are kept alive between calls
+        self.transport = transport or PooledTransport(self.config["api_consumer"].get("transport", {}))
+        cache_config = self.config["api_consumer"].get("cache", {})
+        if cache is None and cache_config.get("enabled"):
+            cache = ResponseCache(cache_config)
+        self.cache = cache
+        # every page received from the website, kept for offline re-parsing (see Scraper.migration)
+        self.archive = archive if archive is not None else PageArchive.from_config(self.config)
+        # pass the same limiter to several consumers to share one request budget between them
+        self.limiter = limiter or RateLimiter.from_config(self.config["api_consumer"])
         self.api_calls = 0
         self.last_api_call_data = None
 
     def call(self, url: str) -> requests.Response:
-        if not self.start_time:
-            self.start_time = datetime.datetime.now()
-
-        # simple way to create limiter for API calls
-        if self.request_count_per_batch > self.config["api_consumer"]["requests_limit"]:
-            self._check_limiter()
-
-        # sleeping for this case is the most suitable, we can do one request per three seconds
-        sleep(self.config["api_consumer"]["sleep_time"])
-
-        # use retries, because the website doesn't respond every time
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=5
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        s = requests.Session()
-        s.mount("https://", adapter)
-        s.mount("http://", adapter)
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            # nothing is sent to the website, so the limiter is skipped as well
+            self.cache.stats.hits += 1
+            metrics.inc("cache_hits")
+            self.last_api_call_data = datetime.datetime.now()
+            return self._archived(url, self.cache.load(cached), only_new=True)
 
+        with metrics.timer("limiter_wait"):
+            self.limiter.acquire()
         self.last_api_call_data = datetime.datetime.now()
-        resp = s.get(url, timeout=15, headers={"Content-Type": "text"})
+        with metrics.timer("http_request"):
+            resp = self.transport.get(url, self.cache.validators(cached) if cached else None)
         self.api_calls += 1
-        self.request_count_per_batch += 1
+        metrics.inc("http_responses", status=resp.status_code)
 
+        if resp.status_code in (429, 503):
+            self.limiter.penalize(parse_retry_after(resp.headers.get("Retry-After")))
+            raise requests.exceptions.HTTPError(resp.status_code)
+        self.limiter.record_success()
+
+        if resp.status_code == 304 and cached:
+            self.cache.stats.revalidated += 1
+            self.cache.refresh(cached)
+            return self._archived(url, self.cache.load(cached), only_new=True)
         if resp.status_code == 200:
-            return resp
+            if self.cache:
+                self.cache.stats.misses += 1
+                self.cache.store(url, resp)
+            return self._archived(url, resp)
         else:
             #logger.error(f"Couldn't get 200 status code, received: {resp.status_code}")
             raise requests.exceptions.HTTPError(resp.status_code)
 
-    def _check_limiter(self):
-        elapsed_time = (datetime.datetime.now() - self.start_time).seconds
-        if elapsed_time < self.config["api_consumer"]["time_limit"]:
-            sleep(self.config["api_consumer"]["time_limit"] - elapsed_time)
-        self.request_count_per_batch = 0
-        self.start_time = datetime.datetime.now()
\ No newline at end of file
+    def _archived(self, url: str, resp: requests.Response, only_new: bool=False) -> requests.Response:
+        """ Appends the page to the archive, cached pages only when the archive has no copy yet. """
+        if self.archive is not None and not (only_new and url in self.archive):
+            self.archive.put(url, resp.text, self.last_api_call_data)
+        return resp
@@ -0,0 +1,194 @@
+import os
+import lzma
+import zlib
+import struct
+import sqlite3
+import threading
+import datetime
+from typing import List, Optional, Tuple
+
+from Scraper.logger import logger
+from Scraper.constants import MATCH_URL_PART
+
+# magic, codec, url length, body length, fetch time (unix seconds)
+RECORD_HEADER = struct.Struct("<4sBHId")
+RECORD_MAGIC = b"FDAP"
+CODECS = {"zlib": 1, "lzma": 2}
+
+# (segment file path, offset, length) of a record, enough for another process to read it
+Location = Tuple[str, int, int]
+
+
+class ArchivedPage:
+    __slots__ = ("url", "match_id", "fetched_at", "location")
+
+    def __init__(self, url: str, match_id: Optional[str], fetched_at: datetime.datetime, location: Location):
+        self.url = url
+        self.match_id = match_id
+        self.fetched_at = fetched_at
+        self.location = location
+
+
+class PageArchive:
+    """
+    Append-only archive of every page fetched from the website, so tables can be re-parsed without the network.
+
+    Pages are compressed records appended to segment files (segment_00001.bin, ...) of about segment_size_mb.
+    Every record carries its url and fetch time, so the sqlite index (url, match_id -> segment, offset) can be
+    rebuilt from the segments with reindex. Nothing is overwritten: a page fetched again is appended and the index
+    points to the latest copy. A record cut short by a crash is truncated when the archive is opened.
+    """
+    def __init__(self, directory: str, segment_size_mb: float = 256, codec: str = "zlib"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive codec {codec!r}, expected one of {list(CODECS)}")
+        self.directory = directory
+        self.segment_size = int(segment_size_mb * 1024 * 1024)
+        self.codec = codec
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.con = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY, match_id TEXT, segment INTEGER, offset INTEGER, length INTEGER, fetched_at REAL)""")
+        self.con.execute("CREATE INDEX IF NOT EXISTS pages_match_id ON pages (match_id)")
+        self.con.commit()
+        self._segment = self._last_segment()
+        self._recover(self._segment)
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["PageArchive"]:
+        """ Archive from api_consumer.archive of config.yaml, None when disabled. """
+        archive_config = config["api_consumer"].get("archive", {})
+        if not archive_config.get("enabled"):
+            return None
+        return cls(archive_config.get("directory", "archive/fbref"), archive_config.get("segment_size_mb", 256),
+                   archive_config.get("codec", "zlib"))
+
+    def put(self, url: str, html: str, fetched_at: Optional[datetime.datetime] = None) -> None:
+        fetched_at = fetched_at or datetime.datetime.now()
+        record = encode_record(url, html, fetched_at, self.codec)
+        with self._lock:
+            path = self._path(self._segment)
+            if os.path.exists(path) and os.path.getsize(path) + len(record) > self.segment_size:
+                self._segment += 1
+                path = self._path(self._segment)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(record)
+            self._index(url, self._segment, offset, len(record), fetched_at.timestamp())
+            self.con.commit()
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self.con.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.con.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self.con.execute("SELECT segment, offset, length FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return read_record((self._path(row[0]), row[1], row[2]))[2]
+
+    def get_match(self, match_id: str) -> Optional[str]:
+        """ Latest copy of the match report page. """
+        with self._lock:
+            row = self.con.execute("SELECT url FROM pages WHERE match_id = ? ORDER BY fetched_at DESC LIMIT 1",
+                                   (match_id,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def pages(self, matches: Optional[bool] = None) -> List[ArchivedPage]:
+        """ Index entries in segment order, so reading them is sequential. matches=False for the other pages. """
+        sql = "SELECT url, match_id, segment, offset, length, fetched_at FROM pages"
+        if matches is not None:
+            sql += f" WHERE match_id IS {'NOT ' if matches else ''}NULL"
+        with self._lock:
+            rows = self.con.execute(sql + " ORDER BY segment, offset").fetchall()
+        return [ArchivedPage(url, match_id, datetime.datetime.fromtimestamp(fetched_at), (self._path(segment), offset, length))
+                for url, match_id, segment, offset, length, fetched_at in rows]
+
+    def reindex(self) -> int:
+        """ Rebuilds the index from the segment files, returns the number of indexed pages. """
+        with self._lock:
+            self.con.execute("DELETE FROM pages")
+            for segment in range(1, self._last_segment() + 1):
+                end = self._scan(segment, 0)
+                if end is not None:
+                    logger.warning(f"Page archive {self._path(segment)}: unreadable record at {end}, rest of the segment skipped")
+            self.con.commit()
+        logger.info(f"Page archive {self.directory} reindexed, {len(self)} pages")
+        return len(self)
+
+    def _recover(self, segment: int) -> None:
+        """ Indexes complete records written after the last indexed one and drops a partial one at the end. """
+        with self._lock:
+            end = self.con.execute("SELECT MAX(offset + length) FROM pages WHERE segment = ?", (segment,)).fetchone()[0]
+            partial = self._scan(segment, end or 0)
+            if partial is not None:
+                logger.warning(f"Page archive {self._path(segment)}: partial record at {partial} dropped")
+                with open(self._path(segment), "r+b") as f:
+                    f.truncate(partial)
+            self.con.commit()
+
+    def _scan(self, segment: int, offset: int) -> Optional[int]:
+        """ Indexes the records of a segment from offset on, returns the offset of an unreadable one if any. """
+        path = self._path(segment)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return None
+                if len(header) < RECORD_HEADER.size or header[:4] != RECORD_MAGIC:
+                    break
+                _, _, url_length, body_length, fetched_at = RECORD_HEADER.unpack(header)
+                url = f.read(url_length)
+                length = RECORD_HEADER.size + url_length + body_length
+                if len(url) < url_length or f.seek(body_length, os.SEEK_CUR) > os.path.getsize(path):
+                    break
+                self._index(url.decode("utf-8"), segment, offset, length, fetched_at)
+                offset += length
+        return offset
+
+    def _index(self, url: str, segment: int, offset: int, length: int, fetched_at: float) -> None:
+        match_id = url.rstrip("/").split("/")[-1] if MATCH_URL_PART in url else None
+        self.con.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                         (url, match_id, segment, offset, length, fetched_at))
+
+    def _last_segment(self) -> int:
+        segments = [int(name[len("segment_"):-len(".bin")]) for name in os.listdir(self.directory)
+                    if name.startswith("segment_") and name.endswith(".bin")]
+        return max(segments, default=1)
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment_{segment:05d}.bin")
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def encode_record(url: str, html: str, fetched_at: datetime.datetime, codec: str = "zlib") -> bytes:
+    data = html.encode("utf-8")
+    body = zlib.compress(data, 9) if codec == "zlib" else lzma.compress(data)
+    url_bytes = url.encode("utf-8")
+    return RECORD_HEADER.pack(RECORD_MAGIC, CODECS[codec], len(url_bytes), len(body), fetched_at.timestamp()) + url_bytes + body
+
+
+def read_record(location: Location) -> Tuple[str, datetime.datetime, str]:
+    """ url, fetch time and html of the record at location, usable from any process. """
+    path, offset, length = location
+    with open(path, "rb") as f:
+        f.seek(offset)
+        record = f.read(length)
+    magic, codec, url_length, _, fetched_at = RECORD_HEADER.unpack_from(record)
+    if magic != RECORD_MAGIC:
+        raise ValueError(f"No archived page at {path}:{offset}")
+    body = record[RECORD_HEADER.size + url_length:]
+    data = zlib.decompress(body) if codec == CODECS["zlib"] else lzma.decompress(body)
+    url = record[RECORD_HEADER.size:RECORD_HEADER.size + url_length].decode("utf-8")
+    return url, datetime.datetime.fromtimestamp(fetched_at), data.decode("utf-8")
+
@@ -0,0 +1,55 @@
+import datetime
+from typing import Dict, Optional
+
+from Scraper.logger import logger
+from Scraper.database import Database
+from Scraper.models import ParserTech
+from Scraper.records import RecordBatch
+from Scraper.constants import PARSER_TECH_TABLE_NAME, PLAYER_PARSE_TYPE, PARSE_OK, PARSE_INVALID_ROWS, PARSE_EMPTY
+
+
+class AuditCompaction:
+    """
+    Retention of the parser_tech audit log.
+
+    Detail rows (row_count NULL) older than retention_days are folded into one summary row per parsed page and
+    deleted. Rows of one page share parse_date, rows of a match report also match_id. Pages parsed in compact audit
+    mode already have a summary, so only their rows of invalid records remain; those are kept error_retention_days
+    so the failed match or player and the error stay visible. Summary rows are never deleted.
+    """
+    def __init__(self, db: Database, retention_days: float = 30, error_retention_days: float = 365):
+        self.db = db
+        self.retention = datetime.timedelta(days=retention_days)
+        self.error_retention = max(datetime.timedelta(days=error_retention_days), self.retention)
+
+    @classmethod
+    def from_config(cls, db: Database, config: dict) -> "AuditCompaction":
+        retention_config = config.get("parser_tech", {})
+        return cls(db, retention_config.get("retention_days", 30), retention_config.get("error_retention_days", 365))
+
+    def run(self, now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+        """ Returns the number of added summary rows and of deleted detail rows. """
+        now = now or datetime.datetime.now()
+        cutoff, error_cutoff = now - self.retention, now - self.error_retention
+        page = f"CASE WHEN parse_type = '{PLAYER_PARSE_TYPE}' THEN match_id END"
+        groups = self.db.get_custom_query(
+            f"SELECT {page}, parse_type, parse_date, COUNT(*), SUM(CASE WHEN error_msg IS NULL THEN 0 ELSE 1 END) "
+            f"FROM {PARSER_TECH_TABLE_NAME} WHERE row_count IS NULL AND parse_date < ? "
+            f"GROUP BY {page}, parse_type, parse_date", (cutoff,))
+        summarized = {tuple(row) for row in self.db.get_custom_query(
+            f"SELECT match_id, parse_type, parse_date FROM {PARSER_TECH_TABLE_NAME} WHERE row_count IS NOT NULL AND parse_date < ?",
+            (cutoff,))}
+        summaries = RecordBatch.from_models(ParserTech, (
+            ParserTech(match_id=match_id, parse_type=parse_type, parse_date=parse_date, row_count=rows, error_count=errors,
+                       status=PARSE_EMPTY if not rows else PARSE_INVALID_ROWS if errors else PARSE_OK)
+            for match_id, parse_type, parse_date, rows, errors in groups
+            if (match_id, parse_type, parse_date) not in summarized))
+
+        detail = f"FROM {PARSER_TECH_TABLE_NAME} WHERE row_count IS NULL AND ((error_msg IS NULL AND parse_date < ?) OR parse_date < ?)"
+        deleted = self.db.get_custom_query(f"SELECT COUNT(*) {detail}", (cutoff, error_cutoff))[0][0]
+        with self.db.transaction():
+            if summaries:
+                self.db.insert_to_db(PARSER_TECH_TABLE_NAME, summaries.columns, summaries)
+            self.db.execute(f"DELETE {detail}", (cutoff, error_cutoff))
+        logger.info(f"parser_tech compacted: {len(summaries)} page summaries added, {deleted} detail rows deleted")
+        return {"summaries": len(summaries), "deleted": deleted}
@@ -0,0 +1,160 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from Scraper.logger import logger
+from Scraper.constants import MATCH_URL_PART, SCHEDULE_URL_PART
+
+
+class CacheEntry:
+    """ Cached page metadata, body is kept on disk. """
+    __slots__ = ("url", "file_name", "etag", "last_modified", "stored_at", "size", "encoding", "content_type")
+
+    def __init__(self, url, file_name, etag, last_modified, stored_at, size, encoding, content_type):
+        self.url = url
+        self.file_name = file_name
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.size = size
+        self.encoding = encoding
+        self.content_type = content_type
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def __str__(self) -> str:
+        return (f"{self.hits} hits, {self.revalidated} revalidated (304), {self.misses} misses, "
+                f"{self.stored} stored, {self.evicted} evicted")
+
+
+class ResponseCache:
+    """
+    On-disk cache of page bodies keyed by url.
+
+    Bodies are stored zlib compressed, one file per url, with an sqlite index holding validators
+    (ETag/Last-Modified), store and access times. Schedule and match report pages have separate TTLs.
+    Stale entries are revalidated with a conditional request. Least recently used entries are evicted
+    once the bodies exceed max_size_mb.
+    """
+    def __init__(self, config: dict, clock=time.time):
+        self.directory = config.get("directory", ".cache/fbref")
+        self.schedule_ttl = config.get("schedule_ttl", 6 * 3600)
+        self.match_ttl = config.get("match_ttl", 30 * 24 * 3600)
+        self.default_ttl = config.get("default_ttl", 0)
+        self.max_size = int(config.get("max_size_mb", 1024) * 1024 * 1024)
+        self.clock = clock
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.con = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), check_same_thread=False)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY, file_name TEXT, etag TEXT, last_modified TEXT,
+            stored_at REAL, accessed_at REAL, size INTEGER, encoding TEXT, content_type TEXT)""")
+        self.con.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self.con.commit()
+        self.total_size = self.con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def ttl_for(self, url: str) -> float:
+        if MATCH_URL_PART in url:
+            return self.match_ttl
+        if SCHEDULE_URL_PART in url:
+            return self.schedule_ttl
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self.con.execute(
+                "SELECT url, file_name, etag, last_modified, stored_at, size, encoding, content_type FROM entries WHERE url = ?",
+                (url,)).fetchone()
+        if row is None or not os.path.exists(self._path(row[1])):
+            return None
+        return CacheEntry(*row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.clock() - entry.stored_at < self.ttl_for(entry.url)
+
+    def validators(self, entry: CacheEntry) -> Dict[str, str]:
+        """ Headers for a conditional request, empty if the website sent no validators. """
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def load(self, entry: CacheEntry) -> requests.Response:
+        """ Builds a response from a cache entry and marks it as recently used. """
+        with open(self._path(entry.file_name), "rb") as f:
+            body = zlib.decompress(f.read())
+        with self._lock:
+            self.con.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (self.clock(), entry.url))
+            self.con.commit()
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = entry.url
+        resp._content = body
+        resp.encoding = entry.encoding
+        resp.headers = CaseInsensitiveDict({"Content-Type": entry.content_type or "text/html"})
+        resp.from_cache = True
+        return resp
+
+    def refresh(self, entry: CacheEntry) -> None:
+        """ Restarts TTL of an entry confirmed unchanged by the website (304). """
+        with self._lock:
+            self.con.execute("UPDATE entries SET stored_at = ? WHERE url = ?", (self.clock(), entry.url))
+            self.con.commit()
+
+    def store(self, url: str, resp: requests.Response) -> None:
+        file_name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".z"
+        data = zlib.compress(resp.content, 6)
+        tmp_path = self._path(file_name) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(file_name))
+        now = self.clock()
+        with self._lock:
+            old = self.con.execute("SELECT size FROM entries WHERE url = ?", (url,)).fetchone()
+            self.total_size += len(data) - (old[0] if old else 0)
+            self.con.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, file_name, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), now, now,
+                 len(data), resp.encoding, resp.headers.get("Content-Type")))
+            self.con.commit()
+            self.stats.stored += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        """ Removes least recently used entries until the cache fits max_size. """
+        while self.total_size > self.max_size:
+            row = self.con.execute("SELECT url, file_name, size FROM entries ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                self.total_size = 0
+                return
+            url, file_name, size = row
+            self.con.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if os.path.exists(self._path(file_name)):
+                os.remove(self._path(file_name))
+            self.total_size -= size
+            self.stats.evicted += 1
+        self.con.commit()
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.directory, file_name)
+
+    def close(self) -> None:
+        self.con.close()
+        logger.info(f"Response cache: {self.stats}")
@@ -0,0 +1,79 @@
+import datetime
+from typing import List
+
+from Scraper.database import Database
+from Scraper.models import Match, Checkpoint
+from Scraper.logger import logger
+from Scraper.records import schema_for
+from Scraper.constants import (CHECKPOINTS_TABLE_NAME, CHECKPOINT_QUEUED, CHECKPOINT_FETCHED, CHECKPOINT_PARSED,
+                               CHECKPOINT_COMMITTED, CHECKPOINT_FAILED)
+
+
+class CheckpointStore:
+    """
+    Durable progress of scraping runs, kept in the database next to the scraped data.
+
+    Matches of a competition are queued before any of them is fetched and move through fetched, parsed and
+    committed. The committed mark is written in the transaction that inserts the match, so a match is either
+    committed with all its rows or still pending. A match that failed is marked failed and left to the dead
+    letters (see Scraper.dead_letters). A run restarted after a crash processes the pending matches from here
+    first, then the rest of the schedule skipping the matches queued before (matches are queued one chunk at a
+    time, see Scraper._stream_matches). Fetched pages come back from the response cache.
+    Rows of a competition are deleted once all its matches are committed or failed.
+    """
+    def __init__(self, db: Database):
+        self.db = db
+        self.db.create_table(Checkpoint, CHECKPOINTS_TABLE_NAME)
+        self.schema = schema_for(Checkpoint)
+        self.match_columns = list(schema_for(Match).columns)
+
+    def pending(self, url: str) -> List[Match]:
+        """ Matches of url queued by an unfinished run, in queue order. """
+        rows = self.db.get_custom_query(
+            f"SELECT {','.join(self.match_columns)} FROM {CHECKPOINTS_TABLE_NAME} WHERE url = ? AND status NOT IN (?, ?) ORDER BY id",
+            (url, CHECKPOINT_COMMITTED, CHECKPOINT_FAILED))
+        return [Match(**dict(zip(self.match_columns, row))) for row in rows]
+
+    def exclude(self, url: str, matches: List[Match]) -> List[Match]:
+        """ matches not queued for url yet. """
+        queued = set()
+        ids = [m.match_id for m in matches]
+        for i in range(0, len(ids), self.db.max_query_params - 1):
+            chunk = ids[i:i + self.db.max_query_params - 1]
+            queued.update(row[0] for row in self.db.get_custom_query(
+                f"SELECT match_id FROM {CHECKPOINTS_TABLE_NAME} WHERE url = ? AND match_id IN ({','.join('?' * len(chunk))})",
+                (url, *chunk)))
+        return [m for m in matches if m.match_id not in queued]
+
+    def queue(self, url: str, matches: List[Match]) -> None:
+        now = datetime.datetime.now()
+        values = [self.schema.coerce({**m.__dict__, "url": url, "status": CHECKPOINT_QUEUED, "updated_at": now})
+                  for m in matches]
+        if values:
+            self.db.insert_to_db(CHECKPOINTS_TABLE_NAME, list(self.schema.columns), values)
+
+    def mark(self, match_ids: List[str], status: str) -> None:
+        for i in range(0, len(match_ids), self.db.max_query_params - 2):
+            chunk = match_ids[i:i + self.db.max_query_params - 2]
+            self.db.execute(
+                f"UPDATE {CHECKPOINTS_TABLE_NAME} SET status = ?, updated_at = ? WHERE match_id IN ({','.join('?' * len(chunk))})",
+                (status, datetime.datetime.now(), *chunk))
+
+    def fetched(self, match_id: str) -> None:
+        self.mark([match_id], CHECKPOINT_FETCHED)
+
+    def parsed(self, match_id: str) -> None:
+        self.mark([match_id], CHECKPOINT_PARSED)
+
+    def committed(self, match_ids: List[str]) -> None:
+        """ Call inside the transaction inserting the matches. """
+        self.mark(match_ids, CHECKPOINT_COMMITTED)
+
+    def failed(self, match_id: str) -> None:
+        self.mark([match_id], CHECKPOINT_FAILED)
+
+    def finish(self, url: str) -> None:
+        """ Forgets url once all its queued matches are committed or failed. """
+        if not self.pending(url):
+            self.db.execute(f"DELETE FROM {CHECKPOINTS_TABLE_NAME} WHERE url = ?", (url,))
+            logger.info(f"All queued matches from {url} committed")
@@ -0,0 +1,101 @@
+"""
+Command line entry point of run.py. Only argparse and the registry are imported up front: the scraper stack and
+the chosen database driver are imported after the arguments are parsed, so --help and bad arguments return at once
+and a host without ODBC can run the sqlite backend.
+"""
+import argparse
+from typing import List, Optional
+
+from Scraper.registry import DATABASE_BACKENDS, PARSER_ENGINES, open_database
+
+
+def competition_urls(config: dict, competitions: Optional[List[str]] = None) -> List[str]:
+    """ Schedule urls of competitions named in config.yaml competitions or given as urls, all configured ones by default. """
+    known = config.get("competitions", {})
+    urls = []
+    for competition in competitions or list(known):
+        if competition in known:
+            urls.append(known[competition])
+        elif "Scores-and-Fixtures" in competition:
+            urls.append(competition)
+        else:
+            raise ValueError(f"Unknown competition: {competition}, choose one of {list(known)} or give a 'Scores & Fixtures' url")
+    return urls
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(prog="run.py", description="Scrapes fbref competitions into the database.")
+    arg_parser.add_argument("-c", "--competition", action="append", dest="competitions", metavar="NAME_OR_URL",
+                            help="competition name from config.yaml or a 'Scores & Fixtures' url, repeatable, all by default")
+    arg_parser.add_argument("-s", "--season", action="append", dest="seasons", metavar="SEASON",
+                            help="season like 2022-2023 or 'current', repeatable, the current one by default")
+    arg_parser.add_argument("--backend", choices=list(DATABASE_BACKENDS), help="database backend, database.backend by default")
+    arg_parser.add_argument("--engine", choices=list(PARSER_ENGINES), help="html parser, parser.engine by default")
+    arg_parser.add_argument("--matches", type=int, help="matches to scrape per competition and season, all by default")
+    arg_parser.add_argument("--requests-limit", type=int, help="requests per --time-limit seconds")
+    arg_parser.add_argument("--time-limit", type=float)
+    arg_parser.add_argument("--sleep-time", type=float, help="minimum seconds between requests")
+    arg_parser.add_argument("--config", default="config.yaml", help="config file, relative to the repository root")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="profiling mode, cProfile and memory snapshots are written to profiling.directory")
+    return arg_parser
+
+
+def load_config(args: argparse.Namespace) -> dict:
+    """ config.yaml with the command line overrides applied. """
+    from Scraper.config import Config
+    config = Config(args.config).load_config()
+    for option in ("requests_limit", "time_limit", "sleep_time"):
+        if getattr(args, option) is not None:
+            config["api_consumer"][option] = getattr(args, option)
+    if args.engine:
+        config["parser"]["engine"] = args.engine
+    if args.backend:
+        config.setdefault("database", {})["backend"] = args.backend
+    if args.profile:
+        config.setdefault("profiling", {})["enabled"] = True
+    return config
+
+
+def prepare_database(db, config: dict, archive=None) -> None:
+    """
+    Recreates the tables with recreate_db. Otherwise brings an existing database up to date with the models
+    (see Scraper.migration), so tables, columns and indexes added since it was created are there before scraping.
+    """
+    if config["recreate_db"]:
+        db.recreate_db()
+        return
+    from Scraper.migration import SchemaMigration
+    SchemaMigration(db, archive, config).run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_arg_parser().parse_args(argv)
+    config = load_config(args)
+    urls = competition_urls(config, args.competitions)
+    if args.seasons:
+        from Scraper.planner import season_url
+        urls = [season_url(url, None if season == "current" else season) for url in urls for season in args.seasons]
+
+    from Scraper.scraper import Scraper
+    from Scraper.api_consumer import APIConsumer
+    from Scraper.parser import Parser
+    from Scraper.crawler import CrawlOrchestrator
+
+    db = open_database(config)
+    scraper = Scraper(Parser(APIConsumer(config), config), db, config)
+
+    prepare_database(db, config, scraper.parser.api_consumer.archive)
+
+    try:
+        if config.get("crawler", {}).get("enabled"):
+            CrawlOrchestrator(scraper, config).run(urls, args.matches)
+        else:
+            for url in urls:
+                scraper.scrape_data(url, args.matches)
+        scraper.retry_dead_letters()
+    finally:
+        scraper.export_metrics()
+        if scraper.profiler:
+            scraper.profiler.close()
+        db.con.close()
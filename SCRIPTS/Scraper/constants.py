@@ -1,5 +1,50 @@
 MATCHES_TABLE_NAME = "matches"
 PLAYER_STATS_TABLE_NAME = "player_stats"
 PARSER_TECH_TABLE_NAME = "parser_tech"
+CHECKPOINTS_TABLE_NAME = "scrape_checkpoints"
+PLAYER_SEASON_STATS_TABLE_NAME = "player_season_stats"
+TEAM_MATCH_STATS_TABLE_NAME = "team_match_stats"
+TEAM_SEASON_STATS_TABLE_NAME = "team_season_stats"
+RUN_METRICS_TABLE_NAME = "run_metrics"
+JOBS_TABLE_NAME = "match_jobs"
+DEAD_LETTERS_TABLE_NAME = "dead_letters"
 MATCH_PARSE_TYPE = "match"
-PLAYER_PARSE_TYPE = "player"
\ No newline at end of file
+PLAYER_PARSE_TYPE = "player"
+
+# fbref url parts of match report and 'Scores & Fixtures' pages
+MATCH_URL_PART = "/en/matches/"
+SCHEDULE_URL_PART = "Scores-and-Fixtures"
+
+# parser.audit modes, see Parser.audit_rows
+AUDIT_FULL = "full"
+AUDIT_COMPACT = "compact"
+# status of parser_tech summary rows
+PARSE_OK = "ok"
+PARSE_INVALID_ROWS = "invalid_rows"
+PARSE_EMPTY = "empty"
+
+# match states in CHECKPOINTS_TABLE_NAME, in processing order
+CHECKPOINT_QUEUED = "queued"
+CHECKPOINT_FETCHED = "fetched"
+CHECKPOINT_PARSED = "parsed"
+CHECKPOINT_COMMITTED = "committed"
+# handed over to the dead letters, not resumed
+CHECKPOINT_FAILED = "failed"
+
+# job states in JOBS_TABLE_NAME
+JOB_QUEUED = "queued"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# error_msg is cut to this length, the width of its Azure column
+ERROR_MSG_LENGTH = 4000
+
+# match states in DEAD_LETTERS_TABLE_NAME
+DEAD_LETTER_PENDING = "pending"
+DEAD_LETTER_GIVEN_UP = "given_up"
+
+# backfill priorities, see BackfillPlanner
+PRIORITY_CURRENT = 0
+PRIORITY_RECENT = 1
+PRIORITY_HISTORIC = 2
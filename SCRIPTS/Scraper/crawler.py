@@ -0,0 +1,298 @@
+import asyncio
+import datetime
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from Scraper.logger import logger
+from Scraper.models import Match
+from Scraper.scraper import Scraper
+from Scraper.errors import NoScoreAndFixturesInUrlException, CircuitOpenException
+from Scraper.parser import init_parse_worker, parse_matches_page, parse_players_stats_page
+from Scraper.metrics import metrics
+
+
+class CompetitionProgress:
+    """ Progress of one competition url during a crawl. """
+    def __init__(self, url: str):
+        self.url = url
+        self.competition = url.rstrip("/").split("/")[-1].replace("-Scores-and-Fixtures", "").replace("-", " ")
+        self.status = "queued"
+        self.matches_to_process = 0
+        self.matches_added = 0
+        self.players_stats_added = 0
+        self.matches_failed = 0
+        # matches of the schedule page are queued, or the limit was filled by resumed matches
+        self.schedule_done = False
+        self.error = None
+
+    def check_done(self) -> None:
+        if (self.status == "running" and self.schedule_done
+                and self.matches_added + self.matches_failed == self.matches_to_process):
+            self.status = "done"
+
+    def __str__(self) -> str:
+        line = (f"{self.competition}: {self.status}, {self.matches_added}/{self.matches_to_process} matches, "
+                f"{self.players_stats_added} players stats")
+        line += f", {self.matches_failed} matches failed" if self.matches_failed else ""
+        return line + (f", error: {self.error}" if self.error else "")
+
+
+class _Job:
+    __slots__ = ("url", "match")
+
+    def __init__(self, url: str, match: Optional[Match] = None):
+        # match is None for the competition schedule page
+        self.url = url
+        self.match = match
+
+
+class CrawlOrchestrator:
+    """
+    Crawls several competitions at once on an asyncio loop.
+
+    Fetches are dispatched round robin between competitions with pending work, at most fetch_concurrency at a
+    time, and all of them go through the one APIConsumer limiter, so every competition gets a fair share of a
+    single politeness budget. A failing schedule page stops its competition without holding the others back, a
+    failing match goes to the dead letters (see Scraper.match_failed) and its competition goes on. Pages are parsed
+    in a process pool and completed matches are streamed to the database by one writer task on the loop thread,
+    while other competitions keep fetching.
+    """
+    def __init__(self, scraper: Scraper, config: dict):
+        self.scraper = scraper
+        self.parser = scraper.parser
+        self.db = scraper.db
+        crawler_config = config.get("crawler", {})
+        self.fetch_concurrency = max(1, crawler_config.get("fetch_concurrency", 2))
+        self.parse_workers = crawler_config.get("parse_workers", 2)
+        self.write_batch_size = max(1, crawler_config.get("write_batch_size", 10))
+        self.progress_interval = crawler_config.get("progress_interval", 30)
+        self.progress: Dict[str, CompetitionProgress] = {}
+
+    def run(self, urls: List[str], number_of_matches_to_scrape: Union[int, None]=None) -> Dict[str, CompetitionProgress]:
+        if self.scraper.profiler:
+            # competitions are interleaved, their work on the loop thread is profiled per competition url (see
+            # _section) and database writes shared by competitions on their own, stacks are sampled for the whole crawl
+            try:
+                with self.scraper.profiler.sampling("crawl"):
+                    return asyncio.run(self.crawl(urls, number_of_matches_to_scrape))
+            finally:
+                self.scraper.profiler.write_sections()
+        return asyncio.run(self.crawl(urls, number_of_matches_to_scrape))
+
+    async def crawl(self, urls: List[str], number_of_matches_to_scrape: Union[int, None]=None) -> Dict[str, CompetitionProgress]:
+        for url in urls:
+            if "Scores-and-Fixtures" not in url:
+                raise NoScoreAndFixturesInUrlException
+        self.number_of_matches_to_scrape = number_of_matches_to_scrape
+        self.progress = {url: CompetitionProgress(url) for url in urls}
+        self.checkpoints = self.scraper.checkpoints
+        self._jobs = {url: deque() for url in urls}
+        for url in urls:
+            pending = self.checkpoints.pending(url) if self.checkpoints else []
+            if pending:
+                # matches of an interrupted run go first, the schedule page then queues the rest of the competition
+                self._start(url, pending[:number_of_matches_to_scrape])
+            if self._remaining(url) == 0:
+                self.progress[url].schedule_done = True
+                self._start(url, [])
+            else:
+                self._jobs[url].append(_Job(url))
+        self._turns = deque(urls)
+        self._writes = asyncio.Queue()
+        self._parse_slots = asyncio.Semaphore(2 * max(1, self.parse_workers))
+        self._pool = ProcessPoolExecutor(self.parse_workers, initializer=init_parse_worker,
+                                         initargs=(self.parser.config, True)) if self.parse_workers else None
+        if self._pool is None:
+            init_parse_worker(self.parser.config)
+        inserted_before = len(self.scraper.inserted_match_ids)
+        writer = asyncio.create_task(self._writer())
+        reporter = asyncio.create_task(self._reporter())
+        try:
+            await self._dispatch()
+        finally:
+            await self._writes.put(None)
+            await writer
+            reporter.cancel()
+            if self._pool:
+                self._pool.shutdown(cancel_futures=True)
+            self.scraper.flush_audit()
+            self.scraper.update_aggregates(self.scraper.inserted_match_ids[inserted_before:])
+            self.scraper.record_metrics()
+        for url, progress in self.progress.items():
+            if self.checkpoints and progress.status == "done":
+                self.checkpoints.finish(url)
+            logger.info(str(progress))
+        logger.info(f"Total api calls: {self.parser.api_consumer.api_calls}")
+        logger.info(f"Limiter: {self.parser.api_consumer.limiter.summary()}")
+        return self.progress
+
+    def _next_job(self) -> Optional[_Job]:
+        """ Takes a job from the next competition in round robin order that has one. """
+        for _ in range(len(self._turns)):
+            url = self._turns[0]
+            self._turns.rotate(-1)
+            if self._jobs[url]:
+                return self._jobs[url].popleft()
+        return None
+
+    async def _dispatch(self) -> None:
+        tasks = set()
+        fetching = 0
+        while True:
+            while fetching < self.fetch_concurrency:
+                job = self._next_job()
+                if job is None:
+                    break
+                fetching += 1
+                task = asyncio.create_task(self._fetch(job))
+                task.is_fetch = True
+                tasks.add(task)
+            if not tasks:
+                return
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if getattr(task, "is_fetch", False):
+                    fetching -= 1
+                    parse_task = task.result()
+                    if parse_task is not None:
+                        tasks.add(parse_task)
+
+    async def _fetch(self, job: _Job) -> Optional[asyncio.Task]:
+        """ Fetches a page in a thread (the limiter blocks there) and hands it over to a parse task. """
+        progress = self.progress[job.url]
+        if progress.status == "failed":
+            return None
+        url = job.url if job.match is None else self.parser.match_url(job.match.match_id)
+        try:
+            html, parse_date = await asyncio.to_thread(self._call, url)
+        except Exception as e:
+            self._job_failed(job, e)
+            return None
+        if self.checkpoints and job.match is not None:
+            self.checkpoints.fetched(job.match.match_id)
+        # holding the fetch slot until a parse slot is free keeps fetched pages in memory bounded
+        await self._parse_slots.acquire()
+        return asyncio.create_task(self._parse(job, html, parse_date))
+
+    def _call(self, url: str) -> tuple:
+        resp = self.parser.api_consumer.call(url)
+        return resp.text, datetime.datetime.now()
+
+    async def _parse(self, job: _Job, html: str, parse_date: datetime.datetime) -> None:
+        loop = asyncio.get_running_loop()
+        progress = self.progress[job.url]
+        try:
+            if job.match is None:
+                matches, parser_tech, processed, _ = await self._run_parse(
+                    loop, job.url, parse_matches_page, html, job.url, parse_date)
+                self.parser.match_processed += processed
+                with self._section(job.url):
+                    # written with the next batch of matches
+                    self.parser.log_audit(parser_tech, self.db)
+                    self._queue_matches(job.url, matches)
+            else:
+                player_stats, parser_tech, processed, _ = await self._run_parse(
+                    loop, job.url, parse_players_stats_page, html, job.match.match_id, parse_date)
+                self.parser.player_stats_processed += processed
+                if self.checkpoints:
+                    self.checkpoints.parsed(job.match.match_id)
+                await self._writes.put((job.url, (job.match, player_stats, parser_tech)))
+        except Exception as e:
+            self._job_failed(job, e)
+        finally:
+            self._parse_slots.release()
+
+    async def _run_parse(self, loop, url: str, fn, *args):
+        if self._pool is None:
+            with self._section(url):
+                return fn(*args)
+        result = await loop.run_in_executor(self._pool, fn, *args)
+        # worker metrics, inline parsing records them directly
+        if result[-1]:
+            metrics.merge(result[-1])
+        return result
+
+    def _section(self, name: str):
+        """ Profiler section of work on the loop thread, nothing when profiling is off. """
+        return self.scraper.profiler.section(name) if self.scraper.profiler else nullcontext()
+
+    def _queue_matches(self, url: str, matches: List[Match]) -> None:
+        if self.scraper.profiler:
+            self.scraper.profiler.snapshot("after_get_matches", url)
+        matches = self.db.check_matches_not_in_db(matches)
+        if self.scraper.dead_letters:
+            matches = self.scraper.dead_letters.exclude(matches)
+        if self.checkpoints:
+            # resumed or failed in this run
+            matches = self.checkpoints.exclude(url, matches)
+        remaining = self._remaining(url)
+        if remaining is not None:
+            matches = matches[:remaining]
+        if self.checkpoints:
+            self.checkpoints.queue(url, matches)
+        self.progress[url].schedule_done = True
+        self._start(url, matches)
+
+    def _remaining(self, url: str) -> Optional[int]:
+        """ Matches url may still queue under number_of_matches_to_scrape, None without a limit. """
+        if self.number_of_matches_to_scrape is None:
+            return None
+        return max(0, self.number_of_matches_to_scrape - self.progress[url].matches_to_process)
+
+    def _start(self, url: str, matches: List[Match]) -> None:
+        progress = self.progress[url]
+        progress.matches_to_process += len(matches)
+        progress.status = "running"
+        self._jobs[url].extend(_Job(url, m) for m in matches)
+        logger.info(f"{progress.competition}: {len(matches)} matches to process")
+        progress.check_done()
+
+    def _job_failed(self, job: _Job, error: Exception) -> None:
+        if job.match is None or isinstance(error, CircuitOpenException):
+            self._fail(job.url, error)
+            return
+        self.scraper.match_failed(job.match, error, job.url)
+        progress = self.progress[job.url]
+        progress.matches_failed += 1
+        progress.check_done()
+
+    def _fail(self, url: str, error: Exception) -> None:
+        progress = self.progress[url]
+        progress.status = "failed"
+        progress.error = repr(error)
+        # other competitions continue, this one is dropped until the next run
+        self._jobs[url].clear()
+        logger.error(f"{progress.competition} stopped: {error!r}")
+
+    async def _writer(self) -> None:
+        """ Single database writer, inserts completed matches in batches as soon as they arrive. """
+        batch = []
+        while True:
+            item = await self._writes.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.write_batch_size or self._writes.empty()):
+                with self._section("crawl_writes"):
+                    self._write(batch)
+                batch = []
+            if item is None:
+                return
+
+    def _write(self, batch: list) -> None:
+        # a match whose rows are rejected goes to the dead letters, its competition goes on
+        inserted = self.scraper._insert_isolating_failures([parsed for _, parsed in batch], [url for url, _ in batch])
+        for (url, (_, player_stats, _)), ok in zip(batch, inserted):
+            progress = self.progress[url]
+            if ok:
+                progress.matches_added += 1
+                progress.players_stats_added += len(player_stats)
+            else:
+                progress.matches_failed += 1
+            progress.check_done()
+
+    async def _reporter(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logger.info("Crawl progress: " + " | ".join(str(p) for p in self.progress.values()))
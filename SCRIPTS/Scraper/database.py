@@ -1,15 +1,44 @@
+import os
+import time
 import sqlite3
-import pyodbc
+from contextlib import contextmanager
 from pydantic import BaseModel
-from typing import List, Tuple, Any, get_type_hints
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, Union, Any
 from abc import ABC, abstractmethod
 
 from Scraper.utils import type_mapping, azure_sql_type_mapping
-from Scraper.models import Match, PlayerStats, ParserTech
-from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+from Scraper.records import RecordBatch
+from Scraper.models import (Match, PlayerStats, ParserTech, Checkpoint, PlayerSeasonStats, TeamMatchStats, TeamSeasonStats,
+                            RunMetric, MatchJob, DeadLetter)
+from Scraper.constants import (MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME, CHECKPOINTS_TABLE_NAME,
+                               PLAYER_SEASON_STATS_TABLE_NAME, TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME,
+                               RUN_METRICS_TABLE_NAME, JOBS_TABLE_NAME, DEAD_LETTERS_TABLE_NAME)
 from Scraper.logger import logger
+from Scraper.metrics import metrics
 from Scraper.errors import NoEnvaronmentalVariableException
 
+def _pyodbc() -> Any:
+    """ pyodbc is imported on first use, so sqlite runs need neither the module nor an ODBC driver. """
+    import pyodbc
+    return pyodbc
+
+def azure_column_type(model: Optional[Type[BaseModel]], column: str, annotation: Any) -> str:
+    """ Azure SQL type of a model field, the model azure_types override the default type of its annotation. """
+    return getattr(model, "azure_types", {}).get(column) or azure_sql_type_mapping[annotation]
+
+TABLE_MODELS: Dict[str, Type[BaseModel]] = {
+    MATCHES_TABLE_NAME: Match,
+    PLAYER_STATS_TABLE_NAME: PlayerStats,
+    PARSER_TECH_TABLE_NAME: ParserTech,
+    CHECKPOINTS_TABLE_NAME: Checkpoint,
+    PLAYER_SEASON_STATS_TABLE_NAME: PlayerSeasonStats,
+    TEAM_MATCH_STATS_TABLE_NAME: TeamMatchStats,
+    TEAM_SEASON_STATS_TABLE_NAME: TeamSeasonStats,
+    RUN_METRICS_TABLE_NAME: RunMetric,
+    JOBS_TABLE_NAME: MatchJob,
+    DEAD_LETTERS_TABLE_NAME: DeadLetter,
+}
+
 class DatabaseConnection(ABC):
     """" Base class for database connector. """
     @abstractmethod
@@ -21,12 +50,21 @@ class DatabaseConnection(ABC):
         pass
 
 class SQLiteDatabaseConnection(DatabaseConnection):
-    """ Connector to sqlite database. """
-    def __init__(self, db_name: str):
+    """
+    Connector to sqlite database.
+
+    pragmas are applied to every new connection, e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"}.
+    None keeps sqlite defaults.
+    """
+    def __init__(self, db_name: str, pragmas: Optional[Dict[str, Any]]=None):
         self.db_name = db_name
+        self.pragmas = pragmas or {}
 
     def connect(self) -> Any:
-        return sqlite3.connect(self.db_name)
+        con = sqlite3.connect(self.db_name)
+        for name, value in self.pragmas.items():
+            con.execute(f"PRAGMA {name}={value}")
+        return con
     
     def get_cursor(self, connection: Any) -> Any:
         return connection.cursor()
@@ -46,17 +84,65 @@ class AzureSQLDatabaseConnection(DatabaseConnection):
             raise NoEnvaronmentalVariableException("password")
 
     def connect(self) -> Any:
-        return pyodbc.connect(driver=self._driver, server=self._server_name, database=self._db_name, uid=self._user_name, pwd=self._password, encrypt="yes")
+        return _pyodbc().connect(driver=self._driver, server=self._server_name, database=self._db_name, uid=self._user_name, pwd=self._password, encrypt="yes")
 
     def get_cursor(self, connection: Any) -> Any:
         return connection.cursor()
     
 class Database(ABC):
-    """Interface for database."""
-    def __init__(self, database_connection: DatabaseConnection):
+    """
+    Interface for database.
+
+    write_mode "upsert" makes insert_to_db update rows with the same model unique key instead of adding duplicates,
+    "insert" appends rows.
+    """
+    def __init__(self, database_connection: DatabaseConnection, write_mode: str = "insert"):
+        if write_mode not in ("insert", "upsert"):
+            raise ValueError(f"Unknown write_mode {write_mode!r}, expected 'insert' or 'upsert'")
         self.database_connection = database_connection
+        self.write_mode = write_mode
         self.con = self.database_connection.connect()
         self.cur = self.database_connection.get_cursor(self.con)
+        self._transaction_depth = 0
+        # insert statements by (table, columns), built once
+        self._insert_sql_cache = {}
+        # match ids looked up or inserted during this run, see check_matches_not_in_db
+        self._checked_match_ids = set()
+        self._known_match_ids = set()
+
+    @contextmanager
+    def transaction(self) -> Iterator["Database"]:
+        """
+        Unit of work: every insert_to_db inside the block is committed once at the end, or rolled back
+        together if the block raises. Nested blocks join the outermost one.
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                try:
+                    self.con.rollback()
+                except Exception:
+                    # e.g. the connection dropped, the error that ended the block is the one to report
+                    logger.warning("Rollback failed", exc_info=True)
+                # rolled back inserts may have been cached as known
+                self._checked_match_ids.clear()
+                self._known_match_ids.clear()
+            raise
+        self._transaction_depth -= 1
+        if not self._transaction_depth:
+            self._commit_now()
+
+    def _commit(self) -> None:
+        """ Commits unless a transaction block is open, then its end commits. """
+        if not self._transaction_depth:
+            self._commit_now()
+
+    def _commit_now(self) -> None:
+        with metrics.timer("db_commit"):
+            self.con.commit()
 
     @abstractmethod
     def create_table(self, model: BaseModel, table_name: str) -> None:
@@ -67,13 +153,21 @@ class Database(ABC):
         pass
 
     @abstractmethod
-    def get_custom_query(self, sql_querry: str):
+    def create_indexes(self) -> None:
+        pass
+
+    @abstractmethod
+    def get_custom_query(self, sql_querry: str, params: Tuple[Any, ...]=()):
         pass
 
     @abstractmethod
     def insert_to_db(self) -> None:
         pass
 
+    @abstractmethod
+    def execute(self, sql_querry: str, params: Tuple[Any, ...]=()) -> None:
+        pass
+
     @abstractmethod
     def check_matches_not_in_db(self, matches: List[Match]) -> List[Match]:
         pass
@@ -86,58 +180,323 @@ class BasicDatabase(Database):
     """
     Basic SQL interface for sqlite database.
     """
-    def __init__(self, database_connection: DatabaseConnection):
-        super().__init__(database_connection)
+    # bound parameters per statement in chunked IN queries, sqlite before 3.32 allows 999
+    max_query_params = 900
+
+    def __init__(self, database_connection: DatabaseConnection, write_mode: str = "insert"):
+        super().__init__(database_connection, write_mode)
     
     def create_table(self, model: BaseModel, table_name: str) -> None:
-        columns = "id INTEGER PRIMARY KEY AUTOINCREMENT, " + ', '.join([f'{var} {type_mapping[t]}' for var, t in get_type_hints(model).items()])
+        columns = "id INTEGER PRIMARY KEY AUTOINCREMENT, " + ', '.join([f'{var} {type_mapping[f.annotation]}' for var, f in model.model_fields.items()])
         self.cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({columns})')
         self.con.commit()
 
+    def create_indexes(self) -> None:
+        """ Creates missing unique keys and indexes declared on the models, safe to call on every run. """
+        for table, model in TABLE_MODELS.items():
+            if model.unique:
+                self._create_index(f"uq_{table}", table, model.unique, unique=True)
+            for columns in model.indexes:
+                self._create_index(f"ix_{table}_{'_'.join(columns)}", table, columns)
+        self.con.commit()
+
+    def _create_index(self, name: str, table: str, columns: Tuple[str, ...], unique: bool = False) -> None:
+        try:
+            self.cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        except sqlite3.IntegrityError:
+            # duplicates written before the key existed have to be cleaned up by hand
+            logger.warning(f"Unique key {name} not created, {table} has duplicated {columns}")
+
+    def _upsert_key(self, table: str, columns: List[str]) -> Tuple[str, ...]:
+        """ Unique key to upsert on, empty when rows should just be appended. """
+        model = TABLE_MODELS.get(table)
+        if model is None or not set(model.unique) <= set(columns):
+            return ()
+        if self.write_mode != "upsert" and not getattr(model, "always_upsert", False):
+            return ()
+        return model.unique
+
+    def _cached_insert_sql(self, table: str, columns: List[str]) -> str:
+        key = (table, tuple(columns))
+        sql = self._insert_sql_cache.get(key)
+        if sql is None:
+            sql = self._insert_sql_cache[key] = self._insert_sql(table, columns)
+        return sql
+
+    def _insert_sql(self, table: str, columns: List[str]) -> str:
+        cols = ",".join(columns)
+        sql = f"""Insert into {table} ({cols}) values ({",".join(["?" for i in columns])})"""
+        key = self._upsert_key(table, columns)
+        if key:
+            updates = [f"{c}=excluded.{c}" for c in columns if c not in key]
+            sql += f" ON CONFLICT ({','.join(key)}) DO " + (f"UPDATE SET {','.join(updates)}" if updates else "NOTHING")
+        return sql
+
     def delete_tables(self, tables: list) -> None:
         for t in tables:
             self.cur.execute(f"DROP TABLE IF EXISTS {t}")
         self.con.commit() 
         
-    def get_custom_query(self, sql_querry: str) -> List[Any]:
-        self.cur.execute(sql_querry)
-        return self.cur.fetchall()
+    def get_custom_query(self, sql_querry: str, params: Tuple[Any, ...]=()) -> List[Any]:
+        with metrics.timer("db_query"):
+            self.cur.execute(sql_querry, params)
+            return self.cur.fetchall()
     
-    def insert_to_db(self, table: str, columns: List[str], values: List[Tuple[Any]]) -> None:
-        cols = ",".join(columns)
-        sql = f"""Insert into {table} ({cols}) values ({",".join(["?" for i in columns])})"""
+    def insert_to_db(self, table: str, columns: List[str], values: Union[List[Tuple[Any]], RecordBatch]) -> None:
+        """ Inserts values (row tuples in columns order, or a RecordBatch) with one executemany. """
+        sql = self._cached_insert_sql(table, columns)
         try:
-            self.cur.executemany(sql, values)
-            self.con.commit()
+            with metrics.timer("db_insert", table=table):
+                self.cur.executemany(sql, values)
+            self._commit()
+            self._remember_match_ids(table, columns, values)
         except sqlite3.ProgrammingError as e:
-            print(f"SQL command incorrect: {sql}, columns should be a list, values should be a list of tuples, got {type(values)} of {type(values[0])}")
+            logger.info(f"SQL command incorrect: {sql}, columns should be a list, values should be a list of tuples, got {type(values)} of {type(values[0])}")
             raise(e)
 
+    def execute(self, sql_querry: str, params: Tuple[Any, ...]=()) -> None:
+        """ Runs a statement without results (UPDATE, DELETE), committed like insert_to_db. """
+        self.cur.execute(sql_querry, params)
+        self._commit()
+
+    def table_columns(self, table: str) -> List[str]:
+        """ Columns of an existing table, empty when there is no such table. """
+        return [row[1] for row in self.get_custom_query(f"PRAGMA table_info({table})")]
+
+    def add_column(self, table: str, column: str, annotation: Any) -> None:
+        """ Adds a column of a model field type to an existing table, existing rows get NULL. """
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type_mapping[annotation]}")
+
+    def widen_column(self, table: str, column: str, sql_type: str) -> bool:
+        """ Changes the type of an existing column to an azure_types one, sqlite text columns have no length. """
+        return False
+
+    def update_rows(self, table: str, key: Tuple[str, ...], columns: List[str], values: List[Tuple[Any]]) -> None:
+        """ Sets columns of the rows identified by key, values are tuples of the columns followed by the key. """
+        sql = self._update_sql(table, key, columns)
+        with metrics.timer("db_update", table=table):
+            self.cur.executemany(sql, values)
+        self._commit()
+
+    def _update_sql(self, table: str, key: Tuple[str, ...], columns: List[str]) -> str:
+        return f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE {' AND '.join(f'{k} = ?' for k in key)}"
+
+    def claim_sql(self, table: str, assignments: str, condition: str, order_by: str, limit: int) -> str:
+        """
+        Statement updating at most limit rows matching condition, taken in order_by order, in one atomic step.
+        Parameters are the ones of assignments followed by the ones of condition.
+        """
+        return (f"UPDATE {table} SET {assignments} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE {condition} ORDER BY {order_by} LIMIT {int(limit)})")
+
+    def _remember_match_ids(self, table: str, columns: List[str], values: List[Tuple[Any]]) -> None:
+        if table == MATCHES_TABLE_NAME and "match_id" in columns:
+            i = columns.index("match_id")
+            self._checked_match_ids.update(v[i] for v in values)
+            self._known_match_ids.update(v[i] for v in values)
+
     def check_matches_not_in_db(self, matches: List[Match]) -> List[Match]:
         """ After scraping match_ids from the website we need to compare those ids with those already in
-        db. That method allows to get only matches that are NOT in db yet."""
-        db_data = self.get_custom_query(f"SELECT DISTINCT match_id from matches")
-        db_scraped_match_ids = [i[0] for i in db_data] if db_data else []
-        matches = [m for m in matches if m.match_id not in db_scraped_match_ids]
-        return matches if matches else []
+        db. That method allows to get only matches that are NOT in db yet.
+        Only ids not checked before in this run are looked up, in chunks of max_query_params."""
+        unchecked = list({m.match_id for m in matches} - self._checked_match_ids)
+        for i in range(0, len(unchecked), self.max_query_params):
+            chunk = unchecked[i:i + self.max_query_params]
+            db_data = self.get_custom_query(
+                f"SELECT DISTINCT match_id FROM {MATCHES_TABLE_NAME} WHERE match_id IN ({','.join('?' * len(chunk))})",
+                tuple(chunk))
+            self._known_match_ids.update(row[0] for row in db_data)
+            self._checked_match_ids.update(chunk)
+        return [m for m in matches if m.match_id not in self._known_match_ids]
 
     def recreate_db(self) -> None:
         """Clean and recreates db tables."""
-        tables = [MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME]
+        tables = list(TABLE_MODELS)
         self.delete_tables(tables=tables)
-        for cl, table in zip([Match, PlayerStats, ParserTech], tables):
-            self.create_table(cl, table)
+        for table, model in TABLE_MODELS.items():
+            self.create_table(model, table)
+        self.create_indexes()
+        self._checked_match_ids.clear()
+        self._known_match_ids.clear()
         logger.info(f"Tables: {tables} has been recreated.")
 
 
 class AzureDatabase(BasicDatabase):
     """
     Database interface for Azure SQL database.
+
+    Inserts are sent with pyodbc fast_executemany (one round trip per batch instead of per row) in batches of
+    batch_size rows. Outside a transaction every batch is committed on its own, so when the connection drops
+    only the failed batch is sent again after reconnecting, up to retries times. When the commit itself fails
+    the server may have committed the batch anyway, it is sent again only if it is not found, see _batch_committed.
     """
-    def __init__(self, database_connection: DatabaseConnection):
-        super().__init__(database_connection)
+    # sql server allows 2100 parameters per statement
+    max_query_params = 2000
+    # dropped connection, timeout and deadlock SQLSTATEs, Azure throttling and failover error numbers
+    transient_sqlstates = ("08S01", "08001", "HYT00", "40001")
+    transient_error_numbers = ("40197", "40501", "40613", "49918", "49919", "49920", "10928", "10929")
+
+    def __init__(self, database_connection: DatabaseConnection, write_mode: str = "insert", batch_size: int = 1000,
+                 fast_executemany: bool = True, retries: int = 3, retry_backoff: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__(database_connection, write_mode)
+        self.batch_size = max(1, batch_size)
+        self.fast_executemany = fast_executemany
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.sleep = sleep
+        self.cur.fast_executemany = fast_executemany
+
+    @classmethod
+    def from_config(cls, database_connection: DatabaseConnection, config: dict, **kwargs) -> "AzureDatabase":
+        """ Builds database from config.yaml, bulk settings are in azure_connection.bulk. """
+        bulk_config = config["azure_connection"].get("bulk", {})
+        return cls(
+            database_connection,
+            write_mode=config.get("database", {}).get("write_mode", "insert"),
+            batch_size=bulk_config.get("batch_size", 1000),
+            fast_executemany=bulk_config.get("fast_executemany", True),
+            retries=bulk_config.get("retries", 3),
+            retry_backoff=bulk_config.get("retry_backoff", 1.0),
+            **kwargs
+        )
+
+    def reconnect(self) -> None:
+        try:
+            self.con.close()
+        except _pyodbc().Error:
+            pass
+        self.con = self.database_connection.connect()
+        self.cur = self.database_connection.get_cursor(self.con)
+        self.cur.fast_executemany = self.fast_executemany
+
+    def insert_to_db(self, table: str, columns: List[str], values: Union[List[Tuple[Any]], RecordBatch]) -> None:
+        sql = self._cached_insert_sql(table, columns)
+        for i in range(0, len(values), self.batch_size):
+            self._execute_batch(sql, list(values[i:i + self.batch_size]), table, columns)
+        self._remember_match_ids(table, columns, values)
+
+    def update_rows(self, table: str, key: Tuple[str, ...], columns: List[str], values: List[Tuple[Any]]) -> None:
+        sql = self._update_sql(table, key, columns)
+        for i in range(0, len(values), self.batch_size):
+            self._execute_batch(sql, list(values[i:i + self.batch_size]), table)
+
+    def claim_sql(self, table: str, assignments: str, condition: str, order_by: str, limit: int) -> str:
+        # READPAST skips rows locked by a concurrent claim instead of waiting for them
+        return (f"UPDATE {table} SET {assignments} WHERE id IN "
+                f"(SELECT TOP ({int(limit)}) id FROM {table} WITH (UPDLOCK, READPAST, ROWLOCK) WHERE {condition} ORDER BY {order_by})")
+
+    def table_columns(self, table: str) -> List[str]:
+        return [row[0] for row in self.get_custom_query(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION", (table,))]
+
+    def add_column(self, table: str, column: str, annotation: Any) -> None:
+        self.execute(f"ALTER TABLE {table} ADD {column} {azure_column_type(TABLE_MODELS.get(table), column, annotation)}")
+
+    def widen_column(self, table: str, column: str, sql_type: str) -> bool:
+        """ Returns False when the column already has sql_type. Indexes on the column are dropped, create_indexes adds them back. """
+        current = self.get_custom_query(
+            "SELECT DATA_TYPE, CHARACTER_MAXIMUM_LENGTH FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? AND COLUMN_NAME = ?",
+            (table, column))
+        if not current or f"{current[0][0]}({current[0][1]})".upper() == sql_type.upper():
+            return False
+        indexes = self.get_custom_query(
+            "SELECT DISTINCT i.name FROM sys.indexes i JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id "
+            "JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id "
+            "WHERE i.object_id = OBJECT_ID(?) AND c.name = ? AND i.is_primary_key = 0", (table, column))
+        for (name,) in indexes:
+            self.execute(f"DROP INDEX {name} ON {table}")
+        self.execute(f"ALTER TABLE {table} ALTER COLUMN {column} {sql_type}")
+        return True
+
+    def _execute_batch(self, sql: str, batch: List[Tuple[Any]], table: str, columns: Optional[List[str]] = None) -> None:
+        """ Sends one batch, columns are given for inserts (updates can be sent again as they are). """
+        attempt = 0
+        while True:
+            committing = False
+            try:
+                with metrics.timer("db_insert", table=table):
+                    self.cur.executemany(sql, batch)
+                committing = True
+                self._commit()
+                return
+            except _pyodbc().Error as e:
+                # inside a transaction earlier statements are lost with the connection, the caller has to redo it
+                if self._transaction_depth or attempt >= self.retries or not self._is_transient(e):
+                    raise
+                attempt += 1
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                logger.warning(f"Transient database error, retrying batch of {len(batch)} rows in {delay:.0f}s "
+                               f"({attempt}/{self.retries}): {e}")
+                metrics.inc("db_retries")
+                self.sleep(delay)
+                self.reconnect()
+                if committing and self._batch_committed(table, columns, batch, e):
+                    logger.info(f"Batch of {len(batch)} rows was committed before the connection dropped")
+                    return
+
+    def _batch_committed(self, table: str, columns: Optional[List[str]], batch: List[Tuple[Any]], error: Exception) -> bool:
+        """
+        Whether a batch whose commit got no answer is in the table. A batch is committed whole, so its first row
+        is looked up by the model unique key. Updates and upserts can be sent again anyway, an insert into a table
+        without a key can't be checked and error is raised instead of risking duplicates.
+        """
+        if columns is None or self._upsert_key(table, columns):
+            return False
+        model = TABLE_MODELS.get(table)
+        key = model.unique if model else ()
+        if not key or not set(key) <= set(columns):
+            raise error
+        row = batch[0]
+        found = self.get_custom_query(f"SELECT COUNT(*) FROM {table} WHERE {' AND '.join(f'{c} = ?' for c in key)}",
+                                      tuple(row[columns.index(c)] for c in key))
+        return found[0][0] > 0
+
+    def _is_transient(self, error: Exception) -> bool:
+        sqlstate = error.args[0] if error.args else ""
+        message = " ".join(str(arg) for arg in error.args)
+        return sqlstate in self.transient_sqlstates or any(number in message for number in self.transient_error_numbers)
     
     def create_table(self, model: BaseModel, table_name: str) -> None:
-        columns = "id INT identity(1,1), " + ', '.join([f'{var} {azure_sql_type_mapping[t]}' for var, t in get_type_hints(model).items()])
-        self.cur.execute(f'CREATE TABLE {table_name} ({columns})')
-        self.con.commit()
\ No newline at end of file
+        columns = "id INT identity(1,1), " + ', '.join([f'{var} {azure_column_type(model, var, f.annotation)}' for var, f in model.model_fields.items()])
+        self.cur.execute(f"IF OBJECT_ID('{table_name}', 'U') IS NULL CREATE TABLE {table_name} ({columns})")
+        self.con.commit()
+
+    def _create_index(self, name: str, table: str, columns: Tuple[str, ...], unique: bool = False) -> None:
+        try:
+            self.cur.execute(f"IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{name}') "
+                             f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})")
+        except _pyodbc().IntegrityError:
+            logger.warning(f"Unique key {name} not created, {table} has duplicated {columns}")
+
+    def _insert_sql(self, table: str, columns: List[str]) -> str:
+        key = self._upsert_key(table, columns)
+        if not key:
+            return super()._insert_sql(table, columns)
+        updates = [f"target.{c}=source.{c}" for c in columns if c not in key]
+        return (
+            f"MERGE INTO {table} WITH (HOLDLOCK) AS target "
+            f"USING (VALUES ({','.join('?' * len(columns))})) AS source ({','.join(columns)}) "
+            f"ON {' AND '.join(f'target.{c}=source.{c}' for c in key)} "
+            + (f"WHEN MATCHED THEN UPDATE SET {','.join(updates)} " if updates else "")
+            + f"WHEN NOT MATCHED THEN INSERT ({','.join(columns)}) VALUES ({','.join(f'source.{c}' for c in columns)});"
+        )
+
+
+def open_sqlite(config: dict) -> BasicDatabase:
+    """ sqlite backend, file and pragmas from the sqlite section of config.yaml. """
+    sqlite_config = config.get("sqlite", {})
+    return BasicDatabase(SQLiteDatabaseConnection(sqlite_config.get("db_name", "football_db_prod.db"), sqlite_config.get("pragmas")),
+                         config.get("database", {}).get("write_mode", "insert"))
+
+
+def open_azure(config: dict) -> AzureDatabase:
+    """ Azure SQL backend, credentials are read from the environment variables named in azure_connection. """
+    db_connection = AzureSQLDatabaseConnection(
+        config["azure_connection"]["driver"],
+        config["azure_connection"]["server"],
+        config["azure_connection"]["db_name"],
+        os.getenv(config["azure_connection"]["azure_uid"]),
+        os.getenv(config["azure_connection"]["azure_pwd"])
+        )
+    return AzureDatabase.from_config(db_connection, config)
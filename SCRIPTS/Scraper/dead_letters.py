@@ -0,0 +1,98 @@
+import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from Scraper.database import Database
+from Scraper.models import Match, DeadLetter
+from Scraper.logger import logger
+from Scraper.records import schema_for
+from Scraper.constants import DEAD_LETTERS_TABLE_NAME, DEAD_LETTER_PENDING, DEAD_LETTER_GIVEN_UP, ERROR_MSG_LENGTH
+
+
+def is_permanent(error: Exception) -> bool:
+    """ Client errors (404, 410...) fail the same way on every attempt, 429 is a rate limit and passes later. """
+    if not isinstance(error, requests.exceptions.HTTPError):
+        return False
+    status = error.response.status_code if error.response is not None else (error.args[0] if error.args else None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+class DeadLetterStore:
+    """
+    Matches whose fetch or parse failed, kept in the database so a run goes on with the other matches and the
+    failed ones are retried by a later retry pass (Scraper.retry_dead_letters).
+
+    Every failure records the error and schedules the next attempt retry_delay * 2 ** (attempts - 1) seconds
+    later, at most max_retry_delay. After max_attempts failures, or after the first one for errors that cannot
+    pass on a retry (see is_permanent), the match is given up: it stays in the table with its error and is skipped
+    by later runs. A match inserted by a retry is removed.
+    """
+    def __init__(self, db: Database, retry_delay: float = 3600, max_retry_delay: float = 7 * 24 * 3600,
+                 max_attempts: int = 5, clock: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.db = db
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.db.create_table(DeadLetter, DEAD_LETTERS_TABLE_NAME)
+        self.schema = schema_for(DeadLetter)
+        self.match_columns = list(schema_for(Match).columns)
+
+    @classmethod
+    def from_config(cls, db: Database, config: dict, **kwargs) -> Optional["DeadLetterStore"]:
+        """ Store from the dead_letters section of config.yaml, None when disabled. """
+        dead_letters_config = config.get("dead_letters", {})
+        if not dead_letters_config.get("enabled"):
+            return None
+        return cls(db, dead_letters_config.get("retry_delay", 3600), dead_letters_config.get("max_retry_delay", 7 * 24 * 3600),
+                   dead_letters_config.get("max_attempts", 5), **kwargs)
+
+    def record(self, match: Match, error: Exception, url: Optional[str] = None) -> str:
+        """ Records a failed attempt of match, returns its new status. """
+        now = self.clock()
+        rows = self.db.get_custom_query(f"SELECT attempts FROM {DEAD_LETTERS_TABLE_NAME} WHERE match_id = ?", (match.match_id,))
+        attempts = (rows[0][0] if rows else 0) + 1
+        if attempts >= self.max_attempts or is_permanent(error):
+            status, next_retry_at = DEAD_LETTER_GIVEN_UP, None
+        else:
+            status = DEAD_LETTER_PENDING
+            next_retry_at = now + datetime.timedelta(seconds=min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay))
+        error_class, error_msg = type(error).__name__, str(error)[:ERROR_MSG_LENGTH]
+        if rows:
+            self.db.execute(
+                f"UPDATE {DEAD_LETTERS_TABLE_NAME} SET status = ?, error_class = ?, error_msg = ?, attempts = ?, "
+                f"next_retry_at = ?, updated_at = ? WHERE match_id = ?",
+                (status, error_class, error_msg, attempts, next_retry_at, now, match.match_id))
+        else:
+            self.db.insert_to_db(DEAD_LETTERS_TABLE_NAME, list(self.schema.columns), [self.schema.coerce({
+                **match.__dict__, "url": url, "status": status, "error_class": error_class, "error_msg": error_msg,
+                "attempts": attempts, "next_retry_at": next_retry_at, "updated_at": now})])
+        logger.warning(f"Match {match.match_id} dead-lettered after attempt {attempts}: {error_class}, "
+                       + (f"next retry at {next_retry_at:%Y-%m-%d %H:%M}" if next_retry_at else "given up"))
+        return status
+
+    def exclude(self, matches: List[Match]) -> List[Match]:
+        """ Matches not in the dead letters, the others wait for the retry pass or were given up. """
+        dead = set()
+        ids = [m.match_id for m in matches]
+        for i in range(0, len(ids), self.db.max_query_params):
+            chunk = ids[i:i + self.db.max_query_params]
+            dead.update(row[0] for row in self.db.get_custom_query(
+                f"SELECT match_id FROM {DEAD_LETTERS_TABLE_NAME} WHERE match_id IN ({','.join('?' * len(chunk))})", tuple(chunk)))
+        return [m for m in matches if m.match_id not in dead]
+
+    def due(self, limit: Optional[int] = None) -> List[Tuple[Optional[str], Match]]:
+        """ (competition url, match) of pending matches whose retry time has come, longest waiting first. """
+        rows = self.db.get_custom_query(
+            f"SELECT url, {','.join(self.match_columns)} FROM {DEAD_LETTERS_TABLE_NAME} "
+            f"WHERE status = ? AND next_retry_at <= ? ORDER BY next_retry_at", (DEAD_LETTER_PENDING, self.clock()))
+        return [(row[0], Match(**dict(zip(self.match_columns, row[1:])))) for row in rows[:limit]]
+
+    def resolved(self, match_ids: List[str]) -> None:
+        for i in range(0, len(match_ids), self.db.max_query_params):
+            chunk = match_ids[i:i + self.db.max_query_params]
+            self.db.execute(f"DELETE FROM {DEAD_LETTERS_TABLE_NAME} WHERE match_id IN ({','.join('?' * len(chunk))})", tuple(chunk))
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.db.get_custom_query(f"SELECT status, COUNT(*) FROM {DEAD_LETTERS_TABLE_NAME} GROUP BY status"))
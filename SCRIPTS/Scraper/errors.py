@@ -14,4 +14,19 @@ class NoEnvaronmentalVariableException(Exception):
     """ Raised when a scraped URL is invalid. """
     def __init__(self, var_name):
         self.message = f"{var_name} is not defined. Please define it as envarionmental variable."
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class CircuitOpenException(Exception):
+    """ Raised when requests to a host are suspended after repeated failures. """
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        self.message = f"Circuit for {host} is open after repeated failures, next attempt in {retry_in:.0f}s"
+        super().__init__(self.message)
+
+class ResponseTooLargeException(Exception):
+    """ Raised when a response body exceeds the configured maximum size. """
+    def __init__(self, url, max_size):
+        self.url = url
+        self.message = f"Response from {url} exceeds {max_size} bytes"
+        super().__init__(self.message)
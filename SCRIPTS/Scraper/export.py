@@ -0,0 +1,155 @@
+import os
+import json
+import datetime
+from urllib.parse import quote
+from typing import Dict, List, Optional, Tuple, Type, get_args
+
+from pydantic import BaseModel
+
+from Scraper.database import Database, TABLE_MODELS
+from Scraper.records import schema_for
+from Scraper.logger import logger
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+PARTITION_COLUMNS = ("competition", "season")
+EXPORT_TABLES = [MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME]
+MANIFEST_FILE = "_manifest.json"
+# partition value of rows without a match, read back as null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow, install it with 'pip install pyarrow'")
+
+def arrow_schema(model: Type[BaseModel], exclude: Tuple[str, ...] = ()) -> "pa.Schema":
+    """ Arrow schema with the model fields in model order, optional fields are nullable. """
+    _require_pyarrow()
+    arrow_types = {
+        str: pa.string(),
+        int: pa.int64(),
+        float: pa.float64(),
+        datetime.date: pa.date32(),
+        datetime.datetime: pa.timestamp("us"),
+    }
+    fields = []
+    for name, field in model.model_fields.items():
+        if name in exclude:
+            continue
+        args = get_args(field.annotation)
+        base = next(a for a in args if a is not type(None)) if args else field.annotation
+        fields.append(pa.field(name, arrow_types[base], nullable=type(None) in args))
+    return pa.schema(fields)
+
+
+class ParquetExporter:
+    """
+    Exports tables into Parquet datasets partitioned by competition and season:
+
+        <directory>/<table>/competition=<competition>/season=<season>/part-0.parquet
+
+    players stats and parser_tech rows get their partition from the match they belong to, rows without a match in
+    the matches table (e.g. parser_tech rows of schedule pages) go to the partition with null competition and season.
+    Partition values live in the directory names only.
+    A manifest keeps the row count and the highest id of every exported partition, both read in one grouped query,
+    so export reads and writes only new partitions and the ones which got new rows since the last export.
+    Rows changed in place (upserts, migrate.py backfills) keep the count and ids, force rewrites every partition.
+    """
+    def __init__(self, db: Database, directory: str):
+        _require_pyarrow()
+        self.db = db
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+    def export(self, tables: Optional[List[str]] = None, force: bool = False) -> Dict[str, int]:
+        """ Exports new and changed partitions (all of them with force), returns the number of written partitions per table. """
+        manifest = self._load_manifest()
+        written = {}
+        for table in tables or EXPORT_TABLES:
+            exported = manifest.setdefault(table, {})
+            written[table] = 0
+            for competition, season, count, max_id in self._partition_markers(table):
+                key = self._partition_path(competition, season)
+                if not force and exported.get(key) == [count, max_id]:
+                    continue
+                self._write_partition(table, competition, season)
+                exported[key] = [count, max_id]
+                written[table] += 1
+                # saved after every partition, an interrupted export goes on from there
+                self._save_manifest(manifest)
+            logger.info(f"Exported {written[table]} new or changed partitions of {table}")
+        return written
+
+    def _partition_markers(self, table: str) -> List[Tuple[Optional[str], Optional[str], int, int]]:
+        """ Competition, season, row count and highest id of every partition of table. """
+        if table == MATCHES_TABLE_NAME:
+            sql = f"SELECT competition, season, COUNT(*), MAX(id) FROM {MATCHES_TABLE_NAME} GROUP BY competition, season"
+        else:
+            sql = (f"SELECT m.competition, m.season, COUNT(*), MAX(t.id) FROM {table} t "
+                   f"LEFT JOIN {MATCHES_TABLE_NAME} m ON m.match_id = t.match_id GROUP BY m.competition, m.season")
+        return [tuple(row) for row in self.db.get_custom_query(sql)]
+
+    def _write_partition(self, table: str, competition: Optional[str], season: Optional[str]) -> None:
+        model = TABLE_MODELS[table]
+        schema = schema_for(model)
+        if table == MATCHES_TABLE_NAME:
+            sql = f"SELECT {', '.join(schema.columns)} FROM {MATCHES_TABLE_NAME} WHERE competition = ? AND season = ?"
+            params = (competition, season)
+        else:
+            sql = (f"SELECT {', '.join('t.' + c for c in schema.columns)} FROM {table} t "
+                   f"LEFT JOIN {MATCHES_TABLE_NAME} m ON m.match_id = t.match_id WHERE ")
+            sql += "m.competition = ? AND m.season = ?" if competition is not None else "m.match_id IS NULL"
+            params = (competition, season) if competition is not None else ()
+        # database values (e.g. dates stored as text in sqlite) get the model types
+        rows = schema.validate_rows(self.db.get_custom_query(sql, params))
+        exclude = PARTITION_COLUMNS if table == MATCHES_TABLE_NAME else ()
+        arrow = arrow_schema(model, exclude)
+        columns = dict(zip(schema.columns, zip(*rows))) if rows else {}
+        arrays = [pa.array(columns.get(f.name, ()), type=f.type) for f in arrow]
+        partition_dir = os.path.join(self.directory, table, self._partition_path(competition, season))
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, "part-0.parquet")
+        pq.write_table(pa.Table.from_arrays(arrays, schema=arrow), path + ".tmp")
+        # readers never see a half written file
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _partition_path(competition: Optional[str], season: Optional[str]) -> str:
+        return os.path.join(*(f"{name}={NULL_PARTITION if value is None else quote(value, safe='')}"
+                              for name, value in zip(PARTITION_COLUMNS, (competition, season))))
+
+    def _load_manifest(self) -> Dict[str, Dict[str, List[int]]]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as file:
+            return json.load(file)
+
+    def _save_manifest(self, manifest: Dict[str, Dict[str, List[int]]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.manifest_path + ".tmp", "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+def open_dataset(directory: str, table: str) -> "ds.Dataset":
+    """ Lazy, memory-mapped dataset of an exported table, with competition and season as columns. """
+    _require_pyarrow()
+    return ds.dataset(
+        os.path.abspath(os.path.join(directory, table)),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([pa.field(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive"),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+def read_season(directory: str, table: str, competition: str, season: str, columns: Optional[List[str]] = None) -> "pa.Table":
+    """ Reads one competition season, only files of that partition are opened. """
+    dataset = open_dataset(directory, table)
+    return dataset.to_table(columns=columns, filter=(ds.field("competition") == competition) & (ds.field("season") == season))
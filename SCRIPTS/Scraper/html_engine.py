@@ -0,0 +1,143 @@
+import re
+from bisect import bisect_right
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Optional
+
+from bs4 import BeautifulSoup
+
+from Scraper.logger import logger
+from Scraper.registry import PARSER_ENGINES
+
+DEFAULT_ENGINE = "html.parser"
+
+TABLE_START_RE = re.compile(r"<table\b[^>]*?\bid=[\"']([^\"']+)[\"'][^>]*>", re.IGNORECASE)
+TABLE_END_RE = re.compile(r"</table\s*>", re.IGNORECASE)
+COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+class ParserEngine(ABC):
+    """ Builds a BeautifulSoup tree with a given tree builder, so Parser code is engine agnostic. """
+    name: str = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def parse(self, markup: str) -> BeautifulSoup:
+        pass
+
+
+class HtmlParserEngine(ParserEngine):
+    """ Pure python parser from the standard library. Always available, used as a fallback. """
+    name = "html.parser"
+
+    def parse(self, markup: str) -> BeautifulSoup:
+        return BeautifulSoup(markup, "html.parser")
+
+
+class LxmlEngine(ParserEngine):
+    """ C-backed libxml2 parser, several times faster than html.parser. """
+    name = "lxml"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import lxml
+        except ImportError:
+            return False
+        return True
+
+    def parse(self, markup: str) -> BeautifulSoup:
+        return BeautifulSoup(markup, "lxml")
+
+
+def get_parser_engine(name: Optional[str]) -> ParserEngine:
+    """ Returns engine registered under name (see Scraper.registry), falling back to html.parser if it cannot be used. """
+    engine = PARSER_ENGINES.resolve(name or DEFAULT_ENGINE)
+    if not engine.is_available():
+        logger.warning(f"Parser engine {engine.name} is not installed, falling back to {DEFAULT_ENGINE}")
+        engine = PARSER_ENGINES[DEFAULT_ENGINE]
+    return engine()
+
+
+class CommentSpans:
+    """ Positions of HTML comments in markup. A full parse keeps their content as text, so slice_element skips it too. """
+
+    def __init__(self, markup: str):
+        spans = [m.span() for m in COMMENT_RE.finditer(markup)]
+        self.starts = [start for start, _ in spans]
+        self.ends = [end for _, end in spans]
+
+    def end_of(self, pos: int) -> Optional[int]:
+        """ Returns end of the comment containing pos, None if pos is outside of comments. """
+        i = bisect_right(self.starts, pos) - 1
+        if i >= 0 and pos < self.ends[i]:
+            return self.ends[i]
+        return None
+
+
+def slice_element(markup: str, element_id: str) -> Optional[str]:
+    """ Returns markup of the element with a given id, including nested elements with the same tag. """
+    comments = CommentSpans(markup)
+    start = next((m for m in re.finditer(rf"<([a-zA-Z][a-zA-Z0-9]*)\b[^>]*?\bid=[\"']{re.escape(element_id)}[\"']", markup)
+                  if comments.end_of(m.start()) is None), None)
+    if not start:
+        return None
+    depth = 0
+    for m in re.compile(rf"<(/?){start.group(1)}\b[^>]*>", re.IGNORECASE).finditer(markup, start.start()):
+        if comments.end_of(m.start()) is not None:
+            continue
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            return markup[start.start():m.end()]
+    return None
+
+
+def slice_tables(markup: str, is_target: Callable[[str], bool]) -> List[str]:
+    """
+    Returns markup of every table whose id passes is_target. The raw text is scanned, so tables which fbref
+    ships inside HTML comments (rendered client side) are found as well, see unwrap_commented_tables.
+    """
+    tables = []
+    pos = 0
+    while True:
+        start = TABLE_START_RE.search(markup, pos)
+        if not start:
+            return tables
+        end = TABLE_END_RE.search(markup, start.end())
+        if not end:
+            return tables
+        if is_target(start.group(1)):
+            tables.append(markup[start.start():end.end()])
+        pos = end.end()
+
+
+def unwrap_commented_tables(markup: str, is_target: Callable[[str], bool]) -> str:
+    """ Drops the comment markers around comments holding a table whose id passes is_target, so a full parse finds it like slice_tables. """
+    if "<!--" not in markup:
+        return markup
+
+    def unwrap(comment: re.Match) -> str:
+        content = comment.group(0)[4:-3]
+        if any(is_target(table.group(1)) for table in TABLE_START_RE.finditer(content)):
+            return content
+        return comment.group(0)
+
+    return COMMENT_RE.sub(unwrap, markup)
+
+
+def pre_slice(markup: str, element_ids: Iterable[str] = (), is_target_table: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """ Joins the requested elements and tables into a small document. Returns None if nothing was found. """
+    fragments = []
+    for element_id in element_ids:
+        fragment = slice_element(markup, element_id)
+        if fragment is None:
+            return None
+        fragments.append(fragment)
+    if is_target_table:
+        tables = slice_tables(markup, is_target_table)
+        if not tables:
+            return None
+        fragments.extend(tables)
+    return "<html><body>" + "".join(fragments) + "</body></html>"
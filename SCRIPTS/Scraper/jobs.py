@@ -0,0 +1,232 @@
+import os
+import time
+import uuid
+import socket
+import datetime
+from typing import Callable, Dict, List, Optional
+
+from Scraper.database import Database
+from Scraper.models import Match, MatchJob
+from Scraper.logger import logger
+from Scraper.records import schema_for
+from Scraper.scraper import Scraper
+from Scraper.metrics import metrics
+from Scraper.constants import JOBS_TABLE_NAME, JOB_QUEUED, JOB_LEASED, JOB_DONE, JOB_FAILED, ERROR_MSG_LENGTH
+
+
+class JobQueue:
+    """
+    Shared queue of match fetch jobs in the database, so several scraper workers (processes on one host or on
+    several hosts) split a crawl between them.
+
+    - claim marks up to limit free jobs (queued, or leased with an expired lease) as leased by the worker in one
+      UPDATE, so no two workers get the same job,
+    - heartbeat renews the leases of a working worker, the jobs of a worker that died are claimed again once
+      their leases expire,
+    - complete marks jobs done in the transaction inserting their matches, and only the jobs the worker still
+      holds: a job claimed again after its lease expired is inserted by one worker only,
+    - fail queues a job again, after max_attempts it is left failed with the error,
+    - release gives the jobs of a stopping worker back, a worker stopped by an error doesn't refund their attempts.
+    """
+    def __init__(self, db: Database, lease_seconds: float = 300, max_attempts: int = 3,
+                 clock: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.db = db
+        self.lease = datetime.timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.db.create_table(MatchJob, JOBS_TABLE_NAME)
+        self.schema = schema_for(MatchJob)
+        self.match_columns = list(schema_for(Match).columns)
+
+    @classmethod
+    def from_config(cls, db: Database, config: dict, **kwargs) -> "JobQueue":
+        jobs_config = config.get("jobs", {})
+        return cls(db, jobs_config.get("lease_seconds", 300), jobs_config.get("max_attempts", 3), **kwargs)
+
+    def enqueue(self, url: str, matches: List[Match]) -> int:
+        """ Queues matches that are neither in the database nor queued already, returns their number. """
+        matches = self.db.check_matches_not_in_db(matches)
+        queued = set()
+        ids = [m.match_id for m in matches]
+        for i in range(0, len(ids), self.db.max_query_params):
+            chunk = ids[i:i + self.db.max_query_params]
+            queued.update(row[0] for row in self.db.get_custom_query(
+                f"SELECT match_id FROM {JOBS_TABLE_NAME} WHERE match_id IN ({','.join('?' * len(chunk))})", tuple(chunk)))
+        now = self.clock()
+        values = [self.schema.coerce({**m.__dict__, "url": url, "status": JOB_QUEUED, "attempts": 0, "updated_at": now})
+                  for m in matches if m.match_id not in queued]
+        if values:
+            self.db.insert_to_db(JOBS_TABLE_NAME, list(self.schema.columns), values)
+        logger.info(f"{len(values)} matches of {url} queued")
+        return len(values)
+
+    def claim(self, worker: str, limit: int) -> List[Match]:
+        """ Leases up to limit jobs to worker, returns their matches together with jobs it holds already. """
+        now = self.clock()
+        # jobs of dead workers that used up their attempts are not handed out again
+        self.db.execute(
+            f"UPDATE {JOBS_TABLE_NAME} SET status = ?, worker = NULL, lease_expires = NULL, updated_at = ?, "
+            f"error_msg = 'lease expired' WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+            (JOB_FAILED, now, JOB_LEASED, now, self.max_attempts))
+        self.db.execute(self.db.claim_sql(
+            JOBS_TABLE_NAME,
+            "status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?",
+            "(status = ? OR (status = ? AND lease_expires < ?))", "id", limit),
+            (JOB_LEASED, worker, now + self.lease, now, JOB_QUEUED, JOB_LEASED, now))
+        rows = self.db.get_custom_query(
+            f"SELECT {','.join(self.match_columns)} FROM {JOBS_TABLE_NAME} WHERE worker = ? AND status = ? ORDER BY id",
+            (worker, JOB_LEASED))
+        return [Match(**dict(zip(self.match_columns, row))) for row in rows]
+
+    def heartbeat(self, worker: str) -> None:
+        """ Renews the leases of worker. """
+        now = self.clock()
+        self.db.execute(f"UPDATE {JOBS_TABLE_NAME} SET lease_expires = ?, updated_at = ? WHERE worker = ? AND status = ?",
+                        (now + self.lease, now, worker, JOB_LEASED))
+
+    def complete(self, worker: str, match_ids: List[str]) -> List[str]:
+        """
+        Marks the jobs worker still holds as done and returns their match ids. Call it inside the transaction
+        inserting the matches and insert only the returned ones, the other jobs went to another worker.
+        """
+        done = []
+        now = self.clock()
+        for i in range(0, len(match_ids), self.db.max_query_params - 4):
+            chunk = match_ids[i:i + self.db.max_query_params - 4]
+            in_chunk = f"match_id IN ({','.join('?' * len(chunk))})"
+            # the update comes first, so the rows stay locked until the transaction ends
+            self.db.execute(
+                f"UPDATE {JOBS_TABLE_NAME} SET status = ?, lease_expires = NULL, updated_at = ? "
+                f"WHERE worker = ? AND status = ? AND {in_chunk}", (JOB_DONE, now, worker, JOB_LEASED, *chunk))
+            done += [row[0] for row in self.db.get_custom_query(
+                f"SELECT match_id FROM {JOBS_TABLE_NAME} WHERE worker = ? AND status = ? AND {in_chunk}",
+                (worker, JOB_DONE, *chunk))]
+        return done
+
+    def fail(self, worker: str, match_id: str, error: str) -> None:
+        """ Queues the job again, or leaves it failed once it was tried max_attempts times. """
+        self.db.execute(
+            f"UPDATE {JOBS_TABLE_NAME} SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+            f"lease_expires = NULL, error_msg = ?, updated_at = ? WHERE worker = ? AND status = ? AND match_id = ?",
+            (self.max_attempts, JOB_FAILED, JOB_QUEUED, error[:ERROR_MSG_LENGTH], self.clock(), worker, JOB_LEASED, match_id))
+
+    def release(self, worker: str, refund: bool = True) -> None:
+        """
+        Gives the jobs of a stopping worker back to the queue. Without refund (the worker stopped on an error they
+        may have caused) they keep the attempt, so a job failing every worker ends up failed.
+        """
+        if refund:
+            self.db.execute(
+                f"UPDATE {JOBS_TABLE_NAME} SET status = ?, worker = NULL, lease_expires = NULL, attempts = attempts - 1, "
+                f"updated_at = ? WHERE worker = ? AND status = ?", (JOB_QUEUED, self.clock(), worker, JOB_LEASED))
+        else:
+            self.db.execute(
+                f"UPDATE {JOBS_TABLE_NAME} SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+                f"lease_expires = NULL, updated_at = ? WHERE worker = ? AND status = ?",
+                (self.max_attempts, JOB_FAILED, JOB_QUEUED, self.clock(), worker, JOB_LEASED))
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.db.get_custom_query(f"SELECT status, COUNT(*) FROM {JOBS_TABLE_NAME} GROUP BY status"))
+
+
+class QueueWorker:
+    """
+    Scrapes matches claimed from a JobQueue until no job is left for idle_timeout seconds.
+
+    Every worker fetches through its own api_consumer, so it keeps its own rate budget (workers sharing an
+    egress IP should split the budget, see jobs.workers_per_host in config.yaml). Claimed matches are fetched
+    and parsed one after another and written in one transaction per claim through the Scraper. When the claim is
+    rejected its matches are written one by one and the failing ones are failed in the queue.
+    """
+    def __init__(self, scraper: Scraper, queue: JobQueue, config: Optional[dict] = None, worker_id: Optional[str] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        jobs_config = (config or {}).get("jobs", {})
+        self.scraper = scraper
+        self.parser = scraper.parser
+        self.queue = queue
+        self.claim_size = jobs_config.get("claim_size", 10)
+        self.heartbeat_interval = jobs_config.get("heartbeat_seconds", queue.lease.total_seconds() / 3)
+        self.idle_timeout = jobs_config.get("idle_timeout", 0)
+        self.poll_interval = jobs_config.get("poll_interval", 5)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.sleep = sleep
+        self._last_heartbeat = 0.0
+
+    def seed(self, urls: List[str]) -> int:
+        """ Queues the matches of competition urls, returns the number of new jobs. """
+        queued = 0
+        for url in urls:
+            try:
+                queued += self.queue.enqueue(url, self.parser.get_matches(url))
+            except Exception:
+                logger.exception(f"Matches of {url} not queued")
+        self.scraper.flush_audit()
+        return queued
+
+    def run(self, max_jobs: Optional[int] = None) -> int:
+        """ Works until the queue stays empty for idle_timeout seconds (or max_jobs are done), returns added matches. """
+        logger.info(f"Worker {self.worker_id} started")
+        done = 0
+        idle_since = time.monotonic()
+        refund = True
+        try:
+            while max_jobs is None or done < max_jobs:
+                matches = self.queue.claim(self.worker_id, self.claim_size if max_jobs is None else min(self.claim_size, max_jobs - done))
+                if not matches:
+                    if time.monotonic() - idle_since >= self.idle_timeout:
+                        break
+                    self.sleep(self.poll_interval)
+                    continue
+                self._last_heartbeat = time.monotonic()
+                done += self._process(matches)
+                idle_since = time.monotonic()
+        except Exception:
+            refund = False
+            raise
+        finally:
+            self.queue.release(self.worker_id, refund)
+            self.scraper.record_metrics()
+        logger.info(f"Worker {self.worker_id} stopped, {self.scraper.matches_added} matches added, queue: {self.queue.counts()}")
+        return self.scraper.matches_added
+
+    def _process(self, matches: List[Match]) -> int:
+        parsed = []
+        for match in matches:
+            try:
+                resp = self.parser.api_consumer.call(self.parser.match_url(match.match_id))
+                player_stats, parser_tech = self.parser.parse_players_stats_batch(
+                    resp.text, match.match_id, self.parser.api_consumer.last_api_call_data)
+                parsed.append((match, player_stats, parser_tech))
+            except Exception as e:
+                logger.exception(f"Match {match.match_id} failed in worker {self.worker_id}")
+                self.queue.fail(self.worker_id, match.match_id, repr(e))
+            self._heartbeat()
+
+        inserted_before = len(self.scraper.inserted_match_ids)
+        lost = set()
+        # a match whose rows are rejected is failed in the queue, the rest of the claim is inserted
+        self.scraper._insert_isolating_failures(parsed, [None] * len(parsed), select=lambda ids: self._complete(ids, lost),
+                                                failed=self._insert_failed)
+        if lost:
+            # leases expired and other workers took the jobs, they insert them
+            logger.warning(f"Worker {self.worker_id} lost {len(lost)} leases, their matches are skipped")
+            metrics.inc("job_leases_lost", len(lost))
+        inserted = self.scraper.inserted_match_ids[inserted_before:]
+        self.scraper.update_aggregates(inserted)
+        metrics.inc("jobs_done", len(inserted))
+        return len(matches)
+
+    def _complete(self, match_ids: List[str], lost: set) -> List[str]:
+        """ Marks the jobs as done in the write transaction, returns the ones the worker still holds. """
+        owned = self.queue.complete(self.worker_id, match_ids)
+        lost.update(set(match_ids) - set(owned))
+        return owned
+
+    def _insert_failed(self, match: Match, error: Exception, url: Optional[str] = None) -> None:
+        logger.error(f"Match {match.match_id} not inserted in worker {self.worker_id}: {error!r}", exc_info=error)
+        self.queue.fail(self.worker_id, match.match_id, repr(error))
+
+    def _heartbeat(self) -> None:
+        if time.monotonic() - self._last_heartbeat >= self.heartbeat_interval:
+            self.queue.heartbeat(self.worker_id)
+            self._last_heartbeat = time.monotonic()
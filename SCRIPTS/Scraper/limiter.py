@@ -0,0 +1,129 @@
+import time
+import threading
+import email.utils
+from typing import Callable, Optional
+
+from Scraper.logger import logger
+
+
+class LimiterStats:
+    """ Time spent waiting for the limiter versus everything else (network, parsing, database). """
+    def __init__(self):
+        self.requests = 0
+        self.waiting_time = 0.0
+        self.started_at = None
+        self.penalties = 0
+
+    def working_time(self, now: float) -> float:
+        return (now - self.started_at - self.waiting_time) if self.started_at is not None else 0.0
+
+    def summary(self, now: float) -> str:
+        return (f"{self.requests} requests, {self.waiting_time:.1f}s waiting, {self.working_time(now):.1f}s working, "
+                f"{self.penalties} rate penalties")
+
+
+class RateLimiter:
+    """
+    Token bucket limiter on a monotonic clock, safe to share between threads.
+
+    The bucket holds up to capacity tokens and refills at rate tokens per second, on top of that consecutive
+    requests are spaced by at least min_interval seconds. Tokens accumulate while the caller parses or writes to
+    the database, so that time is credited against the next wait instead of being added to it.
+    After 429/503 responses the limiter honours Retry-After and lowers its rate, which climbs back to the
+    configured one after recovery_requests successful requests in a row.
+    """
+    def __init__(self, rate: float, capacity: int = 1, min_interval: float = 0.0, backoff_factor: float = 0.5,
+                 min_rate: Optional[float] = None, recovery_requests: int = 20, retry_after_default: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.min_interval = min_interval
+        self.backoff_factor = backoff_factor
+        self.min_rate = min_rate if min_rate is not None else rate * 0.1
+        self.recovery_requests = recovery_requests
+        self.retry_after_default = retry_after_default
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = LimiterStats()
+        self._lock = threading.Lock()
+        # theoretical arrival time of the next request when the bucket is drained (GCRA form of token bucket)
+        self._tat = None
+        self._last_start = None
+        self._blocked_until = 0.0
+        self._successes = 0
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs) -> "RateLimiter":
+        """ Builds limiter from api_consumer section of config.yaml. """
+        limiter_config = config.get("limiter", {})
+        rate = config["requests_limit"] / config["time_limit"] if config["time_limit"] else float("inf")
+        return cls(
+            rate=rate,
+            capacity=config["requests_limit"],
+            min_interval=config.get("sleep_time", 0),
+            backoff_factor=limiter_config.get("backoff_factor", 0.5),
+            min_rate=rate * limiter_config.get("min_rate_factor", 0.1),
+            recovery_requests=limiter_config.get("recovery_requests", 20),
+            retry_after_default=limiter_config.get("retry_after_default", 60),
+            **kwargs
+        )
+
+    def reserve(self) -> float:
+        """ Takes a slot for one request and returns how many seconds the caller has to wait for it. """
+        with self._lock:
+            now = self.clock()
+            if self.stats.started_at is None:
+                self.stats.started_at = now
+            interval = 1 / self.rate if self.rate != float("inf") else 0.0
+            tat = max(self._tat if self._tat is not None else now, now)
+            start = max(now, tat - (self.capacity - 1) * interval, self._blocked_until)
+            if self._last_start is not None:
+                start = max(start, self._last_start + self.min_interval)
+            self._tat = max(tat, start) + interval
+            self._last_start = start
+            self.stats.requests += 1
+            self.stats.waiting_time += start - now
+            return start - now
+
+    def acquire(self) -> float:
+        """ Blocks until a request may be sent. Returns seconds spent waiting. """
+        delay = self.reserve()
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._successes += 1
+            if self.rate < self.base_rate and self._successes >= self.recovery_requests:
+                self.rate = min(self.base_rate, self.rate / self.backoff_factor)
+                self._successes = 0
+                logger.info(f"Request rate raised to {self.rate:.3f}/s")
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """ Called on 429/503, blocks requests for retry_after seconds and lowers the rate. """
+        with self._lock:
+            wait = retry_after if retry_after is not None else self.retry_after_default
+            self._blocked_until = max(self._blocked_until, self.clock() + wait)
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            self._successes = 0
+            self.stats.penalties += 1
+            logger.warning(f"Website asked to slow down, pausing {wait:.0f}s and lowering rate to {self.rate:.3f}/s")
+
+    def summary(self) -> str:
+        return self.stats.summary(self.clock())
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """ Parses Retry-After header given either as seconds or as an HTTP date. """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (now if now is not None else time.time()))
@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+import datetime
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Scraper.models import RunMetric
+
+# upper bounds in seconds, an observation above the last one falls into the +Inf bucket
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """ Observation counts per bucket (not cumulative), with their sum. """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram", sign: int = 1) -> None:
+        for i, count in enumerate(other.counts):
+            self.counts[i] += sign * count
+        self.sum += sign * other.sum
+        self.count += sign * other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """ Upper bound of the bucket holding the q quantile, None when it is in the +Inf bucket or empty. """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Metrics:
+    """
+    Counters and stage timers of a run, kept in memory until exported.
+
+        with metrics.timer("http_request"):
+            ...
+        metrics.inc("api_calls")
+
+    Timers of all stages are one histogram family (stage_seconds) with the stage name as a label. Exported as
+    Prometheus text (to_prometheus), as a JSON friendly summary (summary) and as run_metrics rows (rows).
+    snapshot and since give the metrics of a part of the run, e.g. one competition.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.timers: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage: str, seconds: float, **labels: str) -> None:
+        key = (stage, _labels(labels))
+        with self._lock:
+            histogram = self.timers.get(key)
+            if histogram is None:
+                histogram = self.timers[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def merge(self, other: "Metrics", sign: int = 1) -> None:
+        """ Adds (or with sign -1 subtracts) metrics of another registry, e.g. the ones of a parse worker. """
+        with self._lock:
+            for key, value in other.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + sign * value
+            for key, histogram in other.timers.items():
+                if key not in self.timers:
+                    self.timers[key] = Histogram(self.buckets)
+                self.timers[key].merge(histogram, sign)
+
+    def snapshot(self) -> "Metrics":
+        copy = Metrics(self.buckets)
+        copy.merge(self)
+        return copy
+
+    def since(self, snapshot: "Metrics") -> "Metrics":
+        """ Metrics recorded after snapshot was taken. """
+        delta = self.snapshot()
+        delta.merge(snapshot, sign=-1)
+        delta.counters = {k: v for k, v in delta.counters.items() if v}
+        delta.timers = {k: h for k, h in delta.timers.items() if h.count}
+        return delta
+
+    def drain(self) -> "Metrics":
+        """ Returns the recorded metrics and starts over, used to send worker process metrics with results. """
+        with self._lock:
+            drained = Metrics(self.buckets)
+            drained.counters, drained.timers = self.counters, self.timers
+            self.counters, self.timers = {}, {}
+        return drained
+
+    def summary(self) -> dict:
+        stages = {}
+        for (stage, labels), h in sorted(self.timers.items()):
+            stages[_name(stage, labels)] = {
+                "count": h.count,
+                "seconds": round(h.sum, 6),
+                "mean_seconds": round(h.sum / h.count, 6) if h.count else None,
+                "p50_seconds": h.quantile(0.5),
+                "p95_seconds": h.quantile(0.95),
+            }
+        counters = {_name(name, labels): value for (name, labels), value in sorted(self.counters.items())}
+        return {"stages": stages, "counters": counters}
+
+    def rows(self, run_id: str, url: Optional[str] = None) -> List[RunMetric]:
+        now = datetime.datetime.now()
+        rows = [RunMetric(run_id=run_id, recorded_at=now, url=url, kind="timer", name=stage, labels=_label_text(labels),
+                          count=h.count, seconds=h.sum, p50_seconds=h.quantile(0.5), p95_seconds=h.quantile(0.95))
+                for (stage, labels), h in sorted(self.timers.items())]
+        rows += [RunMetric(run_id=run_id, recorded_at=now, url=url, kind="counter", name=name, labels=_label_text(labels),
+                           count=int(value))
+                 for (name, labels), value in sorted(self.counters.items())]
+        return rows
+
+    def to_prometheus(self, prefix: str = "fda") -> str:
+        """ Prometheus text exposition format, e.g. for the node_exporter textfile collector. """
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines += [f"# TYPE {prefix}_{name}_total counter"]
+            lines += [f"{prefix}_{name}_total{_prometheus_labels(labels)} {value:g}"
+                      for (n, labels), value in sorted(self.counters.items()) if n == name]
+        if self.timers:
+            family = f"{prefix}_stage_seconds"
+            lines += [f"# HELP {family} Time spent in a scraping stage.", f"# TYPE {family} histogram"]
+            for (stage, labels), h in sorted(self.timers.items()):
+                labels = (("stage", stage),) + labels
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{family}_bucket{_prometheus_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{family}_sum{_prometheus_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{family}_count{_prometheus_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str = "fda") -> None:
+        # written next to the target and renamed, so a collector never reads half a file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(path + ".tmp", path)
+
+    def __getstate__(self) -> dict:
+        return {"buckets": self.buckets, "counters": self.counters, "timers": self.timers}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels: Labels) -> Optional[str]:
+    return ",".join(f"{k}={v}" for k, v in labels) or None
+
+
+def _name(name: str, labels: Labels) -> str:
+    return f"{name}{{{_label_text(labels)}}}" if labels else name
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+# registry of the process, parse worker processes have their own and send it back with parse results
+metrics = Metrics()
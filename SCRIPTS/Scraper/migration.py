@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from Scraper.logger import logger
+from Scraper.database import Database, TABLE_MODELS
+from Scraper.archive import PageArchive, Location, read_record
+from Scraper.aggregates import AggregateStore
+from Scraper.parser import Parser
+from Scraper.constants import (SCHEDULE_URL_PART, MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PLAYER_SEASON_STATS_TABLE_NAME,
+                               TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME)
+
+AGGREGATE_TABLES = (PLAYER_SEASON_STATS_TABLE_NAME, TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME)
+
+
+class SchemaMigration:
+    """
+    Brings existing tables up to date with the models without calling the website.
+
+    Columns whose model azure_types changed are altered to them (Azure only, sqlite text has no length).
+    Columns of new model fields are added with ALTER TABLE and filled by re-parsing the page archive:
+    player_stats from archived match reports, parsed by workers processes (all cores by default),
+    matches from archived schedule pages (left NULL without an archive). Aggregate tables are rebuilt,
+    new columns of other tables stay NULL.
+    """
+    def __init__(self, db: Database, archive: Optional[PageArchive], config: dict, workers: Optional[int] = None,
+                 batch_matches: int = 50):
+        self.db = db
+        self.archive = archive
+        self.config = config
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        # matches whose players stats are updated in one transaction
+        self.batch_matches = batch_matches
+
+    def missing_columns(self) -> Dict[str, List[str]]:
+        """ Model fields without a column, by table. Missing tables are not listed, create_table adds them. """
+        missing = {}
+        for table, model in TABLE_MODELS.items():
+            existing = self.db.table_columns(table)
+            columns = [field for field in model.model_fields if existing and field not in existing]
+            if columns:
+                missing[table] = columns
+        return missing
+
+    def widen_columns(self) -> List[str]:
+        """ Gives existing columns their model azure_types, returns the changed table.column names. """
+        widened = []
+        for table, model in TABLE_MODELS.items():
+            for column, sql_type in getattr(model, "azure_types", {}).items():
+                if self.db.widen_column(table, column, sql_type):
+                    widened.append(f"{table}.{column}")
+        if widened:
+            logger.info(f"Changed {widened} to their model types")
+        return widened
+
+    def add_columns(self, missing: Dict[str, List[str]]) -> None:
+        for table, columns in missing.items():
+            model = TABLE_MODELS[table]
+            for column in columns:
+                self.db.add_column(table, column, model.model_fields[column].annotation)
+            logger.info(f"Added {columns} to {table}")
+
+    def run(self) -> Dict[str, int]:
+        """ Adds missing tables and columns and backfills them, returns the number of updated rows by table. """
+        for table, model in TABLE_MODELS.items():
+            self.db.create_table(model, table)
+        widened = self.widen_columns()
+        missing = self.missing_columns()
+        if not missing:
+            if not widened:
+                logger.info("Tables are up to date with the models, nothing to migrate")
+            self.db.create_indexes()
+            return {}
+        self.add_columns(missing)
+        updated = {}
+        if PLAYER_STATS_TABLE_NAME in missing and self.archive is not None:
+            updated[PLAYER_STATS_TABLE_NAME] = self.backfill_players_stats(missing[PLAYER_STATS_TABLE_NAME])
+        if MATCHES_TABLE_NAME in missing and self.archive is not None:
+            updated[MATCHES_TABLE_NAME] = self.backfill_matches(missing[MATCHES_TABLE_NAME])
+        if any(table in missing for table in AGGREGATE_TABLES):
+            AggregateStore(self.db).rebuild()
+        for table in set(missing) - set(updated) - set(AGGREGATE_TABLES):
+            logger.warning(f"{table} has no archived source, new columns {missing[table]} are left empty")
+        self.db.create_indexes()
+        return updated
+
+    def backfill_players_stats(self, columns: List[str]) -> int:
+        """ Re-parses every archived match report and sets columns of its player_stats rows. """
+        pages = self.archive.pages(matches=True)
+        logger.info(f"Re-parsing {len(pages)} archived match reports with {self.workers} workers for {columns}")
+        key = TABLE_MODELS[PLAYER_STATS_TABLE_NAME].unique
+        locations = [p.location for p in pages]
+        match_ids = [p.match_id for p in pages]
+        pool = ProcessPoolExecutor(self.workers, initializer=init_migration_worker,
+                                   initargs=(self.config, columns + list(key))) if self.workers > 1 else None
+        if pool is None:
+            init_migration_worker(self.config, columns + list(key))
+        updated = 0
+        batch = []
+        try:
+            results = pool.map(reparse_players_stats, locations, match_ids, chunksize=4) if pool else \
+                map(reparse_players_stats, locations, match_ids)
+            for i, rows in enumerate(results, 1):
+                batch += rows
+                if i % self.batch_matches == 0 or i == len(pages):
+                    self.db.update_rows(PLAYER_STATS_TABLE_NAME, key, columns, batch)
+                    updated += len(batch)
+                    batch = []
+                    logger.info(f"{i}/{len(pages)} match reports re-parsed")
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        return updated
+
+    def backfill_matches(self, columns: List[str]) -> int:
+        """ Re-parses archived schedule pages, oldest first, so values of the latest copy are kept. """
+        parser = Parser(api_consumer=None, config=self.config)
+        key = TABLE_MODELS[MATCHES_TABLE_NAME].unique
+        pages = sorted((p for p in self.archive.pages(matches=False) if SCHEDULE_URL_PART in p.url),
+                       key=lambda p: p.fetched_at)
+        updated = 0
+        for page in pages:
+            url, fetched_at, html = read_record(page.location)
+            matches, _ = parser.parse_matches(html, url, fetched_at)
+            rows = [tuple(getattr(m, c) for c in columns + list(key)) for m in matches]
+            self.db.update_rows(MATCHES_TABLE_NAME, key, columns, rows)
+            updated += len(rows)
+        logger.info(f"{len(pages)} archived schedule pages re-parsed for {columns}")
+        return updated
+
+
+# parser of a migration worker process and the columns it returns, set once per process
+_worker_parser = None
+_columns: List[str] = []
+
+def init_migration_worker(config: dict, columns: List[str]) -> None:
+    global _worker_parser, _columns
+    _worker_parser = Parser(api_consumer=None, config=config)
+    _columns = columns
+
+def reparse_players_stats(location: Location, match_id: str) -> List[Tuple]:
+    """ Process pool entry point, reads an archived match report and returns _columns of its players. """
+    _, fetched_at, html = read_record(location)
+    batch, _ = _worker_parser.parse_players_stats_batch(html, match_id, fetched_at)
+    indexes = [batch.columns.index(c) for c in _columns]
+    return [tuple(row[i] for i in indexes) for row in batch]
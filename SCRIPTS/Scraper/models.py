@@ -1,13 +1,30 @@
 import pydantic
 import datetime
 
-from typing import Optional, Union
+from functools import lru_cache
+from typing import ClassVar, Dict, List, Optional, Tuple, Union
+
+from Scraper.constants import ERROR_MSG_LENGTH
 
 """ 
 Pydantic data model. 
 Names of columns should be the same as the names in sql database and the names of the data-stats on website.
+Class variables declare the table keys: unique - columns identifying a row (used by upserts),
+indexes - column groups to index. Both are created by Database.create_indexes.
+always_upsert - derived tables whose rows are replaced on their unique key whatever the database write mode.
+azure_types - Azure SQL types of columns that don't fit the default of their type (see utils.azure_sql_type_mapping).
 """
 
+# schedule urls of past seasons repeat the season and the competition name, see planner.season_url
+URL_AZURE_TYPE = "NVARCHAR(400)"
+# exception messages and invalid records
+ERROR_MSG_AZURE_TYPE = f"NVARCHAR({ERROR_MSG_LENGTH})"
+
+@lru_cache(maxsize=None)
+def _fields_list(model: type, alias: bool) -> tuple:
+    # json schema generation is slow, it is built once per model
+    return tuple(model.model_json_schema(alias).get("properties").keys())
+
 class Match(pydantic.BaseModel):
     round: Union[str, None] = None # there is no round for ligue matches
     date: datetime.date
@@ -17,10 +34,11 @@ class Match(pydantic.BaseModel):
     match_id: str
     season: str
     competition: str
+    unique: ClassVar[Tuple[str, ...]] = ("match_id",)
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("competition", "season")]
     @classmethod
     def get_empty_dict(cls, alias=False):
-        fields_list = list(cls.model_json_schema(alias).get("properties").keys())
-        return dict(zip(fields_list, [None for i in fields_list]))
+        return dict.fromkeys(_fields_list(cls, alias))
 
 class PlayerStats(pydantic.BaseModel):
     match_id: str
@@ -62,19 +80,145 @@ class PlayerStats(pydantic.BaseModel):
     take_ons_won: Union[int, None] = None
     fouls: Union[int, None] = None
     fouled: Union[int, None] = None
+    unique: ClassVar[Tuple[str, ...]] = ("match_id", "player_id")
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("player_id",)]
     @classmethod
-    def get_empty_dict(cls,alias=False):
-        fields_list = list(cls.model_json_schema(alias).get("properties").keys())
-        return dict(zip(fields_list, [None for i in fields_list]))
+    def get_empty_dict(cls, alias=False):
+        return dict.fromkeys(_fields_list(cls, alias))
 
 class ParserTech(pydantic.BaseModel):
-    match_id: str 
+    """
+    Audit log of parsing. Detail rows (row_count NULL) are about one match or player, summary rows are about
+    one parsed page: row_count parsed records, error_count invalid ones, seconds of parsing and status.
+    Summaries of schedule pages have no match_id, only url.
+    """
+    match_id: Union[str, None] = None
     player_id: Union[str, None] = None
     parse_date: datetime.datetime
     parse_type: str
     error_msg: Union[str, None] = None
+    url: Union[str, None] = None
+    row_count: Union[int, None] = None
+    error_count: Union[int, None] = None
+    seconds: Union[float, None] = None
+    status: Union[str, None] = None
+    # audit log, every parse adds rows
+    unique: ClassVar[Tuple[str, ...]] = ()
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("match_id",), ("parse_date",)]
+    azure_types: ClassVar[Dict[str, str]] = {"url": URL_AZURE_TYPE, "error_msg": ERROR_MSG_AZURE_TYPE}
     @classmethod
     def get_empty_dict(cls, alias=False):
-        fields_list = list(cls.model_json_schema(alias).get("properties").keys())
-        return dict(zip(fields_list, [None for i in fields_list]))
+        return dict.fromkeys(_fields_list(cls, alias))
+
+class Checkpoint(Match):
+    """ Match queued by an unfinished scraping run, with the match data so a resumed run skips the schedule page. """
+    url: str
+    status: str
+    updated_at: datetime.datetime
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("url", "status")]
+    azure_types: ClassVar[Dict[str, str]] = {"url": URL_AZURE_TYPE}
+
+class MatchJob(Match):
+    """
+    Match fetch job of the shared work queue, see Scraper.jobs. A worker holds the job until lease_expires,
+    renewed by heartbeats, an expired lease can be claimed by another worker.
+    """
+    url: str
+    status: str
+    worker: Union[str, None] = None
+    lease_expires: Union[datetime.datetime, None] = None
+    attempts: int = 0
+    error_msg: Union[str, None] = None
+    updated_at: datetime.datetime
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("status", "lease_expires"), ("worker", "status")]
+    azure_types: ClassVar[Dict[str, str]] = {"url": URL_AZURE_TYPE, "error_msg": ERROR_MSG_AZURE_TYPE}
+
+class DeadLetter(Match):
+    """
+    Match whose fetch or parse failed, see Scraper.dead_letters. A pending match is retried after next_retry_at,
+    a given up one stays for inspection.
+    """
+    url: Union[str, None] = None
+    status: str
+    error_class: str
+    error_msg: Union[str, None] = None
+    attempts: int = 0
+    next_retry_at: Union[datetime.datetime, None] = None
+    updated_at: datetime.datetime
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("status", "next_retry_at")]
+    azure_types: ClassVar[Dict[str, str]] = {"url": URL_AZURE_TYPE, "error_msg": ERROR_MSG_AZURE_TYPE}
+
+class StatTotals(pydantic.BaseModel):
+    """ Player stats summed by the aggregate tables, see Scraper.aggregates. """
+    minutes: int = 0
+    goals: int = 0
+    assists: int = 0
+    shots: int = 0
+    shots_on_target: int = 0
+    xg: float = 0.0
+    xg_assist: float = 0.0
+    sca: int = 0
+    gca: int = 0
+    passes_completed: int = 0
+    passes: int = 0
+    progressive_passes: int = 0
+    progressive_carries: int = 0
+    touches: int = 0
+    tackles: int = 0
+    interceptions: int = 0
+    always_upsert: ClassVar[bool] = True
+
+class TeamMatchStats(StatTotals):
+    match_id: str
+    team: str
+    competition: str
+    season: str
+    date: datetime.date
+    players: int
+    unique: ClassVar[Tuple[str, ...]] = ("match_id", "team")
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("competition", "season")]
+
+class TeamSeasonStats(StatTotals):
+    competition: str
+    season: str
+    team: str
+    matches: int
+    last_match_date: datetime.date
+    unique: ClassVar[Tuple[str, ...]] = ("competition", "season", "team")
+    indexes: ClassVar[List[Tuple[str, ...]]] = []
+
+class PlayerSeasonStats(StatTotals):
+    """ Season totals of a player in a competition, team and player name are the ones of the latest match. """
+    competition: str
+    season: str
+    player_id: str
+    player: str
+    team: str
+    matches: int
+    last_match_date: datetime.date
+    goals_per90: Union[float, None] = None
+    assists_per90: Union[float, None] = None
+    xg_per90: Union[float, None] = None
+    xg_assist_per90: Union[float, None] = None
+    sca_per90: Union[float, None] = None
+    gca_per90: Union[float, None] = None
+    progressive_passes_per90: Union[float, None] = None
+    unique: ClassVar[Tuple[str, ...]] = ("competition", "season", "player_id")
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("player_id",)]
 
+class RunMetric(pydantic.BaseModel):
+    """ Stage timer (kind "timer") or counter of a scraping run, see Scraper.metrics. """
+    run_id: str
+    recorded_at: datetime.datetime
+    url: Union[str, None] = None
+    kind: str
+    name: str
+    labels: Union[str, None] = None
+    # observations of a timer, value of a counter
+    count: int
+    seconds: Union[float, None] = None
+    p50_seconds: Union[float, None] = None
+    p95_seconds: Union[float, None] = None
+    unique: ClassVar[Tuple[str, ...]] = ()
+    indexes: ClassVar[List[Tuple[str, ...]]] = [("run_id",), ("name", "recorded_at")]
+    azure_types: ClassVar[Dict[str, str]] = {"url": URL_AZURE_TYPE}
@@ -1,16 +1,21 @@
-from requests import Response
+import time
+import datetime
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 from pydantic import ValidationError
 
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from Scraper.models import Match, PlayerStats, ParserTech
 from Scraper.errors import InvalidUrlException
 from Scraper.logger import logger
 from Scraper.api_consumer import APIConsumer
 from Scraper.database import Database
-from Scraper.constants import MATCH_PARSE_TYPE, PARSER_TECH_TABLE_NAME, PLAYER_PARSE_TYPE
+from Scraper.constants import (MATCH_PARSE_TYPE, PARSER_TECH_TABLE_NAME, PLAYER_PARSE_TYPE, AUDIT_FULL, AUDIT_COMPACT,
+                               PARSE_OK, PARSE_INVALID_ROWS, PARSE_EMPTY)
+from Scraper.html_engine import get_parser_engine, pre_slice, unwrap_commented_tables
+from Scraper.records import RecordBatch, schema_for
+from Scraper.metrics import Metrics, metrics
 
 class Parser:
     """Parsing HTTP response into python data types."""
@@ -19,30 +24,122 @@ class Parser:
         self.config = config
         self.player_stats_processed = 0
         self.match_processed = 0
+        self.engine = get_parser_engine(self.config["parser"].get("engine"))
+        self.pre_slice = self.config["parser"].get("pre_slice", False)
+        self.base_url = self.config["parser"].get("base_url", "https://fbref.com").rstrip("/")
+        # "full": a parser_tech row per match and player, "compact": a summary row per page and rows of invalid records
+        self.audit = self.config["parser"].get("audit", AUDIT_FULL)
+        if self.audit not in (AUDIT_FULL, AUDIT_COMPACT):
+            raise ValueError(f"Unknown parser.audit {self.audit!r}, expected {AUDIT_FULL!r} or {AUDIT_COMPACT!r}")
+        # when set (by Scraper), parser_tech rows of get_matches and get_players_stats are collected here and
+        # written with the data transaction instead of being inserted right away
+        self.audit_buffer: Optional[List[ParserTech]] = None
+
+    def _get_soup(self, markup: str, element_ids: List[str]=(), tables: bool=False) -> BeautifulSoup:
+        """ Parses page with configured engine. With pre_slice only the requested elements and tables are parsed. """
+        # None falls back to the whole document, e.g. when the page layout is not recognized
+        sliced = pre_slice(markup, element_ids, self._is_table_to_scrape if tables else None) if self.pre_slice else None
+        if sliced is not None:
+            markup = sliced
+        elif tables:
+            # tables fbref ships inside HTML comments are parsed like the ones pre_slice finds
+            markup = unwrap_commented_tables(markup, self._is_table_to_scrape)
+        with metrics.timer("html_parse"):
+            return self.engine.parse(markup)
+
+    def _is_table_to_scrape(self, table_id: str) -> bool:
+        return 'summary' in table_id or any(name in table_id for name in self.config["parser"]["tables_to_scrape"])
 
-    def _get_soup(self, resp: Response) -> BeautifulSoup:
-        return BeautifulSoup(resp.text, "html.parser")
-    
     def get_matches(self, url: str, db: Optional[Database]=None) -> List[Match]:
         """ Getting all matches for a given url. Inserting tech info into db if needed. """
+        return list(self.iter_matches(url, db))
+
+    def iter_matches(self, url: str, db: Optional[Database]=None) -> Iterator[Match]:
+        """
+        Like get_matches, but yields each match as soon as its schedule row is parsed, so the schedule is never
+        held as a list. Rows are released as they are read and the tree after the last one (or when the caller
+        closes the generator), the parser_tech rows of the matches read are logged then.
+        """
         resp = self.api_consumer.call(url)
-        soup = self._get_soup(resp)
+        parse_date = self.api_consumer.last_api_call_data
+        parser_tech_data_list = []
+        # time spent parsing, without the time the caller spends between matches
+        start = time.perf_counter()
+        soup = self._get_soup(resp.text, element_ids=["meta", "all_sched"])
+        del resp
+        seconds = time.perf_counter() - start
+
+        def log_audit() -> None:
+            metrics.observe("parse_matches", seconds)
+            self.log_audit(self.audit_rows(parser_tech_data_list, MATCH_PARSE_TYPE, parse_date, seconds, url=url), db)
+
         try:
-            table = soup.find(id="all_sched").tbody
+            rows = self._iter_matches(soup, url, parse_date, parser_tech_data_list)
+            while True:
+                start = time.perf_counter()
+                match = next(rows, None)
+                seconds += time.perf_counter() - start
+                if match is None:
+                    break
+                yield match
+        except GeneratorExit:
+            log_audit()
+            raise
+        finally:
+            soup.decompose()
+        log_audit()
+
+    def parse_matches(self, html: str, url: str, parse_date: datetime.datetime) -> Tuple[List[Match], List[ParserTech]]:
+        """ Parses matches and their parser_tech rows from a 'Scores & Fixtures' page. Doesn't call the website. """
+        start = time.perf_counter()
+        with metrics.timer("parse_matches"):
+            match_list, parser_tech_data_list = self._parse_matches(html, url, parse_date)
+        return match_list, self.audit_rows(parser_tech_data_list, MATCH_PARSE_TYPE, parse_date, time.perf_counter() - start,
+                                           url=url)
+
+    def _parse_matches(self, html: str, url: str, parse_date: datetime.datetime) -> Tuple[List[Match], List[ParserTech]]:
+        soup = self._get_soup(html, element_ids=["meta", "all_sched"])
+        try:
+            parser_tech_data_list = []
+            return list(self._iter_matches(soup, url, parse_date, parser_tech_data_list)), parser_tech_data_list
+        finally:
+            # bs4 trees are reference cycles, without decompose they stay in memory until a garbage collection
+            soup.decompose()
+
+    def get_competition(self, url: str) -> str:
+        """ Competition name of a 'Scores & Fixtures' page as matches are stored with it, e.g. Premier League. """
+        resp = self.api_consumer.call(url)
+        soup = self._get_soup(resp.text, element_ids=["meta"])
+        try:
+            return self._season_and_competition(soup)[1]
         except AttributeError:
             raise InvalidUrlException(url)
+        finally:
+            soup.decompose()
+
+    @staticmethod
+    def _season_and_competition(soup: BeautifulSoup) -> Tuple[str, str]:
+        # e.g. 2023-2024 Premier League Scores & Fixtures
         ss = soup.find(id="meta").h1.text.strip()
         season = ss[:ss.find(" ")]
-        competition = ss.replace(" Scores & Fixtures", "")[len(season)+1:]
+        return season, ss.replace(" Scores & Fixtures", "")[len(season)+1:]
 
-        match_id_list = []
-        match_list = []
-        parser_tech_data_list = []
+    def _iter_matches(self, soup: BeautifulSoup, url: str, parse_date: datetime.datetime,
+                      parser_tech_data_list: List[ParserTech]) -> Iterator[Match]:
+        """ Yields matches of the schedule rows one by one, their parser_tech rows are appended to parser_tech_data_list. """
+        try:
+            table = soup.find(id="all_sched").tbody
+        except AttributeError:
+            raise InvalidUrlException(url)
+        season, competition = self._season_and_competition(soup)
+
+        match_ids = set()
         # break flag when match hasn't been played yet
         has_score = True 
         # parameters to fill with values
         match_dict = Match.get_empty_dict()
         for tr in table.find_all(["tr"]): 
+            match = None
             if tr.a:
                 for td in tr.find_all(["td", "th"]):
                     data_stat = td.get("data-stat")
@@ -62,13 +159,13 @@ class Parser:
                     elif td.text == "Match Report":
                         substring = td.a.get("href").replace("/en/matches/", "")
                         match_dict["match_id"] = substring[:substring.find("/")]
-                if has_score and match_dict['match_id'] not in match_id_list:
+                if has_score and match_dict['match_id'] not in match_ids:
                     try:
-                        match_id_list.append(match_dict['match_id'])
+                        match_ids.add(match_dict['match_id'])
                         self.match_processed += 1
                         match_dict["season"] = season
                         match_dict["competition"] = competition
-                        match_list.append(Match(**match_dict))
+                        match = Match(**match_dict)
                         error_msg = None
                     except ValidationError as e:
                         error_msg = f"Match cannot be created with those params: {match_dict}"
@@ -76,72 +173,174 @@ class Parser:
                     parser_tech_data_list.append(ParserTech(
                         match_id=match_dict['match_id'],
                         player_id=None,
-                        parse_date=self.api_consumer.last_api_call_data,
+                        parse_date=parse_date,
                         parse_type=MATCH_PARSE_TYPE,
                         error_msg=error_msg
                         ))
-        if db:
-            values = [tuple(i.model_dump().values()) for i in parser_tech_data_list]
-            cols = list(ParserTech.get_empty_dict().keys())
-            db.insert_to_db(PARSER_TECH_TABLE_NAME, cols, values)
-        return match_list
+            # rows are released as they are consumed
+            tr.decompose()
+            if match is not None:
+                yield match
+
+    def _index_table(self, table: Tag) -> Dict[str, Dict[str, Optional[str]]]:
+        """ Walks table rows once, mapping each player_id to its {data-stat: value} cells. """
+        index = {}
+        for tr in table.tbody.find_all("tr"):
+            if tr.th is None:
+                continue
+            stats = index.setdefault(tr.th.get("data-append-csv"), {})
+            for td in tr.find_all(["td", "th"]):
+                value = td.text.strip()
+                stats[td.get("data-stat")] = value if value else None
+        return index
+
+    def audit_rows(self, parser_tech_data_list: List[ParserTech], parse_type: str, parse_date: datetime.datetime,
+                   seconds: float, match_id: Optional[str]=None, url: Optional[str]=None) -> List[ParserTech]:
+        """ parser_tech rows of one parsed page, in compact audit mode the rows of invalid records and a summary. """
+        if self.audit == AUDIT_FULL:
+            return parser_tech_data_list
+        errors = [t for t in parser_tech_data_list if t.error_msg]
+        status = PARSE_EMPTY if not parser_tech_data_list else PARSE_INVALID_ROWS if errors else PARSE_OK
+        summary = ParserTech(match_id=match_id, url=url, parse_date=parse_date, parse_type=parse_type,
+                             row_count=len(parser_tech_data_list), error_count=len(errors), seconds=round(seconds, 6),
+                             status=status)
+        return errors + [summary]
+
+    def log_audit(self, parser_tech_data_list: List[ParserTech], db: Optional[Database]) -> None:
+        """ Buffers parser_tech rows when audit_buffer is set, inserts them into db otherwise. """
+        if self.audit_buffer is not None:
+            self.audit_buffer.extend(parser_tech_data_list)
+        elif db:
+            db.insert_to_db(PARSER_TECH_TABLE_NAME, *_parser_tech_rows(parser_tech_data_list))
+
+    def match_url(self, match_id: str) -> str:
+        return f"{self.base_url}/en/matches/{match_id}"
 
     def get_players_stats(self, match_id: str, db: Optional[Database]=None) -> List[PlayerStats]:
         """ Get players stats for a given match id."""
-        url = f"https://fbref.com/en/matches/{match_id}"
-        resp = self.api_consumer.call(url)
-        soup = self._get_soup(resp)
+        resp = self.api_consumer.call(self.match_url(match_id))
+        player_stats_list, parser_tech_data_list = self.parse_players_stats(
+            resp.text, match_id, self.api_consumer.last_api_call_data)
+        self.log_audit(parser_tech_data_list, db)
+        return player_stats_list
+
+    def parse_players_stats(self, html: str, match_id: str, parse_date: datetime.datetime) -> Tuple[List[PlayerStats], List[ParserTech]]:
+        """ Parses players stats and their parser_tech rows from a match report page. Doesn't call the website. """
+        player_stats_batch, parser_tech_data_list = self.parse_players_stats_batch(html, match_id, parse_date)
+        return player_stats_batch.to_models(), parser_tech_data_list
+
+    def parse_players_stats_batch(self, html: str, match_id: str, parse_date: datetime.datetime) -> Tuple[RecordBatch, List[ParserTech]]:
+        """ Like parse_players_stats, players stats are returned as a RecordBatch without building model instances. """
+        start = time.perf_counter()
+        with metrics.timer("parse_players_stats"):
+            player_stats_batch, parser_tech_data_list = self._parse_players_stats_batch(html, match_id, parse_date)
+        return player_stats_batch, self.audit_rows(parser_tech_data_list, PLAYER_PARSE_TYPE, parse_date,
+                                                   time.perf_counter() - start, match_id=match_id, url=self.match_url(match_id))
+
+    def _parse_players_stats_batch(self, html: str, match_id: str, parse_date: datetime.datetime) -> Tuple[RecordBatch, List[ParserTech]]:
+        soup = self._get_soup(html, tables=True)
+        try:
+            players = self._extract_players(soup, match_id)
+        finally:
+            soup.decompose()
+
+        # all players of the page are validated in one call, invalid ones are only logged to parser_tech
+        player_stats_batch = RecordBatch(PlayerStats)
+        parser_tech_data_list = []
+        with metrics.timer("validate"):
+            rows = schema_for(PlayerStats).coerce_many(players)
+        for p, row in zip(players, rows):
+            if isinstance(row, ValidationError):
+                metrics.inc("invalid_rows", table="player_stats")
+                error_msg = f"Validation error: Match {match_id}, player: {p['player_id']}, data: {p}"
+                logger.error(error_msg, exc_info=row)
+            else:
+                player_stats_batch.append(row)
+                error_msg = None
+            parser_tech_data_list.append(ParserTech(
+                match_id=match_id,
+                player_id=p['player_id'],
+                parse_date=parse_date,
+                parse_type=PLAYER_PARSE_TYPE,
+                error_msg=error_msg
+                ))
+        return player_stats_batch, parser_tech_data_list
 
-        tables = soup.find_all("table")
+    def _extract_players(self, soup: BeautifulSoup, match_id: str) -> List[Dict[str, Optional[str]]]:
+        """ Raw {data-stat: value} dicts of the players of a match page, tables are released once consumed. """
         summary_tables = []
         tables_to_scrape = []
-        player_id_list = []
-        for t in tables:
+        for t in soup.find_all("table"):
             t_id = t.get("id")
-            if t_id is not None:
-                for table_name in self.config["parser"]["tables_to_scrape"]:
-                    if table_name in t_id:
-                        tables_to_scrape.append(t)
-                    if t_id is not None and 'summary' in t_id:
-                        summary_tables.append(t)
-
-        player_stats_list = []
-        parser_tech_data_list = []
+            if t_id is None:
+                continue
+            if any(table_name in t_id for table_name in self.config["parser"]["tables_to_scrape"]):
+                tables_to_scrape.append(t)
+            if 'summary' in t_id:
+                summary_tables.append(t)
+
+        # every table is walked once, players are then assembled by lookup in table order,
+        # so a data-stat present in several tables keeps the value from the last one
+        indexed_tables = []
+        for t in tables_to_scrape:
+            indexed_tables.append(self._index_table(t))
+            if 'summary' not in t.get("id"):
+                t.decompose()
+        empty_player = PlayerStats.get_empty_dict()
+
+        player_ids = set()
+        players = []
         for table in summary_tables: # teams
+            team = table.caption.text.replace(" Player Stats Table", "")
             for tr in table.tbody.find_all("tr"): # players
-                p = PlayerStats.get_empty_dict()
+                if tr.th is None:
+                    continue
+                p = empty_player.copy()
                 p["match_id"] = match_id
-                p["team"] = table.caption.text.replace(" Player Stats Table", "")
+                p["team"] = team
                 p["player_id"] = tr.th.get("data-append-csv")
-                for tts in tables_to_scrape: # tables
-                    for tr in tts.tbody.find_all("tr"): # rows
-                        if tr.th.get("data-append-csv") == p["player_id"]:
-                            for td in tr.find_all(["td", "th"]): # cols
-                                data_stat = td.get("data-stat")
-                                for k in p.keys():
-                                    if k == data_stat:
-                                        if td.text.strip() == '':
-                                            p[k] = None
-                                        else:
-                                            p[k] = td.text.strip()
-                if p['player_id'] not in player_id_list:
-                    try:
-                        self.player_stats_processed += 1
-                        player_id_list.append(p['player_id'])
-                        player_stats_list.append(PlayerStats(**p))
-                        error_msg = None
-                    except Exception as e:
-                        error_msg = f"Validation error: Match {match_id}, player: {p['player_id']}, data: {tr}"
-                        logger.error(error_msg, exc_info=True)
-                    parser_tech_data_list.append(ParserTech(
-                        match_id=match_id,
-                        player_id=p['player_id'],
-                        parse_date=self.api_consumer.last_api_call_data,
-                        parse_type=PLAYER_PARSE_TYPE,
-                        error_msg=error_msg
-                        ))
-        if db:
-            values = [tuple(i.model_dump().values()) for i in parser_tech_data_list]
-            cols = list(ParserTech.get_empty_dict().keys())
-            db.insert_to_db(PARSER_TECH_TABLE_NAME, cols, values)
-        return player_stats_list
\ No newline at end of file
+                if p['player_id'] in player_ids:
+                    continue
+                for index in indexed_tables:
+                    for data_stat, value in index.get(p["player_id"], {}).items():
+                        if data_stat in p:
+                            p[data_stat] = value
+                self.player_stats_processed += 1
+                player_ids.add(p['player_id'])
+                players.append(p)
+            table.decompose()
+        return players
+
+def _parser_tech_rows(parser_tech_data_list: List[ParserTech]) -> Tuple[List[str], List[tuple]]:
+    schema = schema_for(ParserTech)
+    return list(schema.columns), [schema.to_row(i) for i in parser_tech_data_list]
+
+
+# parser of a parse worker process, created once per process by init_parse_worker
+_worker_parser = None
+# worker processes send their metrics back with every result, inline parsing records them directly
+_send_metrics = False
+
+def init_parse_worker(config: dict, send_metrics: bool = False) -> None:
+    global _worker_parser, _send_metrics
+    _worker_parser = Parser(api_consumer=None, config=config)
+    _send_metrics = send_metrics
+    if send_metrics:
+        # a forked worker starts with a copy of the parent metrics
+        metrics.drain()
+
+def _worker_metrics() -> Optional[Metrics]:
+    return metrics.drain() if _send_metrics else None
+
+def parse_matches_page(html: str, url: str, parse_date: datetime.datetime) -> Tuple[List[Match], List[ParserTech], int, Optional[Metrics]]:
+    """ Process pool entry point, returns matches, parser_tech rows, the number of processed matches and worker metrics. """
+    match_processed = _worker_parser.match_processed
+    match_list, parser_tech_data_list = _worker_parser.parse_matches(html, url, parse_date)
+    return match_list, parser_tech_data_list, _worker_parser.match_processed - match_processed, _worker_metrics()
+
+def parse_players_stats_page(html: str, match_id: str, parse_date: datetime.datetime) -> Tuple[RecordBatch, List[ParserTech], int, Optional[Metrics]]:
+    """ Process pool entry point, returns players stats, parser_tech rows, the number of processed players and worker metrics. """
+    player_stats_processed = _worker_parser.player_stats_processed
+    player_stats_batch, parser_tech_data_list = _worker_parser.parse_players_stats_batch(html, match_id, parse_date)
+    return (player_stats_batch, parser_tech_data_list, _worker_parser.player_stats_processed - player_stats_processed,
+            _worker_metrics())
\ No newline at end of file
@@ -0,0 +1,146 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+from tqdm import tqdm
+
+from Scraper.models import Match
+from Scraper.errors import CircuitOpenException
+from Scraper.parser import init_parse_worker, parse_players_stats_page
+from Scraper.metrics import metrics
+
+if TYPE_CHECKING:
+    from Scraper.scraper import Scraper
+
+# end of fetch stage marker
+_DONE = object()
+
+
+class _InlineFuture:
+    """ Parse result computed in the calling thread, used when parse_workers is 0. """
+    def __init__(self, fn, *args):
+        self._error = None
+        try:
+            self._result = fn(*args)
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        if self._error:
+            raise self._error
+        return self._result
+
+
+class MatchPipeline:
+    """
+    Processes matches in three overlapping stages:
+
+    1. fetch - a thread calling the website at the rate allowed by the limiter,
+    2. parse - match pages are parsed in a process pool,
+    3. write - the calling thread inserts parsed matches in batches (database connections stay in one thread).
+
+    Stages are connected by bounded queues, so a slow stage holds the previous ones back and at most
+    queue_size fetched pages plus 2 * parse_workers parsed pages are kept in memory.
+    A match that fails to be fetched, parsed or inserted is handed to Scraper.match_failed and the others go on,
+    only an open circuit breaker stops the fetch stage.
+    """
+    def __init__(self, scraper: "Scraper", config: dict):
+        self.scraper = scraper
+        self.parser = scraper.parser
+        self.db = scraper.db
+        self.parse_workers = config.get("parse_workers", 2)
+        self.queue_size = max(1, config.get("queue_size", 8))
+        self.write_batch_size = max(1, config.get("write_batch_size", 10))
+
+    def run(self, matches: List[Match], url: Optional[str] = None) -> None:
+        fetched = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        fetcher = threading.Thread(target=self._fetch, args=(matches, fetched, stop), daemon=True)
+        pool = ProcessPoolExecutor(self.parse_workers, initializer=init_parse_worker,
+                                   initargs=(self.parser.config, True)) if self.parse_workers else None
+        if pool is None:
+            init_parse_worker(self.parser.config)
+        in_flight = deque()
+        batch = []
+        fetch_error = None
+        progress = tqdm(total=len(matches))
+        fetcher.start()
+        try:
+            while True:
+                item = fetched.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    # keep everything fetched before the failure, like the serial mode does
+                    fetch_error = item
+                    break
+                match, html, parse_date = item
+                if isinstance(html, Exception):
+                    self.scraper.match_failed(match, html, url)
+                    progress.update()
+                    continue
+                if self.scraper.checkpoints:
+                    self.scraper.checkpoints.fetched(match.match_id)
+                args = (html, match.match_id, parse_date)
+                future = pool.submit(parse_players_stats_page, *args) if pool else _InlineFuture(parse_players_stats_page, *args)
+                in_flight.append((match, future))
+                while len(in_flight) > 2 * max(1, self.parse_workers):
+                    self._collect(*in_flight.popleft(), batch, progress, url)
+                if len(batch) >= self.write_batch_size:
+                    self._write(batch, url)
+            while in_flight:
+                self._collect(*in_flight.popleft(), batch, progress, url)
+            self._write(batch, url)
+        finally:
+            stop.set()
+            # unblock the fetcher if it waits on a full queue
+            while fetcher.is_alive():
+                try:
+                    fetched.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            progress.close()
+        if fetch_error:
+            raise fetch_error
+
+    def _fetch(self, matches: List[Match], fetched: queue.Queue, stop: threading.Event) -> None:
+        api_consumer = self.parser.api_consumer
+        try:
+            for match in matches:
+                if stop.is_set():
+                    return
+                try:
+                    resp = api_consumer.call(self.parser.match_url(match.match_id))
+                except CircuitOpenException:
+                    raise
+                except Exception as e:
+                    fetched.put((match, e, None))
+                    continue
+                fetched.put((match, resp.text, api_consumer.last_api_call_data))
+            fetched.put(_DONE)
+        except Exception as e:
+            fetched.put(e)
+
+    def _collect(self, match: Match, future: Future, batch: list, progress: tqdm, url: Optional[str] = None) -> None:
+        try:
+            player_stats, parser_tech, processed, worker_metrics = future.result()
+        except Exception as e:
+            self.scraper.match_failed(match, e, url)
+            progress.update()
+            return
+        if worker_metrics:
+            metrics.merge(worker_metrics)
+        self.parser.player_stats_processed += processed
+        if self.scraper.checkpoints:
+            self.scraper.checkpoints.parsed(match.match_id)
+        batch.append((match, player_stats, parser_tech))
+        progress.update()
+
+    def _write(self, batch: list, url: Optional[str] = None) -> None:
+        # a match whose rows are rejected goes to the dead letters, the rest of the batch is inserted
+        self.scraper._insert_isolating_failures(batch, [url] * len(batch))
+        batch.clear()
@@ -0,0 +1,173 @@
+import re
+import math
+import time
+import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Scraper.logger import logger
+from Scraper.database import Database
+from Scraper.parser import Parser
+from Scraper.scraper import Scraper
+from Scraper.errors import NoScoreAndFixturesInUrlException
+from Scraper.constants import MATCHES_TABLE_NAME, PRIORITY_CURRENT, PRIORITY_RECENT, PRIORITY_HISTORIC
+
+# .../en/comps/9/schedule/Premier-League-Scores-and-Fixtures or .../en/comps/9/2022-2023/schedule/2022-2023-Premier-League-...
+SCHEDULE_URL_RE = re.compile(
+    r"^(?P<base>.*/en/comps/\d+)/(?:(?P<season>\d{4}(?:-\d{4})?)/)?schedule/(?:\d{4}(?:-\d{4})?-)?(?P<slug>[^/]+)-Scores-and-Fixtures/?$")
+
+
+def season_url(url: str, season: Optional[str] = None) -> str:
+    """ Schedule url of a competition in season, the current season url when season is None. """
+    match = SCHEDULE_URL_RE.match(url)
+    if not match:
+        raise NoScoreAndFixturesInUrlException
+    if season is None:
+        return f"{match['base']}/schedule/{match['slug']}-Scores-and-Fixtures"
+    return f"{match['base']}/{season}/schedule/{season}-{match['slug']}-Scores-and-Fixtures"
+
+
+def duration(seconds: float) -> str:
+    minutes = int(math.ceil(seconds / 60))
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return (f"{days}d " if days else "") + f"{hours}h {minutes:02d}m"
+
+
+class PlanItem:
+    """ One competition season of a backfill. """
+    def __init__(self, url: str, competition: str, season: str, priority: int, matches_expected: int,
+                 matches_in_db: int, seconds_per_request: float):
+        self.url = url
+        self.competition = competition
+        self.season = season
+        self.priority = priority
+        self.matches_expected = matches_expected
+        self.matches_in_db = matches_in_db
+        # the schedule page, then a match report per missing match
+        self.requests = 1 + self.matches_missing
+        self.seconds = self.requests * seconds_per_request
+
+    @property
+    def matches_missing(self) -> int:
+        return max(0, self.matches_expected - self.matches_in_db)
+
+    def __str__(self) -> str:
+        return (f"P{self.priority} {self.season} {self.competition}: {self.matches_in_db}/{self.matches_expected} matches in db, "
+                f"{self.requests} requests, {duration(self.seconds)}")
+
+
+class BackfillPlanner:
+    """
+    Plans scraping of past seasons.
+
+    Competition urls are expanded into a schedule url per season. The number of requests of a season is its
+    schedule page plus a match report per match not in the database yet, the expected number of matches comes from
+    the fullest season of the competition in the database (default_matches_per_season when there is none), for the
+    current season only its elapsed part is expected. Wall time assumes every request waits for the api_consumer
+    limits, pages served from the response cache make the real run shorter.
+    Seasons are ordered by priority: the current season, then recent_seasons before it, then older ones, newer
+    first. Historic seasons with all their matches in the database are left out.
+    Seasons are matched with the database by competition name: planner.competition_names of config.yaml, otherwise
+    the name the parser reads from the current schedule page (one request per competition, the run scrapes that
+    page first anyway).
+    """
+    def __init__(self, db: Database, config: dict, parser: Optional[Parser] = None,
+                 today: Optional[datetime.date] = None):
+        self.db = db
+        self.parser = parser
+        planner_config = config.get("planner", {})
+        # competition names by competitions key of config.yaml
+        names = planner_config.get("competition_names") or {}
+        self.names = {url: names[key] for key, url in config.get("competitions", {}).items() if key in names}
+        api_config = config["api_consumer"]
+        self.seconds_per_request = max(api_config["time_limit"] / api_config["requests_limit"], api_config.get("sleep_time", 0))
+        self.seasons = planner_config.get("seasons", 5)
+        self.recent_seasons = planner_config.get("recent_seasons", 1)
+        self.season_start_month = planner_config.get("season_start_month", 7)
+        self.season_days = planner_config.get("season_days", 300)
+        self.default_matches = planner_config.get("default_matches_per_season", 380)
+        self.today = today or datetime.date.today()
+
+    @property
+    def current_season_start(self) -> int:
+        return self.today.year if self.today.month >= self.season_start_month else self.today.year - 1
+
+    def competition_name(self, url: str) -> str:
+        """ Competition as the parser stores it, e.g. Premier League. """
+        url = season_url(url)
+        if url not in self.names:
+            if self.parser is None:
+                raise ValueError(f"No competition name of {url}, set planner.competition_names or plan with a parser")
+            self.names[url] = self.parser.get_competition(url)
+        return self.names[url]
+
+    def expand(self, urls: List[str], seasons: Optional[int] = None) -> List[Tuple[str, str, str, int]]:
+        """ (schedule url, competition, season, priority) of every competition in the last seasons seasons. """
+        current = self.current_season_start
+        expanded = []
+        for url in urls:
+            competition = self.competition_name(url)
+            for start in range(current, current - (seasons or self.seasons), -1):
+                season = f"{start}-{start + 1}"
+                if start == current:
+                    expanded.append((season_url(url), competition, season, PRIORITY_CURRENT))
+                else:
+                    priority = PRIORITY_RECENT if current - start <= self.recent_seasons else PRIORITY_HISTORIC
+                    expanded.append((season_url(url, season), competition, season, priority))
+        return expanded
+
+    def plan(self, urls: List[str], seasons: Optional[int] = None) -> List[PlanItem]:
+        in_db = {(competition, season): count for competition, season, count in self.db.get_custom_query(
+            f"SELECT competition, season, COUNT(*) FROM {MATCHES_TABLE_NAME} GROUP BY competition, season")}
+        current = f"{self.current_season_start}-{self.current_season_start + 1}"
+        full_season: Dict[str, int] = {}
+        for (competition, season), count in in_db.items():
+            if season != current:
+                full_season[competition] = max(full_season.get(competition, 0), count)
+        season_start = datetime.date(self.current_season_start, self.season_start_month, 1)
+        elapsed = min(1.0, (self.today - season_start).days / self.season_days)
+
+        items = []
+        for url, competition, season, priority in self.expand(urls, seasons):
+            expected = full_season.get(competition, self.default_matches)
+            if season == current:
+                expected = math.ceil(expected * elapsed)
+            item = PlanItem(url, competition, season, priority, expected, in_db.get((competition, season), 0),
+                            self.seconds_per_request)
+            if item.matches_missing or priority == PRIORITY_CURRENT:
+                items.append(item)
+        # stable sort, competitions keep the order of urls within a season
+        return sorted(items, key=lambda item: (item.priority, -int(item.season[:4])))
+
+    def describe(self, items: List[PlanItem]) -> str:
+        lines, elapsed = [], 0.0
+        for item in items:
+            elapsed += item.seconds
+            lines.append(f"{item} (done after {duration(elapsed)})")
+        lines.append(f"{len(items)} seasons, {sum(i.matches_missing for i in items)} matches, "
+                     f"{sum(i.requests for i in items)} requests, {duration(elapsed)} "
+                     f"at {self.seconds_per_request:g}s per request")
+        return "\n".join(lines)
+
+    def run(self, scraper: Scraper, items: List[PlanItem], budget_seconds: Optional[float] = None,
+            clock: Callable[[], float] = time.monotonic) -> List[PlanItem]:
+        """
+        Scrapes planned seasons in order. With budget_seconds current and recent seasons are always scraped,
+        historic ones only fill the time left: the last one is cut to the matches that fit and the rest is left for
+        the next run. Returns the scraped items.
+        """
+        deadline = clock() + budget_seconds if budget_seconds is not None else None
+        scraped = []
+        for item in items:
+            limit = None
+            if deadline is not None and item.priority == PRIORITY_HISTORIC:
+                # one request goes to the schedule page
+                fits = int((deadline - clock()) / self.seconds_per_request) - 1
+                if fits < 1:
+                    logger.info(f"Backfill budget used up, {len(items) - len(scraped)} seasons left for the next run")
+                    break
+                limit = fits if fits < item.matches_missing else None
+            logger.info(f"Backfill: {item}" + (f", first {limit} matches" if limit else ""))
+            scraper.scrape_data(item.url, limit)
+            scraped.append(item)
+        return scraped
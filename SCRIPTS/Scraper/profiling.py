@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from Scraper.logger import logger
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every interval seconds in a background thread.
+    Stacks are written in the folded format (root;...;leaf count) read by flamegraph.pl and speedscope.
+    """
+    def __init__(self, interval: float, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profiling mode of scraping runs, artifacts are written to <directory>/<run_id>:
+
+    - cprofile_<competition>.prof (pstats/snakeviz) and .txt (top functions by cumulative time) per competition url,
+    - memory_<n>_<stage>.txt tracemalloc snapshots at stage boundaries: after get_matches, at the first database
+      flush after every memory_every matches and at the end of a competition, with the growth since the previous one,
+    - stacks_<competition>.folded sampled stacks for flamegraphs, when sample_interval is set.
+
+    Competitions interleaved on one thread (the crawler) add their blocks of work to sections, one cProfile per
+    competition url written by write_sections, while sampling covers the whole crawl.
+    Only the calling thread is profiled by cProfile and the sampler (parse worker processes are not).
+    Scraper keeps no profiler when the mode is off, so there is no overhead then.
+    """
+    def __init__(self, directory: str, memory_every: int = 50, sample_interval: float = 0.0, top: int = 30):
+        self.directory = directory
+        self.memory_every = memory_every
+        self.sample_interval = sample_interval
+        self.top = top
+        self._snapshots = 0
+        self._previous = None
+        self._matches = 0
+        self._matches_at_snapshot = 0
+        self._profile = None
+        self._sections: Dict[str, cProfile.Profile] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    @classmethod
+    def from_config(cls, config: dict, run_id: str) -> Optional["Profiler"]:
+        """ Profiler from the profiling section of config.yaml, None when disabled. """
+        profiling_config = config.get("profiling", {})
+        if not profiling_config.get("enabled"):
+            return None
+        return cls(
+            os.path.join(profiling_config.get("directory", "profiles"), run_id),
+            memory_every=profiling_config.get("memory_every", 50),
+            sample_interval=profiling_config.get("sample_interval", 0.0),
+            top=profiling_config.get("top", 30),
+        )
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        """ cProfile (and stack sampling) of the block, e.g. scraping of one competition. """
+        try:
+            with self.sampling(name), self.section(name):
+                yield
+        finally:
+            self.write_sections()
+
+    @contextmanager
+    def sampling(self, name: str) -> Iterator[None]:
+        """ Samples stacks of the block when sample_interval is set. """
+        sampler = StackSampler(self.sample_interval) if self.sample_interval else None
+        if sampler:
+            sampler.start()
+        try:
+            yield
+        finally:
+            if sampler:
+                sampler.stop()
+                sampler.write(os.path.join(self.directory, f"stacks_{_slug(name)}.folded"))
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """
+        Adds the block to the cProfile of name, kept until write_sections. Blocks of other sections may run in
+        between, the block itself must not await.
+        """
+        profile = self._sections.setdefault(_slug(name), cProfile.Profile())
+        previous = self._profile
+        if previous:
+            previous.disable()
+        self._profile = profile
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._profile = previous
+            if previous:
+                previous.enable()
+
+    def write_sections(self) -> None:
+        """ Writes the cProfile of every section and a memory snapshot at its end. """
+        while self._sections:
+            name, profile = self._sections.popitem()
+            path = os.path.join(self.directory, f"cprofile_{name}")
+            profile.dump_stats(path + ".prof")
+            with open(path + ".txt", "w") as f:
+                pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(self.top)
+            self.snapshot(f"end_{name}")
+            logger.info(f"Profile of {name} written to {self.directory}")
+
+    def snapshot(self, stage: str, url: Optional[str] = None) -> None:
+        """ Writes the largest allocations and their growth since the previous snapshot. """
+        if url:
+            stage = f"{stage}_{_slug(url)}"
+        # reports are built outside of cProfile, they would dominate the profile otherwise
+        if self._profile:
+            self._profile.disable()
+        try:
+            self._write_snapshot(stage)
+        finally:
+            if self._profile:
+                self._profile.enable()
+
+    def _write_snapshot(self, stage: str) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        self._snapshots += 1
+        path = os.path.join(self.directory, f"memory_{self._snapshots:03d}_{_slug(stage)}.txt")
+        with open(path, "w") as f:
+            f.write(f"stage: {stage}\nmatches: {self._matches}\ntime: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    f"traced: {current / 2 ** 20:.1f} MB, peak: {peak / 2 ** 20:.1f} MB\n\ntop allocations:\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                f.write(f"{stat}\n")
+            if self._previous is not None:
+                f.write("\ngrowth since the previous snapshot:\n")
+                for stat in snapshot.compare_to(self._previous, "lineno")[:self.top]:
+                    f.write(f"{stat}\n")
+        self._previous = snapshot
+        self._matches_at_snapshot = self._matches
+
+    def matches_flushed(self, count: int) -> None:
+        """ Called after every database flush, takes a snapshot once memory_every matches passed since the last one. """
+        self._matches += count
+        if self.memory_every and self._matches - self._matches_at_snapshot >= self.memory_every:
+            self.snapshot(f"flush_{self._matches}")
+
+    def close(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+
+
+def _slug(name: str) -> str:
+    """ File name part of a url or stage name, e.g. Premier-League-Scores-and-Fixtures. """
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name.rstrip("/").split("/")[-1]) or "run"
@@ -0,0 +1,130 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Type, Union
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+
+class ModelSchema:
+    """
+    Column order and a compiled row validator of a model, built once per model by schema_for.
+
+    coerce turns raw values (e.g. cell texts) into a row tuple with the types the model would validate them to,
+    without creating model instances. Validation runs in pydantic-core on whole rows, or on whole pages of rows
+    with coerce_many.
+    """
+    __slots__ = ("model", "columns", "_row", "_rows")
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.columns: Tuple[str, ...] = tuple(model.model_fields)
+        row_type = Tuple[tuple(field.annotation for field in model.model_fields.values())]
+        self._row = TypeAdapter(row_type)
+        self._rows = TypeAdapter(List[row_type])
+
+    def coerce(self, values: Dict[str, Any]) -> tuple:
+        """ Raises ValidationError (a ValueError) on values the model would reject. """
+        return self._row.validate_python([values.get(column) for column in self.columns])
+
+    def coerce_many(self, values: List[Dict[str, Any]]) -> List[Union[tuple, ValidationError]]:
+        """ Coerces rows in one call, an invalid row is returned as its ValidationError instead of a tuple. """
+        raw = [[v.get(column) for column in self.columns] for v in values]
+        try:
+            return self._rows.validate_python(raw)
+        except ValidationError:
+            pass
+        rows = []
+        for row in raw:
+            try:
+                rows.append(self._row.validate_python(row))
+            except ValidationError as e:
+                rows.append(e)
+        return rows
+
+    def validate_rows(self, rows: Iterable[Sequence[Any]]) -> List[tuple]:
+        """ Coerces rows already in column order (e.g. read back from the database), raises on an invalid one. """
+        return self._rows.validate_python(list(rows))
+
+    def to_row(self, record: BaseModel) -> tuple:
+        """ Row tuple of an already validated model instance, cheaper than model_dump. """
+        values = record.__dict__
+        return tuple(values[column] for column in self.columns)
+
+    def to_model(self, row: Sequence[Any]) -> BaseModel:
+        """ Model instance from a coerced row, skips validation. """
+        return self.model.model_construct(**dict(zip(self.columns, row)))
+
+
+@lru_cache(maxsize=None)
+def schema_for(model: Type[BaseModel]) -> ModelSchema:
+    return ModelSchema(model)
+
+
+class RecordBatch:
+    """
+    Rows of one model kept column by column, the compact form passed from the parser to the database.
+
+    Iterating yields row tuples in schema column order, so a batch can be given to insert_to_db as values.
+    """
+    __slots__ = ("schema", "data")
+
+    def __init__(self, model: Type[BaseModel], rows: Iterable[Sequence[Any]] = ()):
+        self.schema = schema_for(model)
+        self.data: List[list] = [[] for _ in self.schema.columns]
+        self.extend(rows)
+
+    @classmethod
+    def from_models(cls, model: Type[BaseModel], records: Iterable[BaseModel]) -> "RecordBatch":
+        schema = schema_for(model)
+        return cls(model, (schema.to_row(r) for r in records))
+
+    @property
+    def model(self) -> Type[BaseModel]:
+        return self.schema.model
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.schema.columns)
+
+    def append(self, row: Sequence[Any]) -> None:
+        for column, value in zip(self.data, row):
+            column.append(value)
+
+    def append_values(self, values: Dict[str, Any]) -> None:
+        """ Coerces and appends one row, raises ValidationError leaving the batch unchanged. """
+        self.append(self.schema.coerce(values))
+
+    def extend(self, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def column(self, name: str) -> list:
+        return self.data[self.schema.columns.index(name)]
+
+    def to_models(self) -> List[BaseModel]:
+        return [self.schema.to_model(row) for row in self]
+
+    def __len__(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def __iter__(self) -> Iterator[tuple]:
+        return zip(*self.data)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[tuple, "RecordBatch"]:
+        if isinstance(index, slice):
+            batch = RecordBatch(self.model)
+            batch.data = [column[index] for column in self.data]
+            return batch
+        return tuple(column[index] for column in self.data)
+
+    def __reduce__(self):
+        # schema holds validators, batches are sent to and from parse worker processes by model and data
+        return _restore_batch, (self.model, self.data)
+
+    def __repr__(self) -> str:
+        return f"RecordBatch({self.model.__name__}, {len(self)} rows)"
+
+
+def _restore_batch(model: Type[BaseModel], data: List[list]) -> RecordBatch:
+    batch = RecordBatch(model)
+    batch.data = data
+    return batch
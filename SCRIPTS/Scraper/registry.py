@@ -0,0 +1,57 @@
+"""
+Pluggable parts chosen by name in config.yaml. Entries are "module:attribute" paths and a module is imported
+only when one of its names is resolved, so a run doesn't pay for (or need) drivers and engines it doesn't use.
+Keep this module free of imports of other Scraper modules, command line startup goes through it.
+"""
+from importlib import import_module
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+class Registry(Mapping):
+    """ Names of one kind of component mapped to import paths, read like a dict of the resolved objects. """
+    def __init__(self, kind: str, entries: Dict[str, str]):
+        self.kind = kind
+        self.entries = dict(entries)
+        self._resolved: Dict[str, Any] = {}
+
+    def register(self, name: str, path: str) -> None:
+        self.entries[name] = path
+        self._resolved.pop(name, None)
+
+    def resolve(self, name: str) -> Any:
+        if name not in self.entries:
+            raise ValueError(f"Unknown {self.kind}: {name}, choose one of {list(self.entries)}")
+        return self[name]
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._resolved:
+            module, attribute = self.entries[name].split(":")
+            self._resolved[name] = getattr(import_module(module), attribute)
+        return self._resolved[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# callables building a Database from config
+DATABASE_BACKENDS = Registry("database backend", {
+    "sqlite": "Scraper.database:open_sqlite",
+    "azure": "Scraper.database:open_azure",
+})
+
+# ParserEngine classes, see Scraper.html_engine
+PARSER_ENGINES = Registry("parser engine", {
+    "html.parser": "Scraper.html_engine:HtmlParserEngine",
+    "lxml": "Scraper.html_engine:LxmlEngine",
+})
+
+
+def open_database(config: dict, backend: Optional[str] = None) -> Any:
+    """ Database of backend, database.backend of config.yaml by default. """
+    return DATABASE_BACKENDS.resolve(backend or config.get("database", {}).get("backend", "sqlite"))(config)
@@ -1,45 +1,289 @@
-from typing import List, Union
+import os
+import json
+import datetime
+from contextlib import contextmanager
+from itertools import groupby, islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 from tqdm import tqdm
 
-from Scraper.models import Match, PlayerStats
-from Scraper.errors import NoScoreAndFixturesInUrlException
+from Scraper.models import Match, PlayerStats, ParserTech, RunMetric
+from Scraper.errors import NoScoreAndFixturesInUrlException, CircuitOpenException
 from Scraper.logger import logger
 from Scraper.database import Database
 from Scraper.parser import Parser
-from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+from Scraper.pipeline import MatchPipeline
+from Scraper.checkpoints import CheckpointStore
+from Scraper.dead_letters import DeadLetterStore
+from Scraper.aggregates import AggregateStore
+from Scraper.records import RecordBatch
+from Scraper.metrics import metrics
+from Scraper.profiling import Profiler
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME, RUN_METRICS_TABLE_NAME
 
 
         
 class Scraper:
     """Interacts with database."""
-    def __init__(self, parser: Parser, db: Database):
+    def __init__(self, parser: Parser, db: Database, config: Optional[dict]=None):
         self.parser = parser
         self.db = db
+        # parser_tech rows are written with the data transaction, see _write_transaction
+        self.parser.audit_buffer = []
+        # "serial" or "pipeline", see MatchPipeline
+        self.scraper_config = (config or {}).get("scraper", {})
+        # progress of unfinished runs, lets a restarted run continue where the previous one stopped
+        self.checkpoints = CheckpointStore(db) if self.scraper_config.get("checkpoints") else None
+        # failed matches are kept there for a retry pass instead of stopping the competition
+        self.dead_letters = DeadLetterStore.from_config(db, config or {})
+        # summary tables updated with the matches inserted by every run
+        self.aggregates = AggregateStore(db) if self.scraper_config.get("aggregates") else None
+        # stage timings saved to run_metrics after every competition and exported at the end of the run
+        self.metrics_config = (config or {}).get("metrics", {})
+        if self.metrics_config.get("table"):
+            self.db.create_table(RunMetric, RUN_METRICS_TABLE_NAME)
+        self.started_at = datetime.datetime.now()
+        self.run_id = f"{self.started_at:%Y%m%dT%H%M%S}-{os.getpid()}"
+        self._run_metrics = self._recorded_metrics = metrics.snapshot()
+        # None unless the profiling mode is on
+        self.profiler = Profiler.from_config(config or {}, self.run_id)
         self.url = "https://fbref.com/"
         self.matches_added = 0
         self.players_stats_added = 0
+        self.matches_failed = 0
+        self.inserted_match_ids: List[str] = []
     
     def _process_player_stats(self, match_id: str) -> None:
         """Scrapes and inserts player stats for a given match_id."""
         player_stats = self.parser.get_players_stats(match_id, db=self.db)
-        values = [tuple(i.model_dump().values()) for i in player_stats]
-        cols = list(PlayerStats.get_empty_dict().keys())
-        self.db.insert_to_db(PLAYER_STATS_TABLE_NAME, cols, values)
-        self.players_stats_added += len(values)
+        batch = RecordBatch.from_models(PlayerStats, player_stats)
+        self.db.insert_to_db(PLAYER_STATS_TABLE_NAME, batch.columns, batch)
+        self.players_stats_added += len(batch)
+        metrics.inc("players_stats_added", len(batch))
 
-    def _process_matches(self, data: List[Match], number_of_matches_to_scrape: Union[int, None]) -> None:
-        """Processes and inserts matches data."""
+    @contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        """
+        Transaction writing match data, parser_tech rows buffered by its end are inserted with it. The rows leave
+        the buffer once it succeeded, after a rollback they stay for the next write (or flush_audit).
+        """
+        rows = self.parser.audit_buffer
+        with metrics.timer("write_batch"), self.db.transaction():
+            yield
+            flushed = len(rows)
+            if flushed:
+                batch = RecordBatch.from_models(ParserTech, rows)
+                self.db.insert_to_db(PARSER_TECH_TABLE_NAME, batch.columns, batch)
+        del rows[:flushed]
+
+    def _insert_parsed_matches(self, parsed: List[Tuple[Match, Union[RecordBatch, List[PlayerStats]], List[ParserTech]]]) -> None:
+        """ Inserts already parsed matches in one transaction with one insert per table, match rows go last. """
+        if not parsed:
+            return
+        self.parser.log_audit([t for _, _, tech in parsed for t in tech], self.db)
+        self._write_parsed(parsed)
+
+    def _write_parsed(self, parsed: List[Tuple[Match, Union[RecordBatch, List[PlayerStats]], List[ParserTech]]],
+                      select: Optional[Callable[[List[str]], Iterable[str]]] = None) -> None:
+        """ select, when given, is called first in the write transaction with the match ids and returns the ones to write. """
+        with self._write_transaction():
+            if select is not None:
+                selected = set(select([m.match_id for m, _, _ in parsed]))
+                parsed = [p for p in parsed if p[0].match_id in selected]
+            if not parsed:
+                return
+            player_stats = RecordBatch(PlayerStats)
+            for _, stats, _ in parsed:
+                player_stats.extend(stats if isinstance(stats, RecordBatch) else RecordBatch.from_models(PlayerStats, stats))
+            matches = RecordBatch.from_models(Match, (m for m, _, _ in parsed))
+            if player_stats:
+                self.db.insert_to_db(PLAYER_STATS_TABLE_NAME, player_stats.columns, player_stats)
+            self.db.insert_to_db(MATCHES_TABLE_NAME, matches.columns, matches)
+            if self.checkpoints:
+                self.checkpoints.committed([m.match_id for m, _, _ in parsed])
+        if self.profiler:
+            self.profiler.matches_flushed(len(parsed))
+        self.players_stats_added += len(player_stats)
+        self.matches_added += len(parsed)
+        metrics.inc("matches_added", len(parsed))
+        metrics.inc("players_stats_added", len(player_stats))
+        self.inserted_match_ids += [m.match_id for m, _, _ in parsed]
+
+    def _insert_isolating_failures(self, parsed: List[Tuple[Match, Union[RecordBatch, List[PlayerStats]], List[ParserTech]]],
+                                   urls: List[Optional[str]], select: Optional[Callable[[List[str]], Iterable[str]]] = None,
+                                   failed: Optional[Callable[[Match, Exception, Optional[str]], None]] = None) -> List[bool]:
+        """
+        Inserts parsed matches (found on urls) like _insert_parsed_matches, select as in _write_parsed. When the batch
+        fails it is rolled back and its matches are inserted one by one, the ones failing again go to failed
+        (match_failed by default). Returns False for the matches that failed.
+        """
+        if not parsed:
+            return []
+        failed = failed or self.match_failed
+        self.parser.log_audit([t for _, _, tech in parsed for t in tech], self.db)
+        try:
+            self._write_parsed(parsed, select)
+            return [True] * len(parsed)
+        except Exception as e:
+            logger.warning(f"Batch of {len(parsed)} matches not inserted, inserting them one by one: {e!r}")
+        inserted = []
+        for item, url in zip(parsed, urls):
+            try:
+                self._write_parsed([item], select)
+                inserted.append(True)
+            except Exception as e:
+                failed(item[0], e, url)
+                inserted.append(False)
+        return inserted
+
+    def match_failed(self, match: Match, error: Exception, url: Optional[str]=None) -> None:
+        """ Hands a match whose fetch, parse or insert failed over to the dead letters. """
+        logger.error(f"Match {match.match_id} failed: {error!r}", exc_info=error)
+        self.matches_failed += 1
+        metrics.inc("matches_failed")
+        if self.checkpoints:
+            self.checkpoints.failed(match.match_id)
+        if self.dead_letters:
+            self.dead_letters.record(match, error, url)
+
+    def flush_audit(self) -> None:
+        """ Inserts parser_tech rows buffered by the parser and not written by a data transaction yet. """
+        rows = self.parser.audit_buffer
+        if rows:
+            batch = RecordBatch.from_models(ParserTech, rows)
+            self.db.insert_to_db(PARSER_TECH_TABLE_NAME, batch.columns, batch)
+            rows.clear()
+
+    def _process_matches(self, data: List[Match], number_of_matches_to_scrape: Union[int, None], url: Optional[str]=None) -> None:
+        """Processes and inserts matches data. A failing match goes to the dead letters, the others go on."""
         if number_of_matches_to_scrape is not None:
             data = data[:number_of_matches_to_scrape]
+        if self.scraper_config.get("mode", "serial") == "pipeline":
+            MatchPipeline(self, self.scraper_config).run(data, url)
+            return
         # Getting players stats data
         for match in tqdm(data):
-            # get and insert all players stats
-            self._process_player_stats(match.match_id)
-            # insert match data
-            values = [tuple(match.model_dump().values())]
-            cols = list(Match.get_empty_dict().keys())
-            self.db.insert_to_db(MATCHES_TABLE_NAME, cols, values)
+            try:
+                # parser_tech, players stats and the match row are committed together
+                with self._write_transaction():
+                    # get and insert all players stats
+                    self._process_player_stats(match.match_id)
+                    # insert match data
+                    matches = RecordBatch.from_models(Match, [match])
+                    self.db.insert_to_db(MATCHES_TABLE_NAME, matches.columns, matches)
+                    if self.checkpoints:
+                        self.checkpoints.committed([match.match_id])
+            except CircuitOpenException:
+                # the website is down, the next matches would fail the same way
+                raise
+            except Exception as e:
+                self.match_failed(match, e, url)
+                continue
             self.matches_added += 1
+            self.inserted_match_ids.append(match.match_id)
+            metrics.inc("matches_added")
+            if self.profiler:
+                self.profiler.matches_flushed(1)
+
+    def _stream_matches(self, url: str, number_of_matches_to_scrape: Union[int, None]) -> int:
+        """
+        Processes matches of url in chunks of stream_chunk_size while the schedule is read, so only one chunk of
+        matches is held at a time. Returns the number of matches processed.
+        """
+        chunk_size = self.scraper_config.get("stream_chunk_size", 100)
+        matches = self.parser.iter_matches(url, db=self.db)
+        total = to_process = 0
+        try:
+            while number_of_matches_to_scrape is None or to_process < number_of_matches_to_scrape:
+                chunk = list(islice(matches, chunk_size))
+                if not chunk:
+                    break
+                if self.profiler and not total:
+                    self.profiler.snapshot("after_get_matches", url)
+                total += len(chunk)
+                chunk = self.db.check_matches_not_in_db(chunk)
+                if self.dead_letters:
+                    chunk = self.dead_letters.exclude(chunk)
+                if self.checkpoints:
+                    # resumed or failed in this run
+                    chunk = self.checkpoints.exclude(url, chunk)
+                if number_of_matches_to_scrape is not None:
+                    chunk = chunk[:number_of_matches_to_scrape - to_process]
+                if self.checkpoints:
+                    self.checkpoints.queue(url, chunk)
+                if chunk:
+                    self._process_matches(chunk, None, url)
+                to_process += len(chunk)
+        finally:
+            # the schedule tree is released and its parser_tech rows logged when the limit stops reading early
+            matches.close()
+        logger.info(f"{to_process}/{total} matches processed. The rest already in db or over the limit.")
+        return to_process
+
+    def retry_dead_letters(self, limit: Optional[int]=None) -> int:
+        """ Scrapes dead-lettered matches due for a retry, returns the number of them inserted. """
+        due = self.dead_letters.due(limit) if self.dead_letters else []
+        if not due:
+            return 0
+        logger.info(f"Retrying {len(due)} dead-lettered matches")
+        # inserted by a retry that stopped before resolving them
+        in_db = {m.match_id for _, m in due} - {m.match_id for m in self.db.check_matches_not_in_db([m for _, m in due])}
+        self.dead_letters.resolved(list(in_db))
+        inserted_before = len(self.inserted_match_ids)
+        try:
+            for url, group in groupby(sorted(due, key=lambda item: item[0] or ""), key=lambda item: item[0]):
+                matches = [m for _, m in group if m.match_id not in in_db]
+                if matches:
+                    self._process_matches(matches, None, url)
+        except Exception:
+            logger.exception("Dead letters retry stopped", exc_info=True)
+        finally:
+            self.flush_audit()
+            inserted = self.inserted_match_ids[inserted_before:]
+            self.dead_letters.resolved(inserted)
+            self.update_aggregates(inserted)
+            self.record_metrics()
+        logger.info(f"{len(inserted)}/{len(due)} dead-lettered matches inserted, dead letters: {self.dead_letters.counts()}")
+        return len(inserted)
+
+    def update_aggregates(self, match_ids: List[str]) -> None:
+        """ Adds inserted matches to the aggregate tables, a failure is logged and fixed by a later update. """
+        if not self.aggregates or not match_ids:
+            return
+        try:
+            self.aggregates.update(match_ids)
+        except Exception:
+            logger.exception("Aggregates not updated", exc_info=True)
+
+    def record_metrics(self, url: Optional[str]=None) -> None:
+        """ Saves metrics recorded since the previous call to the run_metrics table. """
+        if not self.metrics_config.get("table"):
+            return
+        snapshot = metrics.snapshot()
+        rows = RecordBatch.from_models(RunMetric, snapshot.since(self._recorded_metrics).rows(self.run_id, url))
+        self._recorded_metrics = snapshot
+        try:
+            if rows:
+                self.db.insert_to_db(RUN_METRICS_TABLE_NAME, rows.columns, rows)
+        except Exception:
+            logger.exception("Run metrics not saved", exc_info=True)
+
+    def export_metrics(self) -> None:
+        """ Writes metrics of the whole run to metrics.directory, as Prometheus text and a JSON run summary. """
+        directory = self.metrics_config.get("directory")
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        summary = {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "matches_added": self.matches_added,
+            "players_stats_added": self.players_stats_added,
+            **metrics.since(self._run_metrics).summary(),
+        }
+        with open(os.path.join(directory, f"run_{self.run_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        metrics.write_prometheus(os.path.join(directory, "scraper.prom"))
 
     def scrape_data(self, url: str, number_of_matches_to_scrape: Union[int, None]=None) -> None:
         """ 
@@ -53,21 +297,48 @@ class Scraper:
         3. Processes the data.
         4. Insert data into db.
         """
+        if self.profiler:
+            with self.profiler.profile(url):
+                return self._scrape_data(url, number_of_matches_to_scrape)
+        return self._scrape_data(url, number_of_matches_to_scrape)
+
+    def _scrape_data(self, url: str, number_of_matches_to_scrape: Union[int, None]) -> None:
         logger.info(f"Processing from {url}")
         if "Scores-and-Fixtures" not in url:
             raise NoScoreAndFixturesInUrlException
 
+        to_process = 0
+        inserted_before = len(self.inserted_match_ids)
+        url_metrics = metrics.snapshot()
         try:
-            match_data_from_url = self.parser.get_matches(url, db=self.db)
-            match_data = self.db.check_matches_not_in_db(match_data_from_url)
-            logger.info(f"There are {len(match_data)}/{len(match_data_from_url)} to process. The rest already in db.")
-            logger.info(f"There will be {number_of_matches_to_scrape if number_of_matches_to_scrape and len(match_data) < number_of_matches_to_scrape else len(match_data)} matches to process.")
+            match_data = self.checkpoints.pending(url) if self.checkpoints else []
             if match_data:
-                self._process_matches(match_data, number_of_matches_to_scrape)
+                logger.info(f"Resuming {len(match_data)} matches queued by an unfinished run.")
+                match_data = match_data[:number_of_matches_to_scrape]
+                to_process = len(match_data)
+                self._process_matches(match_data, None, url)
+            if number_of_matches_to_scrape is None or to_process < number_of_matches_to_scrape:
+                # chunks not queued before the crash, the schedule page comes from the response cache
+                to_process += self._stream_matches(
+                    url, None if number_of_matches_to_scrape is None else number_of_matches_to_scrape - to_process)
+            if self.checkpoints:
+                self.checkpoints.finish(url)
         except Exception as e:
             logger.exception(f"Expection occured in scraper.scrape_data", exc_info=True)
         finally:
-            if len(match_data) >= 1:
+            # rows of pages whose matches were not inserted, e.g. a schedule with every match already in db
+            self.flush_audit()
+            self.update_aggregates(self.inserted_match_ids[inserted_before:])
+            self.record_metrics(url)
+            if to_process >= 1:
                 logger.info(f"{self.matches_added}/{self.parser.match_processed} matches added")
                 logger.info(f"{self.players_stats_added}/{self.parser.player_stats_processed} players stats added")
+                if self.matches_failed:
+                    logger.info(f"{self.matches_failed} matches failed, see {'dead letters' if self.dead_letters else 'the log'}")
                 logger.info(f"Total api calls: {self.parser.api_consumer.api_calls}")
+                logger.info(f"Transport: {self.parser.api_consumer.transport.stats}")
+                logger.info(f"Limiter: {self.parser.api_consumer.limiter.summary()}")
+                if self.parser.api_consumer.cache:
+                    logger.info(f"Response cache: {self.parser.api_consumer.cache.stats}")
+                stages = metrics.since(url_metrics).summary()["stages"]
+                logger.info("Stage seconds: " + ", ".join(f"{name} {s['seconds']:.1f}" for name, s in stages.items()))
@@ -0,0 +1,176 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from urllib3.util import make_headers
+
+from Scraper.errors import CircuitOpenException, ResponseTooLargeException
+from Scraper.logger import logger
+
+CHUNK_SIZE = 64 * 1024
+
+
+class TransportStats:
+    """ Counters collected by a transport over its lifetime. """
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        # bytes as sent over the wire (compressed) and after content decoding
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return self.requests - self.connections_opened
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.bytes_decoded / self.bytes_received if self.bytes_received else 1.0
+
+    def __str__(self) -> str:
+        return (f"{self.requests} requests, {self.connections_opened} connections opened, "
+                f"{self.connections_reused} reused, {self.bytes_received} bytes received "
+                f"({self.bytes_decoded} decoded, x{self.compression_ratio:.1f} compression)")
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a host after failure_threshold consecutive failures. After reset_timeout seconds one
+    trial request is let through; its success closes the circuit, its failure opens it again.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self, host: str) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            retry_in = self.opened_at + self.reset_timeout - self.clock()
+            if retry_in > 0:
+                raise CircuitOpenException(host, retry_in)
+            # half open, let one request through and fail fast on the rest until it resolves
+            self.opened_at = self.clock()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.opened_at = self.clock()
+
+
+class Transport(ABC):
+    """ Performs HTTP GET requests for APIConsumer. Swap it to change how pages are fetched. """
+    def __init__(self):
+        self.stats = TransportStats()
+
+    @abstractmethod
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class PooledTransport(Transport):
+    """
+    Long-lived requests session with keep-alive connection pooling, compressed transfer encoding,
+    size-guarded streamed body reads and a circuit breaker per transport.
+    """
+    def __init__(self, config: dict):
+        super().__init__()
+        self.timeout = config.get("timeout", 15)
+        self.max_body_size = int(config.get("max_body_size_mb", 10) * 1024 * 1024)
+        breaker_config = config.get("circuit_breaker", {})
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=breaker_config.get("failure_threshold", 5),
+            reset_timeout=breaker_config.get("reset_timeout", 300)
+        )
+        # use retries, because the website doesn't respond every time. Only transient server errors are retried
+        # here: 429/503 go back to APIConsumer whose limiter honours Retry-After, other statuses (404) fail at once
+        retry_strategy = Retry(
+            total=config.get("retries", 3),
+            backoff_factor=config.get("backoff_factor", 5),
+            status_forcelist=config.get("retry_statuses", [500, 502, 504]),
+            allowed_methods=["GET"],
+            respect_retry_after_header=False,
+            # the last response is returned, APIConsumer raises HTTPError with its status
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=config.get("pool_connections", 2),
+            pool_maxsize=config.get("pool_maxsize", 4),
+            max_retries=retry_strategy
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        # gzip and deflate always, br/zstd when urllib3 can decode them
+        self.session.headers.update(make_headers(accept_encoding=True))
+        self.session.headers.update({"Content-Type": "text"})
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        host = urlsplit(url).netloc
+        self.circuit_breaker.before_request(host)
+        connections_before = self._pool_connections()
+        try:
+            resp = self.session.get(url, timeout=self.timeout, headers=headers, stream=True)
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        try:
+            self._read_body(url, resp)
+        finally:
+            # returns the connection to the pool
+            resp.close()
+        self.stats.requests += 1
+        self.stats.connections_opened += self._pool_connections() - connections_before
+        if resp.status_code >= 500 or resp.status_code == 429:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return resp
+
+    def _pool_connections(self) -> int:
+        """ Number of connections opened so far by the pools of this transport. """
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def _read_body(self, url: str, resp: requests.Response) -> None:
+        content_length = resp.headers.get("Content-Length")
+        if isinstance(content_length, str) and content_length.isdigit() and int(content_length) > self.max_body_size:
+            raise ResponseTooLargeException(url, self.max_body_size)
+        chunks = []
+        size = 0
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_body_size:
+                raise ResponseTooLargeException(url, self.max_body_size)
+            chunks.append(chunk)
+        resp._content = b"".join(chunks)
+        resp._content_consumed = True
+        self.stats.bytes_decoded += size
+        wire_bytes = resp.raw.tell() if hasattr(resp.raw, "tell") else size
+        self.stats.bytes_received += wire_bytes if isinstance(wire_bytes, int) else size
+
+    def close(self) -> None:
+        self.session.close()
@@ -5,6 +5,7 @@ type_mapping = {
     Union[str, None]: 'TEXT',
     Union[int, None]: 'INTEGER',
     Union[float, None]: 'REAL',
+    Union[datetime.datetime, None]: 'DATETIME',
     int: 'INTEGER',
     str: 'TEXT',
     datetime.date: 'DATE',
@@ -16,6 +17,7 @@ azure_sql_type_mapping = {
     Union[str, None]: 'VARCHAR(100)',
     Union[int, None]: 'INT',
     Union[float, None]: 'REAL',
+    Union[datetime.datetime, None]: 'DATETIME',
     int: 'INT',
     str: 'VARCHAR(100)',
     datetime.date: 'DATE',
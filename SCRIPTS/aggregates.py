@@ -0,0 +1,27 @@
+def main():
+    from Scraper.registry import open_database
+    from Scraper.config import Config
+    from Scraper.aggregates import AggregateStore
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Checks the aggregate tables against a full recompute.")
+    arg_parser.add_argument("--rebuild", action="store_true", help="replace the aggregate tables with recomputed ones")
+    args = arg_parser.parse_args()
+
+    config_file = "config.yaml"
+    config = Config(config_file).load_config()
+
+    # backend by database.backend, only its driver is imported
+    db = open_database(config)
+
+    try:
+        aggregates = AggregateStore(db)
+        if args.rebuild:
+            aggregates.rebuild()
+        else:
+            aggregates.validate()
+    finally:
+        db.con.close()
+
+if __name__ == "__main__":
+    main()
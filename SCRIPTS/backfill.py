@@ -0,0 +1,42 @@
+def main():
+    from Scraper.scraper import Scraper
+    from Scraper.registry import open_database
+    from Scraper.cli import competition_urls
+    from Scraper.config import Config
+    from Scraper.api_consumer import APIConsumer
+    from Scraper.parser import Parser
+    from Scraper.planner import BackfillPlanner
+    from Scraper.migration import SchemaMigration
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Scrapes past seasons of all competitions, most recent first.")
+    arg_parser.add_argument("--dry-run", action="store_true", help="print the plan and its estimated duration only")
+    arg_parser.add_argument("--seasons", type=int, help="seasons counted back from the current one, planner.seasons by default")
+    arg_parser.add_argument("--hours", type=float, help="stop starting historic seasons once this time is used up")
+    args = arg_parser.parse_args()
+
+    config_file = "config.yaml"
+    config = Config(config_file).load_config()
+
+    # backend by database.backend, only its driver is imported
+    db = open_database(config)
+
+    scraper = None
+    try:
+        parser = Parser(APIConsumer(config), config)
+        # the plan reads the matches table, tables and columns added since the database was created come first
+        SchemaMigration(db, parser.api_consumer.archive, config).run()
+        planner = BackfillPlanner(db, config, parser)
+        items = planner.plan(competition_urls(config), args.seasons)
+        print(planner.describe(items))
+        if args.dry_run:
+            return
+        scraper = Scraper(parser, db, config)
+        planner.run(scraper, items, args.hours * 3600 if args.hours else None)
+    finally:
+        if scraper:
+            scraper.export_metrics()
+        db.con.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+def main():
+    from Scraper.registry import open_database
+    from Scraper.config import Config
+    from Scraper.export import ParquetExporter
+
+    config_file = "config.yaml"
+    config = Config(config_file).load_config()
+
+    # backend by database.backend, only its driver is imported
+    db = open_database(config)
+
+    try:
+        ParquetExporter(db, config["export"]["directory"]).export(config["export"]["tables"], config["export"].get("force", False))
+    finally:
+        db.con.close()
+
+if __name__ == "__main__":
+    main()
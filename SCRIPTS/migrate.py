@@ -0,0 +1,32 @@
+def main():
+    from Scraper.registry import open_database
+    from Scraper.config import Config
+    from Scraper.archive import PageArchive
+    from Scraper.migration import SchemaMigration
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Adds columns of new model fields to the tables and fills them from the page archive, offline.")
+    arg_parser.add_argument("--workers", type=int, help="parse processes, all cores by default")
+    arg_parser.add_argument("--reindex", action="store_true", help="rebuild the archive index from its segments first")
+    args = arg_parser.parse_args()
+
+    config_file = "config.yaml"
+    config = Config(config_file).load_config()
+    archive_config = config["api_consumer"].get("archive", {})
+    archive = PageArchive(archive_config.get("directory", "archive/fbref"), archive_config.get("segment_size_mb", 256),
+                          archive_config.get("codec", "zlib"))
+    if args.reindex:
+        archive.reindex()
+
+    # backend by database.backend, only its driver is imported
+    db = open_database(config)
+
+    try:
+        SchemaMigration(db, archive, config, workers=args.workers).run()
+    finally:
+        archive.close()
+        db.con.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+def main():
+    from Scraper.scraper import Scraper
+    from Scraper.registry import open_database
+    from Scraper.cli import competition_urls
+    from Scraper.config import Config
+    from Scraper.api_consumer import APIConsumer
+    from Scraper.parser import Parser
+    from Scraper.jobs import JobQueue, QueueWorker
+    from Scraper.migration import SchemaMigration
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Scrapes matches from the shared job queue, run one per process on as many hosts as needed.")
+    arg_parser.add_argument("--seed", action="store_true", help="queue the matches of all competitions first")
+    arg_parser.add_argument("--worker-id", help="hostname-pid-random by default")
+    arg_parser.add_argument("--max-jobs", type=int)
+    args = arg_parser.parse_args()
+
+    config_file = "config.yaml"
+    config = Config(config_file).load_config()
+    # workers behind one egress IP share the request budget of the website
+    workers_per_host = config.get("jobs", {}).get("workers_per_host", 1)
+    config["api_consumer"]["time_limit"] *= workers_per_host
+    config["api_consumer"]["sleep_time"] *= workers_per_host
+
+    # backend by database.backend, only its driver is imported
+    db = open_database(config)
+
+    scraper = Scraper(Parser(APIConsumer(config), config), db, config)
+    # tables, columns and indexes added since the database was created, never recreate_db under running workers
+    SchemaMigration(db, scraper.parser.api_consumer.archive, config).run()
+    worker = QueueWorker(scraper, JobQueue.from_config(db, config), config, worker_id=args.worker_id)
+    try:
+        if args.seed:
+            worker.seed(competition_urls(config))
+        worker.run(args.max_jobs)
+    finally:
+        scraper.export_metrics()
+        db.con.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+import sys
+sys.path.append('.')
+sys.path.append('./SCRIPTS')
\ No newline at end of file
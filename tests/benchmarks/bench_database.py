@@ -0,0 +1,109 @@
+"""
+Insert throughput benchmark on a sqlite file, using players stats parsed from the synthetic match pages
+in tests/fixtures/pages (see tests/benchmarks/README.md).
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_database [--matches 200] [--repeat 3]
+
+Compared write paths:
+- legacy: parser_tech, players stats and the match row committed separately (three commits per match),
+- transaction: the same three inserts committed once per match (serial mode),
+- batched: write_batch_size matches per transaction (pipeline and crawler modes),
+each with sqlite defaults and with the pragmas from config.yaml.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+from typing import List, Tuple
+from unittest.mock import MagicMock
+
+from tests.fixtures import match_pages
+from Scraper.config import Config
+from Scraper.logger import logger
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.models import Match, PlayerStats, ParserTech
+from Scraper.parser import Parser
+from Scraper.scraper import Scraper
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+
+Parsed = List[Tuple[Match, List[PlayerStats], List[ParserTech]]]
+
+
+def parsed_matches(config: dict, n: int) -> Parsed:
+    """ n matches with the players stats of the saved pages, under distinct match ids. """
+    parser = Parser(MagicMock(), config)
+    now = datetime.datetime.now()
+    pages = [parser.parse_players_stats(html, match_id, now) for match_id, html in match_pages().items()]
+    parsed = []
+    for i in range(n):
+        match_id = f"{i:08x}"
+        player_stats, parser_tech = pages[i % len(pages)]
+        parsed.append((
+            Match(date=now.date(), home="Home", score="1–0", away="Away", match_id=match_id, season="2023-2024",
+                  competition="Premier League"),
+            [p.model_copy(update={"match_id": match_id}) for p in player_stats],
+            [t.model_copy(update={"match_id": match_id}) for t in parser_tech],
+        ))
+    return parsed
+
+
+def write_legacy(db: BasicDatabase, parsed: Parsed, batch_size: int) -> None:
+    for match, player_stats, parser_tech in parsed:
+        db.insert_to_db(PARSER_TECH_TABLE_NAME, list(ParserTech.get_empty_dict().keys()),
+                        [tuple(i.model_dump().values()) for i in parser_tech])
+        db.insert_to_db(PLAYER_STATS_TABLE_NAME, list(PlayerStats.get_empty_dict().keys()),
+                        [tuple(i.model_dump().values()) for i in player_stats])
+        db.insert_to_db(MATCHES_TABLE_NAME, list(Match.get_empty_dict().keys()), [tuple(match.model_dump().values())])
+
+
+def write_transaction(db: BasicDatabase, parsed: Parsed, batch_size: int) -> None:
+    for item in parsed:
+        with db.transaction():
+            write_legacy(db, [item], batch_size)
+
+
+def write_batched(db: BasicDatabase, parsed: Parsed, batch_size: int) -> None:
+    scraper = Scraper(MagicMock(), db)
+    for i in range(0, len(parsed), batch_size):
+        scraper._insert_parsed_matches(parsed[i:i + batch_size])
+
+
+def _time_write(write, parsed: Parsed, pragmas: dict, batch_size: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            db = BasicDatabase(SQLiteDatabaseConnection(os.path.join(directory, "bench.db"), pragmas))
+            db.recreate_db()
+            start = time.perf_counter()
+            write(db, parsed, batch_size)
+            timings.append(time.perf_counter() - start)
+            db.con.close()
+    return min(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--matches", type=int, default=200)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+    # recreate_db logs on every run
+    logger.setLevel("WARNING")
+
+    config = Config("config.yaml").load_config()
+    parsed = parsed_matches(config, args.matches)
+    rows = sum(1 + len(stats) + len(tech) for _, stats, tech in parsed)
+    batch_size = config["scraper"].get("write_batch_size", 10)
+    baseline = None
+    for pragmas_name, pragmas in (("defaults", None), ("tuned", config["sqlite"]["pragmas"])):
+        for name, write in (("legacy", write_legacy), ("transaction", write_transaction), ("batched", write_batched)):
+            elapsed = _time_write(write, parsed, pragmas, batch_size, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{name:<12} pragmas={pragmas_name:<8} | {args.matches / elapsed:8.1f} matches/s | "
+                  f"{rows / elapsed:10.0f} rows/s | speedup x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Parser benchmark against the synthetic match pages in tests/fixtures/pages (see tests/benchmarks/README.md).
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_parser [--repeat 5]
+
+The extraction section builds soups once per page, so its timings cover player stats extraction only.
+The previous nested-scan extraction is kept below as the baseline. The engines section times whole
+get_players_stats calls (html tree building included) for every parser engine, with and without pre-slicing.
+The serialization section compares turning cell values into rows through models with the compiled schema.
+"""
+import argparse
+import copy
+import datetime
+import time
+from typing import List
+from unittest.mock import MagicMock
+
+from bs4 import BeautifulSoup
+
+from tests.fixtures import match_pages
+from Scraper.config import Config
+from Scraper.models import PlayerStats
+from Scraper.parser import Parser
+from Scraper.html_engine import PARSER_ENGINES
+from Scraper.records import RecordBatch, schema_for
+
+
+def legacy_get_players_stats(soup: BeautifulSoup, match_id: str, config: dict) -> List[PlayerStats]:
+    """ Extraction as it was before the single-pass index: rescans every table for every player. """
+    tables = soup.find_all("table")
+    summary_tables = []
+    tables_to_scrape = []
+    player_id_list = []
+    for t in tables:
+        t_id = t.get("id")
+        if t_id is not None:
+            for table_name in config["parser"]["tables_to_scrape"]:
+                if table_name in t_id:
+                    tables_to_scrape.append(t)
+                if t_id is not None and 'summary' in t_id:
+                    summary_tables.append(t)
+
+    player_stats_list = []
+    for table in summary_tables:
+        for tr in table.tbody.find_all("tr"):
+            p = PlayerStats.get_empty_dict()
+            p["match_id"] = match_id
+            p["team"] = table.caption.text.replace(" Player Stats Table", "")
+            p["player_id"] = tr.th.get("data-append-csv")
+            for tts in tables_to_scrape:
+                for tr in tts.tbody.find_all("tr"):
+                    if tr.th.get("data-append-csv") == p["player_id"]:
+                        for td in tr.find_all(["td", "th"]):
+                            data_stat = td.get("data-stat")
+                            for k in p.keys():
+                                if k == data_stat:
+                                    if td.text.strip() == '':
+                                        p[k] = None
+                                    else:
+                                        p[k] = td.text.strip()
+            if p['player_id'] not in player_id_list:
+                player_id_list.append(p['player_id'])
+                player_stats_list.append(PlayerStats(**p))
+    return player_stats_list
+
+
+class _SoupParser(Parser):
+    """ Parser serving pre-built soups, so html tree building stays out of the measurement. """
+    def __init__(self, soups: dict, config: dict):
+        api_consumer = MagicMock(last_api_call_data=datetime.datetime.now())
+        api_consumer.call.side_effect = lambda url: MagicMock(text=url.rstrip("/").split("/")[-1])
+        super().__init__(api_consumer, config)
+        self.soups = soups
+
+    def _get_soup(self, markup: str, **kwargs) -> BeautifulSoup:
+        return self.soups[markup]
+
+
+def _best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_extraction(config: dict, repeat: int):
+    soups = {match_id: BeautifulSoup(html, "html.parser") for match_id, html in match_pages().items()}
+    parser = _SoupParser(soups, config)
+
+    for match_id, soup in soups.items():
+        legacy = legacy_get_players_stats(soup, match_id, config)
+        current = parser.get_players_stats(match_id)
+        assert legacy == current, f"Extraction differs for match {match_id}"
+
+        legacy_time = _best_of(repeat, lambda: legacy_get_players_stats(soup, match_id, config))
+        current_time = _best_of(repeat, lambda: parser.get_players_stats(match_id))
+        print(f"match {match_id}: {len(current)} players | legacy {legacy_time * 1000:8.1f} ms | "
+              f"indexed {current_time * 1000:8.1f} ms | speedup x{legacy_time / current_time:.1f}")
+
+
+def bench_engines(config: dict, repeat: int):
+    pages = match_pages()
+    baseline = None
+    for name, engine in PARSER_ENGINES.items():
+        if not engine.is_available():
+            print(f"engine {name}: not installed")
+            continue
+        for pre_slice in (False, True):
+            engine_config = copy.deepcopy(config)
+            engine_config["parser"].update(engine=name, pre_slice=pre_slice)
+            api_consumer = MagicMock(last_api_call_data=datetime.datetime.now())
+            api_consumer.call.side_effect = lambda url: MagicMock(text=pages[url.rstrip("/").split("/")[-1]])
+            parser = Parser(api_consumer, engine_config)
+            elapsed = _best_of(repeat, lambda: [parser.get_players_stats(match_id) for match_id in pages])
+            per_page = elapsed / len(pages)
+            baseline = baseline or per_page
+            print(f"engine {name:<12} pre_slice={str(pre_slice):<5} | {per_page * 1000:8.1f} ms/page | "
+                  f"speedup x{baseline / per_page:.1f}")
+
+
+def bench_serialization(config: dict, repeat: int):
+    """ Raw cell values to insertable rows: validated models and model_dump versus compiled schema coercion. """
+    parser = Parser(None, config)
+    raw = []
+    for match_id, html in match_pages().items():
+        batch, _ = parser.parse_players_stats_batch(html, match_id, datetime.datetime.now())
+        raw += [{c: (None if v is None else str(v)) for c, v in zip(batch.columns, row)} for row in batch]
+    schema = schema_for(PlayerStats)
+    models_time = _best_of(repeat, lambda: [tuple(PlayerStats(**p).model_dump().values()) for p in raw])
+    batch_time = _best_of(repeat, lambda: RecordBatch(PlayerStats, schema.coerce_many(raw)))
+    print(f"serialization of {len(raw)} rows | models {models_time * 1000:8.1f} ms | "
+          f"record batch {batch_time * 1000:8.1f} ms | speedup x{models_time / batch_time:.1f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    config = Config("config.yaml").load_config()
+    bench_extraction(config, args.repeat)
+    bench_engines(config, args.repeat)
+    bench_serialization(config, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
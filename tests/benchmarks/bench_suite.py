@@ -0,0 +1,201 @@
+"""
+Offline benchmark of the scraping stages against the synthetic fbref pages in tests/fixtures/pages
+(see tests/benchmarks/README.md).
+
+Pages are served by the local stand-in server (tests/fixtures/server.py) and the rate limiter is unlimited,
+so the numbers are the cost of this code (http client included), not of the website. Run from the repository root:
+
+    python -m tests.benchmarks.bench_suite [--matches 100] [--repeat 3] [--output results.json] [--compare baseline.json]
+
+Stages:
+- get_matches: Parser.get_matches of the schedule page,
+- get_players_stats: Parser.get_players_stats of --matches match pages,
+- insert_to_db: BasicDatabase.insert_to_db of their players stats into a sqlite file,
+- check_matches_not_in_db: lookup of the whole schedule on a database holding --matches of its matches,
+- scrape_data: full Scraper.scrape_data run of --matches matches in the scraper mode of config.yaml.
+
+Every stage reports the best time of --repeat runs as pages/s and rows/s, and the peak of python allocations of
+one more run traced with tracemalloc (parse worker processes of the pipeline mode are not traced).
+--output saves the results as JSON, --compare prints the change of every metric against a saved file.
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional, Tuple
+
+from tests.fixtures.server import StandInServer, fbref_route
+from Scraper.api_consumer import APIConsumer
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.limiter import RateLimiter
+from Scraper.logger import logger
+from Scraper.models import PlayerStats
+from Scraper.parser import Parser
+from Scraper.records import RecordBatch
+from Scraper.scraper import Scraper
+from Scraper.constants import PLAYER_STATS_TABLE_NAME
+
+SCHEDULE_PATH = "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+# stage(setup result) -> (pages, rows), setup runs outside of the measurement
+Stage = Tuple[Callable[[], object], Callable[[object], Tuple[int, int]]]
+
+
+def offline_config(config: dict, server_url: str) -> dict:
+    """ config.yaml pointed at the stand-in server, without the response cache and the page archive. """
+    config = copy.deepcopy(config)
+    config["parser"]["base_url"] = server_url
+    config["api_consumer"]["cache"] = {"enabled": False}
+    config["api_consumer"]["archive"] = {"enabled": False}
+    return config
+
+
+def offline_parser(config: dict) -> Parser:
+    return Parser(APIConsumer(config, limiter=RateLimiter(rate=float("inf"))), config)
+
+
+def temp_database(directory: str, config: dict) -> BasicDatabase:
+    path = os.path.join(directory, f"bench_{time.perf_counter_ns()}.db")
+    db = BasicDatabase(SQLiteDatabaseConnection(path, config["sqlite"]["pragmas"]), config["database"]["write_mode"])
+    db.recreate_db()
+    return db
+
+
+def build_stages(config: dict, server_url: str, matches: int, directory: str) -> Dict[str, Stage]:
+    schedule_url = server_url + SCHEDULE_PATH
+    parser = offline_parser(config)
+    schedule = parser.get_matches(schedule_url)
+    match_ids = [m.match_id for m in schedule[:matches]]
+    player_stats = RecordBatch(PlayerStats)
+    for match_id in match_ids:
+        player_stats.extend(RecordBatch.from_models(PlayerStats, parser.get_players_stats(match_id)))
+
+    def get_matches(_) -> Tuple[int, int]:
+        return 1, len(parser.get_matches(schedule_url))
+
+    def get_players_stats(_) -> Tuple[int, int]:
+        return len(match_ids), sum(len(parser.get_players_stats(match_id)) for match_id in match_ids)
+
+    def insert_to_db(db: BasicDatabase) -> Tuple[int, int]:
+        db.insert_to_db(PLAYER_STATS_TABLE_NAME, player_stats.columns, player_stats)
+        return 0, len(player_stats)
+
+    def lookup_database() -> BasicDatabase:
+        db = temp_database(directory, config)
+        Scraper(parser, db)._insert_parsed_matches([(m, [], []) for m in schedule[:matches]])
+        # a new database object, so nothing is cached from the inserts
+        return BasicDatabase(db.database_connection, db.write_mode)
+
+    def check_matches_not_in_db(db: BasicDatabase) -> Tuple[int, int]:
+        db.check_matches_not_in_db(schedule)
+        return 0, len(schedule)
+
+    def scrape_data(db: BasicDatabase) -> Tuple[int, int]:
+        scraper = Scraper(offline_parser(config), db, config)
+        scraper.scrape_data(schedule_url, number_of_matches_to_scrape=matches)
+        return 1 + scraper.matches_added, scraper.matches_added + scraper.players_stats_added
+
+    return {
+        "get_matches": (lambda: None, get_matches),
+        "get_players_stats": (lambda: None, get_players_stats),
+        "insert_to_db": (lambda: temp_database(directory, config), insert_to_db),
+        "check_matches_not_in_db": (lookup_database, check_matches_not_in_db),
+        "scrape_data": (lambda: temp_database(directory, config), scrape_data),
+    }
+
+
+def run_stage(stage: Stage, repeat: int) -> Dict[str, float]:
+    setup, run = stage
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        pages, rows = run(state)
+        timings.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(timings)
+    return {
+        "seconds": round(seconds, 6),
+        "pages": pages,
+        "rows": rows,
+        "pages_per_sec": round(pages / seconds, 2),
+        "rows_per_sec": round(rows / seconds, 2),
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """ Prints every metric next to the baseline one, rates are better higher, seconds and memory lower. """
+    print(f"\ncompared with {baseline['version']} ({baseline['timestamp']})")
+    for name, metrics in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            print(f"{name:<24} | not in baseline")
+            continue
+        changes = []
+        for metric in ("pages_per_sec", "rows_per_sec", "peak_memory_mb"):
+            if before.get(metric):
+                changes.append(f"{metric} {(metrics[metric] / before[metric] - 1) * 100:+6.1f}%")
+        print(f"{name:<24} | " + " | ".join(changes))
+
+
+def main(argv: Optional[list] = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--matches", type=int, default=100)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--output", help="save results to a JSON file")
+    arg_parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    args = arg_parser.parse_args(argv)
+    # recreate_db and scrape_data log on every run
+    logger.setLevel("WARNING")
+
+    with StandInServer(fbref_route()) as server, tempfile.TemporaryDirectory() as directory:
+        config = offline_config(Config("config.yaml").load_config(), server.url)
+        stages = build_stages(config, server.url, args.matches, directory)
+        results = {
+            "version": _version(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "matches": args.matches,
+            "repeat": args.repeat,
+            "scraper_mode": config["scraper"].get("mode", "serial"),
+            "stages": {},
+        }
+        for name, stage in stages.items():
+            metrics = results["stages"][name] = run_stage(stage, args.repeat)
+            print(f"{name:<24} | {metrics['seconds'] * 1000:9.1f} ms | {metrics['pages_per_sec']:8.1f} pages/s | "
+                  f"{metrics['rows_per_sec']:10.0f} rows/s | peak {metrics['peak_memory_mb']:7.1f} MB")
+    # kilobytes on linux
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import gzip
+import os
+import sys
+sys.path.append('.')
+sys.path.append('./SCRIPTS')
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+SCHEDULE_PAGE = "schedule_premier_league.html"
+
+
+def load_page(name: str) -> str:
+    """ Returns decoded html of a saved page, e.g. load_page("schedule_premier_league.html"). """
+    with gzip.open(os.path.join(PAGES_DIR, name + ".gz"), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def match_pages() -> dict:
+    """ Saved match report pages keyed by match_id. """
+    pages = {}
+    for file_name in sorted(os.listdir(PAGES_DIR)):
+        if file_name.startswith("match_"):
+            name = file_name[:-len(".gz")]
+            pages[name[len("match_"):-len(".html")]] = load_page(name)
+    return pages
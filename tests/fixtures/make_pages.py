@@ -0,0 +1,270 @@
+"""
+Builds the synthetic fbref pages used by offline tests and benchmarks. They are not recorded from fbref.
+
+Pages mirror the markup of fbref "Scores & Fixtures" and "Match Report" pages
+(table ids, data-stat names, captions, commented-out tables, page chrome) with
+deterministic synthetic values, so the corpus can be rebuilt byte for byte:
+
+    python tests/fixtures/make_pages.py
+"""
+import gzip
+import os
+import random
+import datetime
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+COMMON_COLS = ["player", "shirtnumber", "nationality", "position", "age", "minutes"]
+TABLE_COLS = {
+    "summary": ["goals", "assists", "pens_made", "pens_att", "shots", "shots_on_target", "cards_yellow",
+                "cards_red", "touches", "tackles", "interceptions", "blocks", "xg", "npxg", "xg_assist", "sca",
+                "gca", "passes_completed", "passes", "passes_pct", "progressive_passes", "carries",
+                "progressive_carries", "take_ons", "take_ons_won"],
+    "passing": ["passes_completed", "passes", "passes_pct", "passes_total_distance", "passes_progressive_distance",
+                "passes_completed_short", "passes_short", "passes_pct_short", "passes_completed_medium",
+                "passes_medium", "passes_pct_medium", "passes_completed_long", "passes_long", "passes_pct_long",
+                "assists", "xg_assist", "pass_xa", "assisted_shots", "passes_into_final_third",
+                "passes_into_penalty_area", "crosses_into_penalty_area", "progressive_passes"],
+    "passing_types": ["passes", "passes_live", "passes_dead", "passes_free_kicks", "through_balls", "passes_switches",
+                      "crosses", "throw_ins", "corner_kicks", "corner_kicks_in", "corner_kicks_out",
+                      "corner_kicks_straight", "passes_completed", "passes_offsides", "passes_blocked"],
+    "defense": ["tackles", "tackles_won", "tackles_def_3rd", "tackles_mid_3rd", "tackles_att_3rd",
+                "challenge_tackles", "challenges", "challenge_tackles_pct", "challenges_lost", "blocks",
+                "blocked_shots", "blocked_passes", "interceptions", "tackles_interceptions", "clearances", "errors"],
+    "possession": ["touches", "touches_def_pen_area", "touches_def_3rd", "touches_mid_3rd", "touches_att_3rd",
+                   "touches_att_pen_area", "touches_live_ball", "take_ons", "take_ons_won", "take_ons_won_pct",
+                   "take_ons_tackled", "take_ons_tackled_pct", "carries", "carries_distance",
+                   "carries_progressive_distance", "progressive_carries", "carries_into_final_third",
+                   "carries_into_penalty_area", "miscontrols", "dispossessed", "passes_received",
+                   "progressive_passes_received"],
+    "misc": ["cards_yellow", "cards_red", "cards_yellow_red", "fouls", "fouled", "offsides", "crosses",
+             "interceptions", "tackles_won", "pens_won", "pens_conceded", "own_goals", "ball_recoveries",
+             "aerials_won", "aerials_lost", "aerials_won_pct"],
+}
+TABLE_CAPTIONS = {
+    "summary": "Player Stats Table",
+    "passing": "Passing Table",
+    "passing_types": "Pass Types Table",
+    "defense": "Defensive Actions Table",
+    "possession": "Possession Table",
+    "misc": "Miscellaneous Stats Table",
+}
+FLOAT_COLS = {"xg", "npxg", "xg_assist", "pass_xa"}
+PCT_COLS = {c for cols in TABLE_COLS.values() for c in cols if c.endswith("_pct") or "_pct_" in c}
+TEAMS = ["Burnley", "Manchester City", "Arsenal", "Nott'ham Forest", "Bournemouth", "West Ham", "Brighton",
+         "Luton Town", "Everton", "Fulham", "Sheffield Utd", "Crystal Palace", "Newcastle Utd", "Aston Villa",
+         "Brentford", "Tottenham", "Chelsea", "Liverpool", "Manchester Utd", "Wolves"]
+POSITIONS = ["GK", "CB", "CB", "LB", "RB", "DM", "CM", "CM", "LW", "RW", "FW"]
+NATIONS = [("eng", "ENG", "England"), ("fr", "FRA", "France"), ("es", "ESP", "Spain"), ("br", "BRA", "Brazil"),
+           ("de", "GER", "Germany"), ("pt", "POR", "Portugal"), ("nl", "NED", "Netherlands")]
+FIRST = ["Erling", "Kevin", "Phil", "Bernardo", "Rodri", "Jack", "Kyle", "John", "Ruben", "Nathan", "Lyle",
+         "Josko", "Julian", "Jeremy", "Zeki", "Jordan", "Sander", "Josh", "Vitinho", "Charlie", "Luca", "Aaron"]
+LAST = ["Haaland", "De Bruyne", "Foden", "Silva", "Grealish", "Walker", "Stones", "Dias", "Ake", "Foster",
+        "Gvardiol", "Alvarez", "Doku", "Sarmiento", "Amdouni", "Beyer", "Berge", "Brownhill", "Taylor", "Ramsey"]
+
+
+def _hex_id(rnd: random.Random) -> str:
+    return "%08x" % rnd.getrandbits(32)
+
+
+def _chrome(rnd: random.Random, n: int) -> str:
+    """ Navigation menus, ads and scripts that surround the stats on every fbref page. """
+    links = "".join(
+        f'<li><a href="/en/comps/{rnd.randint(1, 900)}/history/Competition-{i}-Seasons">Competition {i}</a></li>'
+        for i in range(n))
+    script = "var sr_goog = {" + ",".join(f'"k{i}":"{_hex_id(rnd)}"' for i in range(n)) + "};"
+    return (f'<div id="header" role="banner"><div id="header_top"><nav id="nav"><ul class="menu">{links}</ul>'
+            f'</nav></div><script>{script}</script><div class="adblock"></div></div>')
+
+
+def _player_cells(rnd: random.Random, cols: list, player: dict, minutes: int) -> str:
+    cells = []
+    for c in cols:
+        if c == "player":
+            continue
+        if c == "shirtnumber":
+            val = str(player["shirt"])
+        elif c == "nationality":
+            f, code, name = player["nation"]
+            val = (f'<a href="/en/country/{code}/{name}-Football"><span style="white-space: nowrap">'
+                   f'<span class="f-i f-{f}" style="">{f}</span> {code}</span></a>')
+        elif c == "position":
+            val = player["position"]
+        elif c == "age":
+            val = player["age"]
+        elif c == "minutes":
+            val = str(minutes)
+        elif c in FLOAT_COLS:
+            val = "%.1f" % (rnd.random() * 1.2)
+        elif c in PCT_COLS:
+            val = "" if rnd.random() < 0.1 else "%.1f" % (rnd.random() * 100)
+        elif c.endswith("distance"):
+            val = str(rnd.randint(0, 900))
+        else:
+            val = str(rnd.randint(0, 12))
+        cls = "left " if c in ("nationality", "position") else "center " if c in ("shirtnumber", "age") else "right "
+        cells.append(f'<td class="{cls}" data-stat="{c}" >{val}</td>')
+    return "".join(cells)
+
+
+def _team_table(rnd: random.Random, team: str, team_id: str, kind: str, players: list) -> str:
+    cols = COMMON_COLS + TABLE_COLS[kind]
+    head = "".join(f'<th aria-label="{c}" data-stat="{c}" scope="col" class=" poptip" data-tip="{c}">{c}</th>'
+                   for c in cols)
+    rows = []
+    for p in players:
+        name = ("&nbsp;&nbsp;&nbsp;" if p["sub"] else "") + p["name"]
+        th = (f'<th scope="row" class="left " data-append-csv="{p["id"]}" data-stat="player" csk="{p["name"]}">'
+              f'<a href="/en/players/{p["id"]}/{p["name"].replace(" ", "-")}">{name}</a></th>')
+        rows.append(f'<tr >{th}{_player_cells(rnd, cols, p, p["minutes"])}</tr>')
+    foot = ('<tr ><th scope="row" class="left " data-stat="player" >' + f'{len(players)} Players</th>'
+            + "".join(f'<td class="right " data-stat="{c}" >{rnd.randint(0, 300)}</td>' for c in cols[1:]) + '</tr>')
+    return (f'<div class="table_container tabbed" id="div_stats_{team_id}_{kind}">'
+            f'<table class="stats_table sortable min_width" id="stats_{team_id}_{kind}" data-cols-to-freeze=",1">'
+            f'<caption>{team} {TABLE_CAPTIONS[kind]}</caption>'
+            f'<colgroup>{"<col>" * len(cols)}</colgroup>'
+            f'<thead><tr class="over_header"><th aria-label="" data-stat="" colspan="6" class=" over_header center" ></th>'
+            f'<th aria-label="" data-stat="header_performance" colspan="{len(cols) - 6}" class=" over_header center" >'
+            f'Performance</th></tr><tr>{head}</tr></thead>'
+            f'<tbody>{"".join(rows)}</tbody><tfoot>{foot}</tfoot></table></div>')
+
+
+def _keeper_table(rnd: random.Random, team: str, team_id: str, keeper: dict) -> str:
+    cols = ["player", "nationality", "age", "minutes", "gk_shots_on_target_against", "gk_goals_against",
+            "gk_saves", "gk_save_pct", "gk_psxg"]
+    return (f'<div class="table_container" id="div_keeper_stats_{team_id}">'
+            f'<table class="stats_table sortable min_width" id="keeper_stats_{team_id}">'
+            f'<caption>{team} Goalkeeper Stats Table</caption><tbody><tr >'
+            f'<th scope="row" class="left " data-append-csv="{keeper["id"]}" data-stat="player" >'
+            f'<a href="/en/players/{keeper["id"]}/x">{keeper["name"]}</a></th>'
+            f'{_player_cells(rnd, cols, keeper, 90)}</tr></tbody></table></div>')
+
+
+def _shots_table(rnd: random.Random, teams: list) -> str:
+    rows = "".join(
+        f'<tr ><th scope="row" class="left " data-stat="minute" >{rnd.randint(1, 90)}</th>'
+        f'<td class="left " data-stat="player" ><a href="/en/players/{_hex_id(rnd)}/x">{rnd.choice(LAST)}</a></td>'
+        f'<td class="left " data-stat="team" >{rnd.choice(teams)}</td>'
+        f'<td class="right " data-stat="xg_shot" >{rnd.random():.2f}</td>'
+        f'<td class="left " data-stat="outcome" >{rnd.choice(["Saved", "Off Target", "Blocked", "Goal"])}</td></tr>'
+        for _ in range(28))
+    # fbref ships most secondary tables inside HTML comments and renders them client side
+    return ('<div id="all_shots" class="table_wrapper tabbed"><div class="section_heading"><h2>Shots</h2></div>'
+            '<div class="placeholder"></div>\n<!--\n'
+            '<div class="table_container" id="div_shots_all"><table class="stats_table" id="shots_all">'
+            f'<caption>Shots Table</caption><tbody>{rows}</tbody></table></div>\n-->\n</div>')
+
+
+def _squad(rnd: random.Random) -> list:
+    players = []
+    for i, pos in enumerate(POSITIONS + ["FW", "CM", "LB", "RW", "DM"]):
+        sub = i >= len(POSITIONS)
+        minutes = rnd.randint(1, 30) if sub else (90 if i < 7 else rnd.randint(60, 90))
+        players.append({
+            "id": _hex_id(rnd),
+            "name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)}",
+            "shirt": rnd.randint(1, 99),
+            "nation": rnd.choice(NATIONS),
+            "position": pos,
+            "age": f"{rnd.randint(18, 36)}-{rnd.randint(0, 364):03d}",
+            "minutes": minutes,
+            "sub": sub,
+        })
+    return players
+
+
+def match_page(seed: int, match_id: str) -> str:
+    rnd = random.Random(seed)
+    home, away = rnd.sample(TEAMS, 2)
+    sections = []
+    keepers = []
+    for team in (home, away):
+        team_id = _hex_id(rnd)
+        players = _squad(rnd)
+        keepers.append((team, team_id, players[0]))
+        tables = "".join(_team_table(rnd, team, team_id, kind, players) for kind in TABLE_COLS)
+        sections.append(f'<div class="table_wrapper tabbed" id="all_player_stats_{team_id}">'
+                        f'<div class="section_heading"><h2>{team} Player Stats</h2></div>{tables}</div>')
+    keeper_tables = "".join(_keeper_table(rnd, *k) for k in keepers)
+    return (f'<!DOCTYPE html><html data-version="klecko-" lang="en" class="no-js"><head>'
+            f'<meta charset="utf-8"><title>{home} vs. {away} Match Report | FBref.com</title>'
+            f'<link rel="stylesheet" href="https://cdn.ssref.net/req/202310101/css/fb/fb.min.css">'
+            f'<script>{"window.sr_data=" + repr([_hex_id(rnd) for _ in range(400)])}</script></head>'
+            f'<body class="fb"><div id="wrap">{_chrome(rnd, 300)}'
+            f'<div id="content" role="main" class="box"><h1>{home} vs. {away} Match Report</h1>'
+            f'<div class="scorebox"><div><strong><a href="/en/squads/{_hex_id(rnd)}/">{home}</a></strong>'
+            f'<div class="score">{rnd.randint(0, 4)}</div></div><div><strong>{away}</strong>'
+            f'<div class="score">{rnd.randint(0, 4)}</div></div></div>'
+            f'<div id="events_wrap">{"".join(f"<div class=event><div>{m}&rsquo;</div></div>" for m in range(30))}</div>'
+            f'{"".join(sections)}'
+            f'<div id="all_keeper_stats" class="table_wrapper">{keeper_tables}</div>'
+            f'{_shots_table(rnd, [home, away])}'
+            f'</div><div id="footer">{_chrome(rnd, 120)}</div></div></body></html>')
+
+
+def schedule_page(seed: int, match_ids: list, played: int, competition: str = "Premier League") -> str:
+    """ Full league schedule; rows after ``played`` have no score and no match report yet. """
+    rnd = random.Random(seed)
+    rows = []
+    day = datetime.date(2023, 8, 11)
+    for i, match_id in enumerate(match_ids):
+        if i and i % 10 == 0:
+            day += datetime.timedelta(days=7)
+            rows.append('<tr class="spacer partial_table result_all" ><td colspan="14"></td></tr>')
+        if i and i % 100 == 0:
+            rows.append('<tr class="thead" ><th data-stat="gameweek">Wk</th><td data-stat="date">Date</td></tr>')
+        home, away = rnd.sample(TEAMS, 2)
+        if i < played:
+            score = f'<a href="/en/matches/{match_id}/{home}-{away}">{rnd.randint(0, 4)}&ndash;{rnd.randint(0, 4)}</a>'
+            report = f'<a href="/en/matches/{match_id}/{home.replace(" ", "-")}-{away.replace(" ", "-")}">Match Report</a>'
+        else:
+            score = ""
+            report = f'<a href="/en/stathead/matchup/teams/{_hex_id(rnd)}/{_hex_id(rnd)}">Head-to-Head</a>'
+        rows.append(
+            f'<tr ><th scope="row" class="right " data-stat="gameweek" >{i // 10 + 1}</th>'
+            f'<td class="left " data-stat="dayofweek" >Sat</td>'
+            f'<td class="left " data-stat="date" csk="{day:%Y%m%d}"><a href="/en/matches/{day}">{day}</a></td>'
+            f'<td class="right " data-stat="start_time" >15:00</td>'
+            f'<td class="right " data-stat="home_team" ><a href="/en/squads/{_hex_id(rnd)}/{home}">{home}</a></td>'
+            f'<td class="right " data-stat="home_xg" >{rnd.random() * 3:.1f}</td>'
+            f'<td class="center " data-stat="score" >{score}</td>'
+            f'<td class="right " data-stat="away_xg" >{rnd.random() * 3:.1f}</td>'
+            f'<td class="left " data-stat="away_team" ><a href="/en/squads/{_hex_id(rnd)}/{away}">{away}</a></td>'
+            f'<td class="right " data-stat="attendance" >{rnd.randint(10000, 75000):,}</td>'
+            f'<td class="left " data-stat="venue" >Stadium</td>'
+            f'<td class="left " data-stat="referee" >Referee</td>'
+            f'<td class="left " data-stat="match_report" >{report}</td>'
+            f'<td class="left iz" data-stat="notes" ></td></tr>')
+    table = (f'<div class="table_wrapper tabbed" id="all_sched"><div class="section_heading"><h2>Scores &amp; Fixtures</h2>'
+             f'</div><div class="table_container" id="div_sched_2023-2024_9_1">'
+             f'<table class="stats_table sortable min_width" id="sched_2023-2024_9_1">'
+             f'<caption>Scores &amp; Fixtures Table</caption><thead><tr><th data-stat="gameweek">Wk</th></tr></thead>'
+             f'<tbody>{"".join(rows)}</tbody></table></div></div>')
+    return (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+            f'<title>2023-2024 {competition} Scores &amp; Fixtures | FBref.com</title></head>'
+            f'<body class="fb"><div id="wrap">{_chrome(rnd, 300)}<div id="info"><div id="meta"><div>'
+            f'<h1>\n\t\t\t2023-2024 {competition} Scores &amp; Fixtures\n\t\t</h1>'
+            f'<p><strong>Governing Country:</strong> England</p></div></div></div>'
+            f'<div id="content" role="main" class="box">{table}'
+            f'<div id="all_sched_summary" class="table_wrapper"><div class="placeholder"></div>\n<!--\n'
+            f'<table id="sched_summary"><tbody><tr><td>hidden</td></tr></tbody></table>\n-->\n</div>'
+            f'</div><div id="footer">{_chrome(rnd, 120)}</div></div></body></html>')
+
+
+def main():
+    os.makedirs(PAGES_DIR, exist_ok=True)
+    rnd = random.Random(2023)
+    match_ids = [_hex_id(rnd) for _ in range(380)]
+    pages = {"schedule_premier_league.html": schedule_page(1, match_ids, played=120)}
+    rnd = random.Random(2024)
+    pages["schedule_la_liga.html"] = schedule_page(2, [_hex_id(rnd) for _ in range(380)], played=90, competition="La Liga")
+    for seed, match_id in enumerate(match_ids[:3], start=10):
+        pages[f"match_{match_id}.html"] = match_page(seed, match_id)
+    for name, text in pages.items():
+        # mtime=0 keeps the gzip output reproducible
+        with open(os.path.join(PAGES_DIR, name + ".gz"), "wb") as f:
+            f.write(gzip.compress(text.encode("utf-8"), mtime=0))
+
+
+if __name__ == "__main__":
+    main()
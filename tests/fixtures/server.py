@@ -0,0 +1,104 @@
+import gzip
+import sys
+import time
+import zlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from tests.fixtures import load_page, match_pages
+
+# route(path, request_headers) -> (status, headers, body)
+Route = Callable[[str, Dict[str, str]], Tuple[int, Dict[str, str], bytes]]
+
+
+SCHEDULE_PATHS = {
+    "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures": "schedule_premier_league.html",
+    "/en/comps/12/schedule/La-Liga-Scores-and-Fixtures": "schedule_la_liga.html",
+}
+
+
+def fbref_route(schedule_paths: Optional[Dict[str, str]] = None, failing: Iterable[str] = (), delay: float = 0.0) -> Route:
+    """
+    Serves saved pages like fbref does: schedule pages by path and every /en/matches/<match_id> page
+    by one of the saved match reports (chosen by match_id, so a match always gets the same page).
+    Paths containing any of failing get a 500, delay slows down every response.
+    """
+    schedules = {path: load_page(name).encode("utf-8") for path, name in (schedule_paths or SCHEDULE_PATHS).items()}
+    matches = [html.encode("utf-8") for html in match_pages().values()]
+    failing = list(failing)
+
+    def route(path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        if delay:
+            time.sleep(delay)
+        if any(f in path for f in failing):
+            return 500, {}, b"Internal Server Error"
+        html_headers = {"Content-Type": "text/html; charset=utf-8"}
+        if path in schedules:
+            return 200, html_headers, schedules[path]
+        if path.startswith("/en/matches/"):
+            match_id = path[len("/en/matches/"):].split("/")[0]
+            return 200, html_headers, matches[zlib.crc32(match_id.encode()) % len(matches)]
+        return 404, {}, b"Not Found"
+    return route
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, like fbref
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+        status, headers, body = server.route(self.path, dict(self.headers))
+        if body and "gzip" in self.headers.get("Accept-Encoding", "") and "Content-Encoding" not in headers:
+            body = gzip.compress(body)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping pooled keep-alive connections are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInServer:
+    """
+    Local HTTP server standing in for fbref.com in tests.
+
+        with StandInServer(route) as server:
+            requests.get(server.url + "/en/matches/123")
+    """
+    def __init__(self, route: Route):
+        self.httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.httpd.route = route
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> list:
+        """ Paths requested so far. """
+        return self.httpd.requests
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,78 @@
+import pytest
+import datetime
+from Scraper.aggregates import AggregateStore
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.models import Match, PlayerStats
+from Scraper.records import RecordBatch
+from Scraper.constants import (MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PLAYER_SEASON_STATS_TABLE_NAME,
+                               TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME)
+
+def insert_matches(db: BasicDatabase, competition: str, season: str, days: range) -> list:
+    """ Matches A-B, player p1 moves from A to B in the third match, p2 has no minutes. """
+    matches, players = [], []
+    for day in days:
+        match_id = f"{competition[:2]}{season[:4]}{day}"
+        matches.append(Match(date=datetime.date(int(season[:4]), 9, day), home="A", score="1–0", away="B",
+                             match_id=match_id, season=season, competition=competition))
+        players += [
+            PlayerStats(match_id=match_id, team="A" if day < 3 else "B", player="one", player_id="p1", minutes=90,
+                        goals=day % 2, xg=0.3, xg_assist=0.1, sca=2, progressive_passes=5),
+            PlayerStats(match_id=match_id, team="A", player="two", player_id="p2", minutes=None, goals=None),
+            PlayerStats(match_id=match_id, team="B", player="three", player_id="p3", minutes=45, goals=1, xg=0.7),
+        ]
+    for table, model, rows in [(PLAYER_STATS_TABLE_NAME, PlayerStats, players), (MATCHES_TABLE_NAME, Match, matches)]:
+        batch = RecordBatch.from_models(model, rows)
+        db.insert_to_db(table, batch.columns, batch)
+    return [m.match_id for m in matches]
+
+@pytest.fixture
+def sqlite_db():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return db
+
+def test_season_totals_and_per90(sqlite_db):
+    aggregates = AggregateStore(sqlite_db)
+    assert aggregates.update(insert_matches(sqlite_db, "Premier League", "2023-2024", range(1, 5))) == 4
+    players = {p.player_id: p for p in aggregates.player_season("Premier League", "2023-2024")}
+    assert players["p1"].matches == 4 and players["p1"].minutes == 360 and players["p1"].goals == 2
+    assert players["p1"].xg == pytest.approx(1.2)
+    assert players["p1"].goals_per90 == pytest.approx(0.5)
+    assert players["p1"].progressive_passes_per90 == pytest.approx(5)
+    # team of the latest match
+    assert players["p1"].team == "B" and players["p1"].last_match_date == datetime.date(2023, 9, 4)
+    assert players["p2"].minutes == 0 and players["p2"].goals_per90 is None
+    assert players["p3"].goals_per90 == pytest.approx(2)
+
+    teams = {t.team: t for t in aggregates.team_season("Premier League", "2023-2024")}
+    assert teams["A"].matches == 4 and teams["B"].matches == 4
+    assert teams["B"].goals == 4 + 1
+    team_match = {t.team: t for t in aggregates.team_match("Pr20233")}
+    assert team_match["A"].players == 1 and team_match["B"].players == 2 and team_match["B"].goals == 2
+
+def test_incremental_update_matches_full_recompute(sqlite_db):
+    aggregates = AggregateStore(sqlite_db)
+    aggregates.update(insert_matches(sqlite_db, "Premier League", "2023-2024", range(3, 6)))
+    # older matches added later, a new season and matches aggregated twice
+    aggregates.update(insert_matches(sqlite_db, "Premier League", "2023-2024", range(1, 3)))
+    new = insert_matches(sqlite_db, "La Liga", "2023-2024", range(1, 3))
+    assert aggregates.update(new + new) == 2
+    assert aggregates.update(new) == 0
+    assert aggregates.validate() == []
+    stored = {t: sqlite_db.get_custom_query(f"SELECT COUNT(*) FROM {t}")[0][0]
+              for t in (PLAYER_SEASON_STATS_TABLE_NAME, TEAM_MATCH_STATS_TABLE_NAME, TEAM_SEASON_STATS_TABLE_NAME)}
+    assert stored == {PLAYER_SEASON_STATS_TABLE_NAME: 6, TEAM_MATCH_STATS_TABLE_NAME: 14, TEAM_SEASON_STATS_TABLE_NAME: 4}
+    players = {p.player_id: p for p in aggregates.player_season("Premier League", "2023-2024")}
+    assert players["p1"].matches == 5 and players["p1"].team == "B"
+
+def test_validate_finds_stale_rows_and_rebuild_fixes_them(sqlite_db):
+    aggregates = AggregateStore(sqlite_db)
+    aggregates.update(insert_matches(sqlite_db, "Premier League", "2023-2024", range(1, 3)))
+    # re-scraped stats of an aggregated match
+    sqlite_db.execute(f"UPDATE {PLAYER_STATS_TABLE_NAME} SET goals = 3 WHERE player_id = 'p3'")
+    differences = aggregates.validate()
+    assert (PLAYER_SEASON_STATS_TABLE_NAME, ("Premier League", "2023-2024", "p3")) in differences
+    assert (TEAM_SEASON_STATS_TABLE_NAME, ("Premier League", "2023-2024", "B")) in differences
+    aggregates.rebuild()
+    assert aggregates.validate() == []
+    assert {p.player_id: p.goals for p in aggregates.player_season("Premier League", "2023-2024")}["p3"] == 6
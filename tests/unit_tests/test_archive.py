@@ -0,0 +1,85 @@
+import os
+import datetime
+import pytest
+from Scraper.archive import PageArchive
+from Scraper.api_consumer import APIConsumer
+from Scraper.limiter import RateLimiter
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.migration import SchemaMigration
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+from tests.fixtures.server import StandInServer
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+FETCHED_AT = datetime.datetime(2023, 11, 18, 12, 0)
+
+def test_archive_is_append_only_and_reindexable(tmp_path):
+    archive = PageArchive(str(tmp_path), segment_size_mb=0.001)
+    archive.put("https://fbref.com/en/matches/a1", "<html>old</html>", FETCHED_AT)
+    archive.put(SCHEDULE_URL, "<html>schedule</html>", FETCHED_AT)
+    # incompressible, larger than a segment
+    archive.put("https://fbref.com/en/matches/a1", "<html>new" + os.urandom(2000).hex() + "</html>", FETCHED_AT)
+    assert archive.get_match("a1").startswith("<html>new") and archive.get(SCHEDULE_URL) == "<html>schedule</html>"
+    assert len(archive) == 2 and [p.match_id for p in archive.pages(matches=True)] == ["a1"]
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".bin")) == ["segment_00001.bin", "segment_00002.bin"]
+
+    archive.con.execute("DELETE FROM pages")
+    assert archive.reindex() == 2 and archive.get_match("a1").startswith("<html>new")
+    archive.close()
+
+def test_partial_record_is_dropped_on_open(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.put(SCHEDULE_URL, "<html>schedule</html>", FETCHED_AT)
+    archive.close()
+    segment = tmp_path / "segment_00001.bin"
+    size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(b"FDAP\x01\x10")
+    archive = PageArchive(str(tmp_path))
+    assert segment.stat().st_size == size and len(archive) == 1
+    archive.put("https://fbref.com/en/matches/a1", "<html>match</html>", FETCHED_AT)
+    assert archive.get_match("a1") == "<html>match</html>"
+
+def test_fetched_pages_are_archived(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    config = {"api_consumer": {"requests_limit": 1, "sleep_time": 0, "time_limit": 0, "transport": {"retries": 0}}}
+    api_consumer = APIConsumer(config, limiter=RateLimiter(rate=1000, capacity=100), archive=archive)
+    with StandInServer(lambda path, headers: (200, {"Content-Type": "text/html; charset=utf-8"}, path.encode())) as server:
+        api_consumer.call(server.url + "/en/matches/a1")
+        api_consumer.call(server.url + "/en/matches/a1")
+    assert archive.get_match("a1") == "/en/matches/a1"
+    # every response is kept, the index points to the latest
+    assert os.path.getsize(tmp_path / "segment_00001.bin") == 2 * archive.pages()[0].location[2]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_migration_backfills_new_columns_from_archive(tmp_path, workers: int):
+    config = Config('config.yaml').load_config()
+    parser = Parser(None, config)
+    archive = PageArchive(str(tmp_path / "archive"))
+    archive.put(SCHEDULE_URL, load_page(SCHEDULE_PAGE), FETCHED_AT)
+    db = BasicDatabase(SQLiteDatabaseConnection(str(tmp_path / "db.sqlite")))
+    db.recreate_db()
+    expected = []
+    for match_id, html in match_pages().items():
+        archive.put(parser.match_url(match_id), html, FETCHED_AT)
+        batch, _ = parser.parse_players_stats_batch(html, match_id, FETCHED_AT)
+        db.insert_to_db(PLAYER_STATS_TABLE_NAME, batch.columns, batch)
+        expected += [(m, p, t) for m, p, t in zip(batch.column("match_id"), batch.column("player_id"), batch.column("touches"))]
+    matches, _ = parser.parse_matches(load_page(SCHEDULE_PAGE), SCHEDULE_URL, FETCHED_AT)
+    db.insert_to_db(MATCHES_TABLE_NAME, ["match_id", "date", "home", "score", "away", "season", "competition"],
+                    [(m.match_id, m.date, m.home, m.score, m.away, m.season, m.competition) for m in matches])
+    # tables created before touches and round were added to the models
+    db.execute(f"ALTER TABLE {PLAYER_STATS_TABLE_NAME} DROP COLUMN touches")
+    db.execute(f"ALTER TABLE {MATCHES_TABLE_NAME} DROP COLUMN round")
+
+    migration = SchemaMigration(db, archive, config, workers=workers)
+    assert migration.missing_columns() == {MATCHES_TABLE_NAME: ["round"], PLAYER_STATS_TABLE_NAME: ["touches"]}
+    updated = migration.run()
+    assert updated == {PLAYER_STATS_TABLE_NAME: len(expected), MATCHES_TABLE_NAME: len(matches)}
+    assert migration.missing_columns() == {}
+    rows = db.get_custom_query(f"SELECT match_id, player_id, touches FROM {PLAYER_STATS_TABLE_NAME}")
+    assert sorted(rows) == sorted(expected) and any(t for _, _, t in rows)
+    rounds = dict(db.get_custom_query(f"SELECT match_id, round FROM {MATCHES_TABLE_NAME}"))
+    assert rounds == {m.match_id: m.round for m in matches}
@@ -0,0 +1,60 @@
+import datetime
+from unittest.mock import MagicMock
+from Scraper.audit import AuditCompaction
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.models import ParserTech
+from Scraper.records import RecordBatch
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import PARSER_TECH_TABLE_NAME, MATCH_PARSE_TYPE, PLAYER_PARSE_TYPE
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+NOW = datetime.datetime(2024, 6, 1)
+
+def make_db() -> BasicDatabase:
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return db
+
+def test_compact_audit_of_a_scrape():
+    config = Config('config.yaml').load_config()
+    config["parser"]["audit"] = "compact"
+    config["scraper"] = {"mode": "pipeline", "parse_workers": 1, "write_batch_size": 2}
+    pages = list(match_pages().values())
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = lambda url: MagicMock(
+        text=load_page(SCHEDULE_PAGE) if url == SCHEDULE_URL else pages[len(url) % len(pages)])
+    db = make_db()
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=3)
+
+    rows = db.get_custom_query(f"SELECT match_id, url, parse_type, row_count, error_count, status FROM {PARSER_TECH_TABLE_NAME}")
+    # a summary per fetched page, no rows of valid records
+    assert len(rows) == 4 and all(row_count for _, _, _, row_count, _, _ in rows)
+    schedule = [r for r in rows if r[2] == MATCH_PARSE_TYPE]
+    assert schedule == [(None, SCHEDULE_URL, MATCH_PARSE_TYPE, scraper.parser.match_processed, 0, "ok")]
+    assert {r[3] for r in rows if r[2] == PLAYER_PARSE_TYPE} == {32} and scraper.parser.audit_buffer == []
+
+def test_compaction_keeps_errors_until_their_retention():
+    db = make_db()
+    old, recent = NOW - datetime.timedelta(days=60), NOW - datetime.timedelta(days=1)
+    full_page = [ParserTech(match_id="m1", player_id=f"p{i}", parse_date=old, parse_type=PLAYER_PARSE_TYPE,
+                            error_msg="Validation error" if i == 0 else None) for i in range(3)]
+    compact_page = [ParserTech(match_id="m2", player_id="p9", parse_date=old, parse_type=PLAYER_PARSE_TYPE, error_msg="Validation error"),
+                    ParserTech(match_id="m2", parse_date=old, parse_type=PLAYER_PARSE_TYPE, row_count=20, error_count=1, status="invalid_rows")]
+    recent_page = [ParserTech(match_id="m3", player_id="p1", parse_date=recent, parse_type=PLAYER_PARSE_TYPE)]
+    rows = RecordBatch.from_models(ParserTech, full_page + compact_page + recent_page)
+    db.insert_to_db(PARSER_TECH_TABLE_NAME, rows.columns, rows)
+
+    compaction = AuditCompaction(db, retention_days=30, error_retention_days=90)
+    assert compaction.run(NOW) == {"summaries": 1, "deleted": 2}
+    left = db.get_custom_query(f"SELECT match_id, player_id, row_count, error_count, status FROM {PARSER_TECH_TABLE_NAME} ORDER BY match_id, player_id")
+    assert left == [("m1", None, 3, 1, "invalid_rows"), ("m1", "p0", None, None, None),
+                    ("m2", None, 20, 1, "invalid_rows"), ("m2", "p9", None, None, None), ("m3", "p1", None, None, None)]
+    # nothing new to fold, errors go once past their retention
+    assert compaction.run(NOW) == {"summaries": 0, "deleted": 0}
+    assert compaction.run(NOW + datetime.timedelta(days=31)) == {"summaries": 1, "deleted": 3}
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {PARSER_TECH_TABLE_NAME} WHERE row_count IS NULL") == [(0,)]
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {PARSER_TECH_TABLE_NAME}") == [(3,)]
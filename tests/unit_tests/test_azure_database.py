@@ -0,0 +1,177 @@
+import pytest
+from typing import Any, List
+from Scraper.config import Config
+from Scraper.database import AzureDatabase, DatabaseConnection
+from Scraper.models import Checkpoint
+
+# needs the ODBC driver manager, hosts without it only run the sqlite backend
+pyodbc = pytest.importorskip("pyodbc", exc_type=ImportError)
+
+@pytest.fixture
+def config():
+    return Config('config.yaml').load_config()
+
+def fail_at(log: list, failures: dict) -> None:
+    error = failures.pop(len(log), None)
+    if error:
+        raise error
+
+class RecordedCursor:
+    """ Records statements instead of sending them, fails on the statements listed in failures. """
+    def __init__(self, log: list, failures: dict, rows: list):
+        self.log = log
+        self.failures = failures
+        self.rows = rows
+        self.fast_executemany = False
+
+    def executemany(self, sql: str, values: List[tuple]) -> None:
+        self.log.append(("executemany", sql, list(values), self.fast_executemany))
+        fail_at(self.log, self.failures)
+
+    def execute(self, sql: str, *params) -> None:
+        self.log.append(("execute", sql, *params))
+
+    def fetchall(self) -> list:
+        return self.rows.pop(0) if self.rows else []
+
+class RecordedConnection:
+    def __init__(self, log: list, failures: dict, rows: list):
+        self.log = log
+        self.failures = failures
+        self.rows = rows
+
+    def cursor(self) -> RecordedCursor:
+        return RecordedCursor(self.log, self.failures, self.rows)
+
+    def commit(self) -> None:
+        self.log.append(("commit",))
+        fail_at(self.log, self.failures)
+
+    def rollback(self) -> None:
+        self.log.append(("rollback",))
+        fail_at(self.log, self.failures)
+
+    def close(self) -> None:
+        self.log.append(("close",))
+
+class RecordedDatabaseConnection(DatabaseConnection):
+    """
+    Stand-in for AzureSQLDatabaseConnection, failures maps log positions to errors raised there,
+    rows are the results of the queries, in order.
+    """
+    def __init__(self, failures: dict = None, rows: list = None):
+        self.log = []
+        self.failures = failures or {}
+        self.rows = rows or []
+        self.connections = 0
+
+    def connect(self) -> Any:
+        self.connections += 1
+        return RecordedConnection(self.log, self.failures, self.rows)
+
+    def get_cursor(self, connection: Any) -> Any:
+        return connection.cursor()
+
+COLUMNS = ["match_id", "team", "player", "player_id"]
+ROWS = [("1", "A", f"player {i}", f"p{i}") for i in range(5)]
+
+def dropped_connection() -> pyodbc.Error:
+    return pyodbc.OperationalError("08S01", "[08S01] Communication link failure")
+
+def sent_batches(log: list) -> List[list]:
+    return [entry[2] for entry in log if entry[0] == "executemany"]
+
+def test_insert_in_committed_fast_executemany_batches():
+    connection = RecordedDatabaseConnection()
+    db = AzureDatabase(connection, batch_size=2)
+    db.insert_to_db("player_stats", COLUMNS, ROWS)
+    assert [entry[0] for entry in connection.log] == ["executemany", "commit"] * 3
+    assert sent_batches(connection.log) == [ROWS[0:2], ROWS[2:4], ROWS[4:5]]
+    assert all(entry[3] for entry in connection.log if entry[0] == "executemany")
+    assert connection.log[0][1] == "Insert into player_stats (match_id,team,player,player_id) values (?,?,?,?)"
+
+def test_dropped_connection_resends_only_failed_batch():
+    # third log entry is the second batch
+    connection = RecordedDatabaseConnection(failures={3: dropped_connection()})
+    sleeps = []
+    db = AzureDatabase(connection, batch_size=2, sleep=sleeps.append)
+    db.insert_to_db("player_stats", COLUMNS, ROWS)
+    assert sent_batches(connection.log) == [ROWS[0:2], ROWS[2:4], ROWS[2:4], ROWS[4:5]]
+    assert connection.connections == 2
+    assert sleeps == [1.0]
+    # the new cursor keeps bulk mode
+    assert db.cur.fast_executemany
+
+def test_gives_up_after_retries():
+    connection = RecordedDatabaseConnection(failures={i: dropped_connection() for i in (1, 3, 5)})
+    db = AzureDatabase(connection, batch_size=2, retries=2, sleep=lambda s: None)
+    with pytest.raises(pyodbc.Error):
+        db.insert_to_db("player_stats", COLUMNS, ROWS)
+    assert connection.connections == 3
+
+def test_non_transient_error_is_not_retried():
+    connection = RecordedDatabaseConnection(failures={1: pyodbc.IntegrityError("23000", "Violation of UNIQUE KEY")})
+    db = AzureDatabase(connection, sleep=lambda s: None)
+    with pytest.raises(pyodbc.IntegrityError):
+        db.insert_to_db("player_stats", COLUMNS, ROWS)
+    assert connection.connections == 1
+
+def test_no_retry_inside_transaction():
+    # no commits between batches in a transaction, second log entry is the second batch
+    connection = RecordedDatabaseConnection(failures={2: dropped_connection()})
+    db = AzureDatabase(connection, batch_size=2, sleep=lambda s: None)
+    with pytest.raises(pyodbc.Error):
+        with db.transaction():
+            db.insert_to_db("player_stats", COLUMNS, ROWS)
+    assert [entry[0] for entry in connection.log] == ["executemany", "executemany", "rollback"]
+    assert connection.connections == 1
+
+@pytest.mark.parametrize("found", [1, 0])
+def test_batch_with_failed_commit_is_resent_only_when_missing(found: int):
+    # fourth log entry is the commit of the second batch
+    connection = RecordedDatabaseConnection(failures={4: dropped_connection()}, rows=[[(found,)]])
+    db = AzureDatabase(connection, batch_size=2, sleep=lambda s: None)
+    db.insert_to_db("player_stats", COLUMNS, ROWS)
+    lookup = [entry for entry in connection.log if entry[0] == "execute"]
+    assert lookup == [("execute", "SELECT COUNT(*) FROM player_stats WHERE match_id = ? AND player_id = ?", ("1", "p2"))]
+    expected = [ROWS[0:2], ROWS[2:4], ROWS[4:5]] if found else [ROWS[0:2], ROWS[2:4], ROWS[2:4], ROWS[4:5]]
+    assert sent_batches(connection.log) == expected
+
+def test_failed_commit_without_key_is_not_resent():
+    connection = RecordedDatabaseConnection(failures={2: dropped_connection()})
+    db = AzureDatabase(connection, sleep=lambda s: None)
+    with pytest.raises(pyodbc.Error):
+        db.insert_to_db("parser_tech", ["match_id", "parse_type"], [("1", "player")])
+    assert len(sent_batches(connection.log)) == 1
+
+def test_failed_rollback_keeps_original_error():
+    connection = RecordedDatabaseConnection(failures={2: dropped_connection()})
+    db = AzureDatabase(connection, sleep=lambda s: None)
+    with pytest.raises(pyodbc.Error) as error:
+        with db.transaction():
+            db.insert_to_db("player_stats", COLUMNS, ROWS)
+            raise pyodbc.IntegrityError("23000", "Violation of UNIQUE KEY")
+    assert isinstance(error.value, pyodbc.IntegrityError)
+
+def test_long_text_columns_are_wider():
+    connection = RecordedDatabaseConnection()
+    db = AzureDatabase(connection)
+    db.create_table(Checkpoint, "scrape_checkpoints")
+    ddl = connection.log[0][1]
+    assert "url NVARCHAR(400)" in ddl and "match_id VARCHAR(100)" in ddl
+
+    # existing tables are changed by the schema migration, the index on url is dropped for it
+    connection = RecordedDatabaseConnection(rows=[[("varchar", 100)], [("ix_scrape_checkpoints_url_status",)], [("nvarchar", 400)]])
+    db = AzureDatabase(connection)
+    assert db.widen_column("scrape_checkpoints", "url", "NVARCHAR(400)")
+    assert not db.widen_column("scrape_checkpoints", "url", "NVARCHAR(400)")
+    assert [entry[1] for entry in connection.log if entry[0] == "execute" and not entry[1].startswith("SELECT")] == [
+        "DROP INDEX ix_scrape_checkpoints_url_status ON scrape_checkpoints",
+        "ALTER TABLE scrape_checkpoints ALTER COLUMN url NVARCHAR(400)"]
+
+def test_from_config(config: dict):
+    config["azure_connection"]["bulk"] = {"batch_size": 500, "fast_executemany": False, "retries": 5}
+    config["database"]["write_mode"] = "upsert"
+    db = AzureDatabase.from_config(RecordedDatabaseConnection(), config)
+    assert (db.batch_size, db.fast_executemany, db.retries, db.write_mode) == (500, False, 5, "upsert")
+    assert db.cur.fast_executemany is False
@@ -0,0 +1,95 @@
+import os
+import pytest
+import requests
+from Scraper.api_consumer import APIConsumer
+from Scraper.cache import ResponseCache
+from Scraper.limiter import RateLimiter
+from tests.fixtures.server import StandInServer
+
+PAGE = ("<html><body>" + "<td data-stat='goals'>1</td>" * 5000 + "</body></html>").encode()
+SCHEDULE_URL = "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+MATCH_URL = "/en/matches/3a6836b4"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def server():
+    def route(path, headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {}, b""
+        return 200, {"ETag": '"v1"', "Content-Type": "text/html; charset=utf-8"}, PAGE
+    with StandInServer(route) as s:
+        yield s
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def cache(tmp_path, clock: Clock):
+    return ResponseCache({"directory": str(tmp_path), "schedule_ttl": 60, "match_ttl": 3600, "max_size_mb": 1}, clock=clock)
+
+@pytest.fixture
+def api_consumer(cache: ResponseCache):
+    config = {"api_consumer": {"requests_limit": 1, "sleep_time": 5, "time_limit": 5, "transport": {"retries": 0}}}
+    return APIConsumer(config, cache=cache, limiter=RateLimiter(rate=1000, capacity=100))
+
+def test_cache_hit_skips_limiter(server: StandInServer, api_consumer: APIConsumer):
+    first = api_consumer.call(server.url + MATCH_URL)
+    second = api_consumer.call(server.url + MATCH_URL)
+    assert second.text == first.text
+    assert second.from_cache
+    assert len(server.requests) == 1
+    assert api_consumer.api_calls == 1
+    assert api_consumer.cache.stats.hits == 1
+    assert api_consumer.limiter.stats.requests == 1
+
+def test_separate_ttls_and_revalidation(server: StandInServer, api_consumer: APIConsumer, clock: Clock):
+    api_consumer.call(server.url + SCHEDULE_URL)
+    api_consumer.call(server.url + MATCH_URL)
+    clock.now += 120
+    # schedule page is stale, match page is still fresh
+    resp = api_consumer.call(server.url + SCHEDULE_URL)
+    api_consumer.call(server.url + MATCH_URL)
+    assert resp.content == PAGE
+    assert len(server.requests) == 3
+    assert api_consumer.cache.stats.revalidated == 1
+    assert api_consumer.cache.stats.hits == 1
+    # 304 restarts the ttl
+    api_consumer.call(server.url + SCHEDULE_URL)
+    assert len(server.requests) == 3
+
+def test_bodies_are_compressed(cache: ResponseCache, tmp_path):
+    resp = _response(PAGE)
+    cache.store("https://fbref.com" + MATCH_URL, resp)
+    entry = cache.get("https://fbref.com" + MATCH_URL)
+    assert os.path.getsize(os.path.join(tmp_path, entry.file_name)) < len(PAGE) / 10
+    assert cache.load(entry).content == PAGE
+
+def test_lru_eviction(cache: ResponseCache, clock: Clock):
+    # room for three incompressible 1KB bodies
+    cache.max_size = 3200
+    bodies = {f"https://fbref.com/en/matches/{i}": os.urandom(1024) for i in range(3)}
+    for url, body in bodies.items():
+        clock.now += 1
+        cache.store(url, _response(body))
+    # touch the oldest entry, so the second one is least recently used
+    clock.now += 1
+    cache.load(cache.get("https://fbref.com/en/matches/0"))
+    clock.now += 1
+    cache.store("https://fbref.com/en/matches/3", _response(os.urandom(1024)))
+    assert cache.get("https://fbref.com/en/matches/1") is None
+    assert cache.get("https://fbref.com/en/matches/0") is not None
+    assert cache.total_size <= cache.max_size
+    assert cache.stats.evicted >= 1
+
+def _response(body: bytes) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body
+    resp.encoding = "utf-8"
+    return resp
@@ -0,0 +1,106 @@
+import pytest
+import datetime
+from unittest.mock import MagicMock
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.checkpoints import CheckpointStore
+from Scraper.crawler import CrawlOrchestrator
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.models import Match
+from Scraper.errors import CircuitOpenException
+from Scraper.constants import (MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, CHECKPOINTS_TABLE_NAME,
+                               CHECKPOINT_COMMITTED, CHECKPOINT_PARSED)
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+@pytest.fixture
+def config():
+    config = Config('config.yaml').load_config()
+    config["parser"]["engine"] = "html.parser"
+    return config
+
+@pytest.fixture
+def sqlite_db():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return db
+
+def make_scraper(config: dict, db: BasicDatabase, mode: str, fail_on: str = None, chunk_size: int = 100) -> Scraper:
+    pages = list(match_pages().values())
+    def call(url):
+        if url == SCHEDULE_URL:
+            return MagicMock(text=load_page(SCHEDULE_PAGE))
+        if fail_on and url.endswith(fail_on):
+            # the website went down, a failure of one match would go to the dead letters
+            raise CircuitOpenException("fbref.com", 300)
+        return MagicMock(text=pages[sum(map(ord, url)) % len(pages)])
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = call
+    config = {**config, "scraper": {"mode": mode, "parse_workers": 0, "write_batch_size": 2, "checkpoints": True,
+                                    "stream_chunk_size": chunk_size}}
+    return Scraper(Parser(api_consumer, config), db, config)
+
+def scrape(scraper: Scraper, mode: str, number_of_matches_to_scrape: int) -> None:
+    if mode == "crawler":
+        config = {"crawler": {"fetch_concurrency": 1, "parse_workers": 0, "write_batch_size": 2}}
+        CrawlOrchestrator(scraper, config).run([SCHEDULE_URL], number_of_matches_to_scrape)
+    else:
+        scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=number_of_matches_to_scrape)
+
+def requested_urls(scraper: Scraper) -> list:
+    return [c.args[0] for c in scraper.parser.api_consumer.call.call_args_list]
+
+def test_checkpoint_store(sqlite_db: BasicDatabase):
+    matches = [Match(date=datetime.date(2023, 11, 18), home="A", score="1-0", away="B", match_id=str(i),
+                     season="2023-2024", competition="Example League") for i in range(3)]
+    checkpoints = CheckpointStore(sqlite_db)
+    checkpoints.queue(SCHEDULE_URL, matches)
+    assert checkpoints.pending(SCHEDULE_URL) == matches
+    checkpoints.parsed("0")
+    checkpoints.committed(["1"])
+    assert checkpoints.pending(SCHEDULE_URL) == [matches[0], matches[2]]
+    assert sqlite_db.get_custom_query(f"SELECT match_id, status FROM {CHECKPOINTS_TABLE_NAME} ORDER BY id") == [
+        ("0", CHECKPOINT_PARSED), ("1", CHECKPOINT_COMMITTED), ("2", "queued")]
+    # unfinished competitions are kept
+    checkpoints.finish(SCHEDULE_URL)
+    assert len(checkpoints.pending(SCHEDULE_URL)) == 2
+    checkpoints.committed(["0", "2"])
+    checkpoints.finish(SCHEDULE_URL)
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(*) FROM {CHECKPOINTS_TABLE_NAME}") == [(0,)]
+
+@pytest.mark.parametrize("mode", ["serial", "pipeline", "crawler"])
+def test_restarted_run_resumes(config: dict, sqlite_db: BasicDatabase, mode: str):
+    matches = make_scraper(config, sqlite_db, "serial").parser.get_matches(SCHEDULE_URL)
+    scraper_mode = "serial" if mode == "crawler" else mode
+    crashed = make_scraper(config, sqlite_db, scraper_mode, fail_on=matches[3].match_id)
+    scrape(crashed, mode, 6)
+    assert crashed.matches_added == 3
+
+    resumed = make_scraper(config, sqlite_db, scraper_mode)
+    scrape(resumed, mode, 6)
+    # queued matches first, the limit is filled from the schedule, no match committed by the crashed run is requested again
+    assert requested_urls(resumed) == ([resumed.parser.match_url(m.match_id) for m in matches[3:6]] + [SCHEDULE_URL]
+                                       + [resumed.parser.match_url(m.match_id) for m in matches[6:9]])
+    assert resumed.matches_added == 6
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(DISTINCT match_id), COUNT(*) FROM {MATCHES_TABLE_NAME}") == [(9, 9)]
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(*) FROM {PLAYER_STATS_TABLE_NAME}") == [(9 * 32,)]
+    # finished competition starts from its schedule page next time
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(*) FROM {CHECKPOINTS_TABLE_NAME}") == [(0,)]
+
+@pytest.mark.parametrize("mode", ["serial", "pipeline"])
+def test_resumed_run_finishes_schedule(config: dict, sqlite_db: BasicDatabase, mode: str):
+    matches = make_scraper(config, sqlite_db, "serial").parser.get_matches(SCHEDULE_URL)
+    # crash in the first stream chunk of 4, the next chunks were never queued
+    crashed = make_scraper(config, sqlite_db, mode, fail_on=matches[2].match_id, chunk_size=4)
+    crashed.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=10)
+    assert crashed.matches_added == 2
+
+    resumed = make_scraper(config, sqlite_db, mode, chunk_size=4)
+    resumed.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=10)
+    assert requested_urls(resumed) == ([resumed.parser.match_url(m.match_id) for m in matches[2:4]] + [SCHEDULE_URL]
+                                       + [resumed.parser.match_url(m.match_id) for m in matches[4:12]])
+    assert resumed.matches_added == 10
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(DISTINCT match_id), COUNT(*) FROM {MATCHES_TABLE_NAME}") == [(12, 12)]
+    assert sqlite_db.get_custom_query(f"SELECT COUNT(*) FROM {CHECKPOINTS_TABLE_NAME}") == [(0,)]
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+import yaml
+from Scraper.cli import main, competition_urls, prepare_database
+from Scraper.config import Config
+from Scraper.registry import Registry, DATABASE_BACKENDS
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection, TABLE_MODELS
+from Scraper.models import Match, PlayerStats
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+from tests.fixtures.server import StandInServer, fbref_route
+
+SCHEDULE_PATH = "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+# seconds, a cron run starts with these imports
+CLI_IMPORT_BUDGET = 0.3
+PACKAGE_IMPORT_BUDGET = 2.0
+
+def run_python(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], cwd="SCRIPTS", capture_output=True, text=True, check=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+def baseline_database(path: str) -> BasicDatabase:
+    """ Tables of a database created before the job queue, checkpoints and parser_tech summary columns. """
+    db = BasicDatabase(SQLiteDatabaseConnection(path))
+    db.create_table(Match, MATCHES_TABLE_NAME)
+    db.create_table(PlayerStats, PLAYER_STATS_TABLE_NAME)
+    db.execute(f"CREATE TABLE {PARSER_TECH_TABLE_NAME} (id INTEGER PRIMARY KEY AUTOINCREMENT, match_id TEXT, "
+               "player_id TEXT, parse_date DATETIME, parse_type TEXT, error_msg TEXT)")
+    return db
+
+def test_startup_imports():
+    cli = run_python(
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        "import Scraper.cli\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': [m for m in "
+        "('pyodbc', 'requests', 'bs4', 'pydantic', 'numpy', 'yaml') if m in sys.modules]}))")
+    assert cli["modules"] == [] and cli["seconds"] < CLI_IMPORT_BUDGET
+
+    # a host without ODBC runs the sqlite backend
+    package = run_python(
+        "import sys, time, json\n"
+        "sys.modules['pyodbc'] = None\n"
+        "start = time.perf_counter()\n"
+        "import Scraper.crawler\n"
+        "from Scraper.registry import open_database\n"
+        "db = open_database({'database': {'backend': 'sqlite'}, 'sqlite': {'db_name': ':memory:'}})\n"
+        "db.recreate_db()\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start}))")
+    assert package["seconds"] < PACKAGE_IMPORT_BUDGET
+
+def test_registry_resolves_on_first_use():
+    registry = Registry("thing", {"path": "os.path:join"})
+    assert "path" in registry and list(registry) == ["path"]
+    assert registry.resolve("path") is os.path.join and registry["path"] is os.path.join
+    with pytest.raises(ValueError):
+        registry.resolve("missing")
+    assert list(DATABASE_BACKENDS) == ["sqlite", "azure"]
+
+def test_competition_urls():
+    config = {"competitions": {"premier-league": "https://fbref.com" + SCHEDULE_PATH}}
+    assert competition_urls(config) == competition_urls(config, ["premier-league"]) == ["https://fbref.com" + SCHEDULE_PATH]
+    url = "https://fbref.com/en/comps/12/schedule/La-Liga-Scores-and-Fixtures"
+    assert competition_urls(config, [url]) == [url]
+    with pytest.raises(ValueError):
+        competition_urls(config, ["la-liga"])
+
+@pytest.mark.parametrize("baseline", [True, False], ids=["baseline", "new"])
+def test_prepare_existing_database(tmp_path, baseline: bool):
+    path = str(tmp_path / "db.sqlite")
+    db = baseline_database(path) if baseline else BasicDatabase(SQLiteDatabaseConnection(path))
+    prepare_database(db, {"recreate_db": False})
+    assert all(db.table_columns(table) for table in TABLE_MODELS)
+    indexes = {row[0] for row in db.get_custom_query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {f"uq_{table}" for table, model in TABLE_MODELS.items() if model.unique} <= indexes
+
+@pytest.mark.parametrize("recreate_db", [True, False], ids=["recreated", "baseline"])
+def test_run_on_sqlite_backend(tmp_path, recreate_db: bool):
+    config = Config('config.yaml').load_config()
+    config["api_consumer"].update({"requests_limit": 1000, "time_limit": 1, "sleep_time": 0})
+    config["api_consumer"]["transport"] = {"retries": 0}
+    config["api_consumer"]["cache"] = {"enabled": False}
+    config["api_consumer"]["archive"] = {"enabled": False}
+    config["sqlite"]["db_name"] = str(tmp_path / "db.sqlite")
+    config["metrics"] = {"table": True, "directory": str(tmp_path / "metrics")}
+    config["scraper"].update({"mode": "serial", "parse_workers": 0})
+    config["crawler"]["enabled"] = False
+    config["recreate_db"] = recreate_db
+    if not recreate_db:
+        # a database of an older version is upgraded at startup
+        baseline_database(config["sqlite"]["db_name"]).con.close()
+    with StandInServer(fbref_route()) as server:
+        config["parser"]["base_url"] = server.url
+        config["competitions"] = {"premier-league": server.url + SCHEDULE_PATH}
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text(yaml.safe_dump(config))
+        main(["--config", str(config_path), "--backend", "sqlite", "--engine", "html.parser", "-c", "premier-league", "--matches", "3"])
+
+    db = BasicDatabase(SQLiteDatabaseConnection(config["sqlite"]["db_name"]))
+    assert db.get_custom_query(f"SELECT COUNT(*), MIN(competition) FROM {MATCHES_TABLE_NAME}") == [(3, "Premier League")]
+    assert server.requests[0] == SCHEDULE_PATH and len(server.requests) == 4
+    assert "row_count" in db.table_columns(PARSER_TECH_TABLE_NAME)
@@ -4,4 +4,11 @@ import os
 def test_connect_sqllite():
     db = SQLiteDatabaseConnection(":memory:")
     with db.connect() as con:
-        assert con
\ No newline at end of file
+        assert con
+
+def test_connect_sqllite_with_pragmas(tmp_path):
+    db = SQLiteDatabaseConnection(str(tmp_path / "test.db"), {"journal_mode": "WAL", "synchronous": "NORMAL"})
+    con = db.connect()
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (1,)
+    con.close()
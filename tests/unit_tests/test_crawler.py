@@ -0,0 +1,83 @@
+import pytest
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.api_consumer import APIConsumer
+from Scraper.limiter import RateLimiter
+from Scraper.crawler import CrawlOrchestrator
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, DEAD_LETTERS_TABLE_NAME
+from tests.fixtures.server import StandInServer, fbref_route
+
+PREMIER_LEAGUE = "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+LA_LIGA = "/en/comps/12/schedule/La-Liga-Scores-and-Fixtures"
+BROKEN = "/en/comps/8/schedule/Champions-League-Scores-and-Fixtures"
+
+@pytest.fixture
+def config():
+    config = Config('config.yaml').load_config()
+    config["api_consumer"]["transport"] = {"retries": 0}
+    config["api_consumer"]["cache"] = {"enabled": False}
+    config["api_consumer"]["archive"] = {"enabled": False}
+    config["crawler"] = {"fetch_concurrency": 2, "parse_workers": 2, "write_batch_size": 4, "progress_interval": 1}
+    return config
+
+def make_orchestrator(config: dict, base_url: str) -> CrawlOrchestrator:
+    config["parser"]["base_url"] = base_url
+    # neutralised politeness budget, still shared by every competition
+    api_consumer = APIConsumer(config, limiter=RateLimiter(rate=1000, capacity=1))
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    return CrawlOrchestrator(scraper, config)
+
+def test_crawl_competitions_end_to_end(config: dict):
+    with StandInServer(fbref_route()) as server:
+        orchestrator = make_orchestrator(config, server.url)
+        progress = orchestrator.run([server.url + PREMIER_LEAGUE, server.url + LA_LIGA], number_of_matches_to_scrape=6)
+
+    assert [p.status for p in progress.values()] == ["done", "done"]
+    assert [p.matches_added for p in progress.values()] == [6, 6]
+    db = orchestrator.db
+    assert db.get_custom_query(f"SELECT COUNT(DISTINCT match_id) FROM {MATCHES_TABLE_NAME}") == [(12,)]
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {PLAYER_STATS_TABLE_NAME}") == [(12 * 32,)]
+    assert sorted(r[0] for r in db.get_custom_query(f"SELECT DISTINCT competition FROM {MATCHES_TABLE_NAME}")) == ["La Liga", "Premier League"]
+    assert orchestrator.scraper.matches_added == 12
+    # both schedules first, then match pages alternate between competitions
+    match_requests = [p for p in server.requests if p.startswith("/en/matches/")]
+    assert len(match_requests) == 12
+    assert len(server.requests) == 14
+
+def test_broken_competition_does_not_stop_others(config: dict):
+    with StandInServer(fbref_route(failing=[BROKEN])) as server:
+        orchestrator = make_orchestrator(config, server.url)
+        progress = orchestrator.run([server.url + BROKEN, server.url + PREMIER_LEAGUE], number_of_matches_to_scrape=3)
+
+    broken, premier_league = progress.values()
+    assert broken.status == "failed" and "500" in broken.error
+    assert premier_league.status == "done" and premier_league.matches_added == 3
+
+def test_rejected_match_does_not_stop_competitions(config: dict):
+    with StandInServer(fbref_route()) as server:
+        orchestrator = make_orchestrator(config, server.url)
+        rejected = orchestrator.parser.get_matches(server.url + PREMIER_LEAGUE)[1].match_id
+        orchestrator.db.execute(f"CREATE TRIGGER reject BEFORE INSERT ON {MATCHES_TABLE_NAME} WHEN NEW.match_id = '{rejected}' "
+                                f"BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        progress = orchestrator.run([server.url + PREMIER_LEAGUE, server.url + LA_LIGA], number_of_matches_to_scrape=4)
+
+    assert [(p.status, p.matches_added, p.matches_failed) for p in progress.values()] == [("done", 3, 1), ("done", 4, 0)]
+    assert orchestrator.db.get_custom_query(f"SELECT COUNT(*) FROM {MATCHES_TABLE_NAME}") == [(7,)]
+    assert orchestrator.db.get_custom_query(f"SELECT match_id FROM {DEAD_LETTERS_TABLE_NAME}") == [(rejected,)]
+
+def test_fair_share_between_competitions(config: dict):
+    # one fetch at a time and inline parsing make the dispatch order deterministic
+    config["crawler"]["fetch_concurrency"] = 1
+    config["crawler"]["parse_workers"] = 0
+    with StandInServer(fbref_route()) as server:
+        orchestrator = make_orchestrator(config, server.url)
+        orchestrator.run([server.url + PREMIER_LEAGUE, server.url + LA_LIGA], number_of_matches_to_scrape=4)
+        requests = list(server.requests)
+    premier_league_ids = {m[0] for m in orchestrator.db.get_custom_query(
+        f"SELECT match_id FROM {MATCHES_TABLE_NAME} WHERE competition = 'Premier League'")}
+    order = ["PL" if p.split("/")[3] in premier_league_ids else "LL" for p in requests if p.startswith("/en/matches/")]
+    assert order == ["PL", "LL"] * 4
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import MagicMock
-from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.database import BasicDatabase, AzureDatabase, SQLiteDatabaseConnection
 from Scraper.models import Match
 import datetime 
 
@@ -44,3 +44,36 @@ def test_check_matches_not_in_db_empty_db(sqlite_db: MagicMock, matches_mock_dat
     result = sqlite_db.check_matches_not_in_db(matches_mock_data)
     assert result == matches_mock_data
 
+
+def test_check_matches_not_in_db_queries_candidates_in_chunks(sqlite_db: BasicDatabase, matches_mock_data: list):
+    sqlite_db.recreate_db()
+    sqlite_db.max_query_params = 1
+    sqlite_db.insert_to_db("matches", list(Match.get_empty_dict().keys()), [tuple(matches_mock_data[0].model_dump().values())])
+    sqlite_db.get_custom_query = MagicMock(wraps=sqlite_db.get_custom_query)
+    # the inserted match is known without asking the database
+    assert sqlite_db.check_matches_not_in_db(matches_mock_data) == matches_mock_data[1:]
+    sql, params = sqlite_db.get_custom_query.call_args.args
+    assert "WHERE match_id IN (?)" in sql and params == ("124",)
+    # ids already checked in this run are not looked up again
+    sqlite_db.get_custom_query.reset_mock()
+    assert sqlite_db.check_matches_not_in_db(matches_mock_data) == matches_mock_data[1:]
+    sqlite_db.get_custom_query.assert_not_called()
+
+def test_check_matches_not_in_db_large_table(sqlite_db: BasicDatabase):
+    sqlite_db.recreate_db()
+    sqlite_db.cur.executemany("INSERT INTO matches (match_id) VALUES (?)", [(f"{i:08x}",) for i in range(300_000)])
+    candidates = [Match(date=datetime.date(2023, 11, 18), home="A", score="", away="B", match_id=f"{i:08x}",
+                        season="2023-2024", competition="Example League") for i in range(299_000, 301_000)]
+    result = sqlite_db.check_matches_not_in_db(candidates)
+    assert [m.match_id for m in result] == [f"{i:08x}" for i in range(300_000, 301_000)]
+    plan = sqlite_db.get_custom_query("EXPLAIN QUERY PLAN SELECT match_id FROM matches WHERE match_id IN (?)", ("1",))
+    assert "uq_matches" in str(plan)
+
+def test_azure_upsert_uses_merge():
+    azure_db = AzureDatabase(MagicMock(), write_mode="upsert")
+    azure_db.insert_to_db("matches", ["match_id", "score"], [("123", "1-0")])
+    sql, values = azure_db.cur.executemany.call_args.args
+    assert sql == ("MERGE INTO matches WITH (HOLDLOCK) AS target USING (VALUES (?,?)) AS source (match_id,score) "
+                   "ON target.match_id=source.match_id WHEN MATCHED THEN UPDATE SET target.score=source.score "
+                   "WHEN NOT MATCHED THEN INSERT (match_id,score) VALUES (source.match_id,source.score);")
+    assert values == [("123", "1-0")]
@@ -0,0 +1,141 @@
+import datetime
+import pytest
+import requests
+from unittest.mock import MagicMock
+from Scraper.dead_letters import DeadLetterStore
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.models import Match, DeadLetter
+from Scraper.api_consumer import APIConsumer
+from Scraper.limiter import RateLimiter
+from Scraper.crawler import CrawlOrchestrator
+from Scraper.database import BasicDatabase, AzureDatabase, SQLiteDatabaseConnection
+from Scraper.constants import (MATCHES_TABLE_NAME, DEAD_LETTERS_TABLE_NAME, PARSER_TECH_TABLE_NAME, DEAD_LETTER_PENDING,
+                               DEAD_LETTER_GIVEN_UP, ERROR_MSG_LENGTH)
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+from tests.fixtures.server import StandInServer, fbref_route
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+class Clock:
+    def __init__(self):
+        self.now = datetime.datetime(2024, 1, 1)
+    def __call__(self) -> datetime.datetime:
+        return self.now
+
+@pytest.fixture
+def config():
+    config = Config('config.yaml').load_config()
+    config["parser"]["engine"] = "html.parser"
+    config["dead_letters"] = {"enabled": True, "retry_delay": 60, "max_retry_delay": 100, "max_attempts": 3}
+    return config
+
+@pytest.fixture
+def db():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return db
+
+def reject_insert(db: BasicDatabase, match_id: str) -> None:
+    db.execute(f"CREATE TRIGGER reject_{match_id} BEFORE INSERT ON {MATCHES_TABLE_NAME} WHEN NEW.match_id = '{match_id}' "
+               f"BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+
+def make_match(match_id: str) -> Match:
+    return Match(date=datetime.date(2024, 1, 1), home="A", score="1-0", away="B", match_id=match_id,
+                 season="2023-2024", competition="Premier League")
+
+def test_backoff_and_give_up(db: BasicDatabase, config: dict):
+    clock = Clock()
+    store = DeadLetterStore.from_config(db, config, clock=clock)
+    timeout, missing = make_match("m1"), make_match("m2")
+    assert store.record(timeout, requests.exceptions.ReadTimeout("read timed out"), SCHEDULE_URL) == DEAD_LETTER_PENDING
+    assert store.record(missing, requests.exceptions.HTTPError(404), SCHEDULE_URL) == DEAD_LETTER_GIVEN_UP
+    assert store.exclude([timeout, missing, make_match("m3")]) == [make_match("m3")]
+
+    assert store.due() == []
+    clock.now += datetime.timedelta(seconds=60)
+    assert store.due() == [(SCHEDULE_URL, timeout)]
+    # the delay doubles, up to max_retry_delay
+    store.record(timeout, requests.exceptions.HTTPError(500))
+    clock.now += datetime.timedelta(seconds=100)
+    assert store.due() == [(SCHEDULE_URL, timeout)]
+    assert store.record(timeout, requests.exceptions.HTTPError(500)) == DEAD_LETTER_GIVEN_UP
+    assert db.get_custom_query(f"SELECT match_id, error_class, error_msg, attempts FROM {DEAD_LETTERS_TABLE_NAME} ORDER BY match_id") == [
+        ("m1", "HTTPError", "500", 3), ("m2", "HTTPError", "404", 1)]
+    assert store.counts() == {DEAD_LETTER_GIVEN_UP: 2}
+
+def test_error_message_fits_its_column(db: BasicDatabase, config: dict):
+    store = DeadLetterStore.from_config(db, config)
+    store.record(make_match("m1"), ValueError("x" * 2 * ERROR_MSG_LENGTH), SCHEDULE_URL)
+    assert db.get_custom_query(f"SELECT LENGTH(error_msg) FROM {DEAD_LETTERS_TABLE_NAME}") == [(ERROR_MSG_LENGTH,)]
+    azure = AzureDatabase(MagicMock())
+    azure.create_table(DeadLetter, DEAD_LETTERS_TABLE_NAME)
+    ddl = azure.cur.execute.call_args.args[0]
+    assert f"error_msg NVARCHAR({ERROR_MSG_LENGTH})" in ddl and "url NVARCHAR(400)" in ddl
+
+@pytest.mark.parametrize("mode", ["serial", "pipeline"])
+def test_failed_match_is_retried_later(db: BasicDatabase, config: dict, mode: str):
+    pages = list(match_pages().values())
+    failing = set()
+    def call(url):
+        if url == SCHEDULE_URL:
+            return MagicMock(text=load_page(SCHEDULE_PAGE))
+        if url.rsplit("/", 1)[-1] in failing:
+            raise requests.exceptions.ReadTimeout("read timed out")
+        return MagicMock(text=pages[sum(map(ord, url)) % len(pages)])
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = call
+    config["scraper"] = {"mode": mode, "parse_workers": 0, "write_batch_size": 2, "checkpoints": True}
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    clock = scraper.dead_letters.clock = Clock()
+    matches = scraper.parser.get_matches(SCHEDULE_URL)
+    failing.add(matches[1].match_id)
+
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=4)
+    assert scraper.matches_added == 3 and scraper.matches_failed == 1
+    # the next run skips it, the retry pass waits for its time
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=4)
+    assert scraper.matches_added == 7 and scraper.retry_dead_letters() == 0
+
+    failing.clear()
+    clock.now += datetime.timedelta(seconds=60)
+    assert scraper.retry_dead_letters() == 1
+    assert scraper.dead_letters.counts() == {}
+    assert db.get_custom_query(f"SELECT COUNT(DISTINCT match_id) FROM {MATCHES_TABLE_NAME}") == [(8,)]
+
+@pytest.mark.parametrize("mode", ["serial", "pipeline"])
+def test_rejected_insert_keeps_audit_rows(db: BasicDatabase, config: dict, mode: str):
+    pages = list(match_pages().values())
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = lambda url: MagicMock(
+        text=load_page(SCHEDULE_PAGE) if url == SCHEDULE_URL else pages[sum(map(ord, url)) % len(pages)])
+    config["scraper"] = {"mode": mode, "parse_workers": 0, "write_batch_size": 3, "checkpoints": True}
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    matches = scraper.parser.get_matches(SCHEDULE_URL)
+    scraper.flush_audit()
+    reject_insert(db, matches[0].match_id)
+
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=3)
+    assert scraper.matches_added == 2 and scraper.matches_failed == 1
+    assert db.get_custom_query(f"SELECT match_id, error_msg FROM {DEAD_LETTERS_TABLE_NAME}") == [(matches[0].match_id, "rejected")]
+    # the page rows of the schedule and of every parsed match, the rejected one included
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {PARSER_TECH_TABLE_NAME} WHERE parse_type = 'match'") == [(2,)]
+    assert db.get_custom_query(f"SELECT match_id FROM {PARSER_TECH_TABLE_NAME} WHERE parse_type = 'player' ORDER BY id") == [
+        (m.match_id,) for m in matches[:3]]
+
+def test_crawl_goes_on_after_failed_match(db: BasicDatabase, config: dict):
+    config["api_consumer"]["transport"] = {"retries": 0}
+    config["api_consumer"]["cache"] = {"enabled": False}
+    config["api_consumer"]["archive"] = {"enabled": False}
+    config["crawler"] = {"fetch_concurrency": 2, "parse_workers": 0, "write_batch_size": 2}
+    matches = Parser(None, config).parse_matches(load_page(SCHEDULE_PAGE), SCHEDULE_URL, datetime.datetime.now())[0]
+    with StandInServer(fbref_route(failing=[matches[2].match_id])) as server:
+        config["parser"]["base_url"] = server.url
+        scraper = Scraper(Parser(APIConsumer(config, limiter=RateLimiter(rate=1000, capacity=1)), config), db, config)
+        url = server.url + "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+        progress = CrawlOrchestrator(scraper, config).run([url], number_of_matches_to_scrape=5)[url]
+
+    assert progress.status == "done" and (progress.matches_added, progress.matches_failed) == (4, 1)
+    assert db.get_custom_query(f"SELECT match_id, url, status FROM {DEAD_LETTERS_TABLE_NAME}") == [
+        (matches[2].match_id, url, DEAD_LETTER_PENDING)]
@@ -0,0 +1,98 @@
+import pytest
+import datetime
+from unittest.mock import MagicMock
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.models import Match, PlayerStats, ParserTech
+from Scraper.records import RecordBatch
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME
+
+pa = pytest.importorskip("pyarrow")
+from Scraper.export import ParquetExporter, arrow_schema, open_dataset, read_season
+
+SEASONS = [("Premier League", "2022-2023"), ("Premier League", "2023-2024"), ("La Liga", "2023-2024")]
+
+def insert_season(db: BasicDatabase, competition: str, season: str, n: int, start: int = 0) -> None:
+    matches, players, tech = [], [], []
+    for i in range(start, start + n):
+        match_id = f"{competition[:2]}{season[:4]}{i}"
+        matches.append(Match(date=datetime.date(int(season[:4]), 9, 1 + i), home="A", score="1–0", away="B",
+                             match_id=match_id, season=season, competition=competition))
+        for p in range(2):
+            players.append(PlayerStats(match_id=match_id, team="A", player=f"player {p}", player_id=f"p{p}", goals=p, xg=0.1 * p))
+            tech.append(ParserTech(match_id=match_id, player_id=f"p{p}", parse_date=datetime.datetime(2024, 1, 1), parse_type="player"))
+    for table, model, rows in [(MATCHES_TABLE_NAME, Match, matches), (PLAYER_STATS_TABLE_NAME, PlayerStats, players),
+                               (PARSER_TECH_TABLE_NAME, ParserTech, tech)]:
+        batch = RecordBatch.from_models(model, rows)
+        db.insert_to_db(table, batch.columns, batch)
+
+@pytest.fixture
+def sqlite_db():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    for competition, season in SEASONS:
+        insert_season(db, competition, season, 3)
+    return db
+
+def test_arrow_schema_from_model():
+    schema = arrow_schema(PlayerStats)
+    assert schema.names == list(PlayerStats.model_fields)
+    assert schema.field("player_id").type == pa.string() and not schema.field("player_id").nullable
+    assert schema.field("goals").type == pa.int64() and schema.field("goals").nullable
+    assert schema.field("xg").type == pa.float64()
+    assert arrow_schema(Match, exclude=("competition", "season")).field("date").type == pa.date32()
+
+def test_export_partitions(sqlite_db: BasicDatabase, tmp_path):
+    written = ParquetExporter(sqlite_db, str(tmp_path)).export()
+    assert written == {MATCHES_TABLE_NAME: 3, PLAYER_STATS_TABLE_NAME: 3, PARSER_TECH_TABLE_NAME: 3}
+    assert (tmp_path / "player_stats" / "competition=La%20Liga" / "season=2023-2024" / "part-0.parquet").exists()
+
+    season = read_season(str(tmp_path), PLAYER_STATS_TABLE_NAME, "Premier League", "2023-2024")
+    assert season.num_rows == 6
+    assert set(season.column("season").to_pylist()) == {"2023-2024"}
+    assert season.column("goals").type == pa.int64()
+    matches = read_season(str(tmp_path), MATCHES_TABLE_NAME, "La Liga", "2023-2024", columns=["match_id", "date"])
+    assert matches.column("date").to_pylist() == [datetime.date(2023, 9, d) for d in (1, 2, 3)]
+    assert open_dataset(str(tmp_path), PARSER_TECH_TABLE_NAME).count_rows() == 18
+
+def test_export_writes_only_new_and_changed_partitions(sqlite_db: BasicDatabase, tmp_path):
+    exporter = ParquetExporter(sqlite_db, str(tmp_path))
+    exporter.export()
+    assert exporter.export() == {MATCHES_TABLE_NAME: 0, PLAYER_STATS_TABLE_NAME: 0, PARSER_TECH_TABLE_NAME: 0}
+    # a new season and one more match in a current one
+    insert_season(sqlite_db, "Serie A", "2023-2024", 2)
+    insert_season(sqlite_db, "La Liga", "2023-2024", 1, start=3)
+    assert ParquetExporter(sqlite_db, str(tmp_path)).export([MATCHES_TABLE_NAME]) == {MATCHES_TABLE_NAME: 2}
+    assert read_season(str(tmp_path), MATCHES_TABLE_NAME, "La Liga", "2023-2024").num_rows == 4
+    assert open_dataset(str(tmp_path), MATCHES_TABLE_NAME).count_rows() == 3 + 3 + 4 + 2
+
+def test_unchanged_partitions_are_not_read(sqlite_db: BasicDatabase, tmp_path):
+    exporter = ParquetExporter(sqlite_db, str(tmp_path))
+    exporter.export()
+    sqlite_db.get_custom_query = MagicMock(wraps=sqlite_db.get_custom_query)
+    assert exporter.export() == {MATCHES_TABLE_NAME: 0, PLAYER_STATS_TABLE_NAME: 0, PARSER_TECH_TABLE_NAME: 0}
+    # one grouped query per table
+    assert sqlite_db.get_custom_query.call_count == 3
+
+def test_export_rows_without_match(sqlite_db: BasicDatabase, tmp_path):
+    schedule = ParserTech(url="schedule url", parse_date=datetime.datetime(2024, 1, 1), parse_type="match")
+    batch = RecordBatch.from_models(ParserTech, [schedule])
+    sqlite_db.insert_to_db(PARSER_TECH_TABLE_NAME, batch.columns, batch)
+    assert ParquetExporter(sqlite_db, str(tmp_path)).export([PARSER_TECH_TABLE_NAME]) == {PARSER_TECH_TABLE_NAME: 4}
+    rows = open_dataset(str(tmp_path), PARSER_TECH_TABLE_NAME).to_table(columns=["url", "competition", "season"]).to_pylist()
+    assert {"url": "schedule url", "competition": None, "season": None} in rows and len(rows) == 19
+
+def test_force_rewrites_corrected_partitions(tmp_path):
+    sqlite_db = BasicDatabase(SQLiteDatabaseConnection(":memory:"), write_mode="upsert")
+    sqlite_db.recreate_db()
+    for competition, season in SEASONS:
+        insert_season(sqlite_db, competition, season, 3)
+    exporter = ParquetExporter(sqlite_db, str(tmp_path))
+    exporter.export()
+    # an upsert corrects a row in place, the row count and ids stay the same
+    corrected = PlayerStats(match_id="La20230", team="A", player="player 1", player_id="p1", goals=3, xg=0.1)
+    batch = RecordBatch.from_models(PlayerStats, [corrected])
+    sqlite_db.insert_to_db(PLAYER_STATS_TABLE_NAME, batch.columns, batch)
+    assert exporter.export() == {MATCHES_TABLE_NAME: 0, PLAYER_STATS_TABLE_NAME: 0, PARSER_TECH_TABLE_NAME: 0}
+    assert exporter.export(force=True) == {MATCHES_TABLE_NAME: 3, PLAYER_STATS_TABLE_NAME: 3, PARSER_TECH_TABLE_NAME: 3}
+    season = read_season(str(tmp_path), PLAYER_STATS_TABLE_NAME, "La Liga", "2023-2024", columns=["goals"])
+    assert sorted(season.column("goals").to_pylist()) == [0, 0, 0, 1, 1, 3]
@@ -0,0 +1,72 @@
+import re
+import pytest
+import copy
+import datetime
+from unittest.mock import MagicMock
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.html_engine import PARSER_ENGINES, HtmlParserEngine, get_parser_engine, slice_element, slice_tables, unwrap_commented_tables
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+ENGINE_SETTINGS = [
+    pytest.param(name, pre_slice, id=f"{name}-{'sliced' if pre_slice else 'full'}",
+                 marks=pytest.mark.skipif(not engine.is_available(), reason=f"{name} not installed"))
+    for name, engine in PARSER_ENGINES.items() for pre_slice in (False, True)
+]
+
+@pytest.fixture
+def config():
+    return Config('config.yaml').load_config()
+
+HIDDEN_ROW = ('<tr ><th data-stat="player" data-append-csv="hidden01"><a href="/en/players/hidden01/x">Hidden</a></th>'
+              '<td data-stat="minutes">90</td><td data-stat="score"><a href="/en/matches/hidden01/x">1&ndash;0</a></td></tr>')
+
+def with_commented(html: str, fragment: str) -> str:
+    """ fbref ships some tables inside HTML comments and renders them client side. """
+    return re.sub(r"(<body[^>]*>)", lambda m: f"{m.group(1)}<!-- {fragment} -->", html, count=1)
+
+def make_parser(config: dict, html: str, engine: str, pre_slice: bool) -> Parser:
+    config = copy.deepcopy(config)
+    config["parser"]["engine"] = engine
+    config["parser"]["pre_slice"] = pre_slice
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.return_value = MagicMock(text=html)
+    return Parser(api_consumer, config)
+
+@pytest.mark.parametrize("engine,pre_slice", ENGINE_SETTINGS)
+def test_get_matches_same_on_every_engine(config: dict, engine: str, pre_slice: bool):
+    html = with_commented(load_page(SCHEDULE_PAGE), f'<div id="all_sched"><table><tbody>{HIDDEN_ROW}</tbody></table></div>')
+    expected = make_parser(config, html, "html.parser", False).get_matches("url")
+    assert make_parser(config, html, engine, pre_slice).get_matches("url") == expected
+
+@pytest.mark.parametrize("engine,pre_slice", ENGINE_SETTINGS)
+def test_get_players_stats_same_on_every_engine(config: dict, engine: str, pre_slice: bool):
+    for match_id, html in match_pages().items():
+        html = with_commented(html, '<table id="stats_hidden_summary"><caption>Hidden Player Stats Table</caption>'
+                                    f'<tbody>{HIDDEN_ROW}</tbody></table>')
+        expected = make_parser(config, html, "html.parser", False).get_players_stats(match_id)
+        assert "hidden01" in [p.player_id for p in expected]
+        assert make_parser(config, html, engine, pre_slice).get_players_stats(match_id) == expected
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        get_parser_engine("regex")
+
+def test_missing_engine_falls_back(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(PARSER_ENGINES["lxml"], "is_available", classmethod(lambda cls: False))
+    assert isinstance(get_parser_engine("lxml"), HtmlParserEngine)
+
+def test_slice_tables_finds_commented_tables():
+    html = ('<!-- <div id="a"></div> --><div id="a"><div><table id="stats_1_summary"><tr><td>1</td></tr></table>'
+            '<!-- </div> --></div></div>'
+            '<!-- <table id="stats_1_misc"><tr><td>2</td></tr></table> --><table id="other"></table>'
+            '<!-- <table id="other_2"></table> -->')
+    assert slice_tables(html, lambda t_id: t_id.startswith("stats")) == [
+        '<table id="stats_1_summary"><tr><td>1</td></tr></table>',
+        '<table id="stats_1_misc"><tr><td>2</td></tr></table>']
+    assert unwrap_commented_tables(html, lambda t_id: t_id.startswith("stats")) == html.replace(
+        '<!-- <table id="stats_1_misc"><tr><td>2</td></tr></table> -->', ' <table id="stats_1_misc"><tr><td>2</td></tr></table> ')
+    # only tables are unwrapped, other commented elements stay hidden like in a full parse
+    assert slice_element(html, "a") == ('<div id="a"><div><table id="stats_1_summary"><tr><td>1</td></tr></table>'
+                                        '<!-- </div> --></div></div>')
+    assert slice_element(html, "missing") is None
@@ -0,0 +1,156 @@
+import os
+import datetime
+import multiprocessing
+import pytest
+from unittest.mock import MagicMock
+from Scraper.jobs import JobQueue, QueueWorker
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.models import Match, MatchJob
+from Scraper.api_consumer import APIConsumer
+from Scraper.limiter import RateLimiter
+from Scraper.database import BasicDatabase, AzureDatabase, SQLiteDatabaseConnection
+from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, JOBS_TABLE_NAME, ERROR_MSG_LENGTH
+from tests.fixtures.server import StandInServer, fbref_route
+
+SCHEDULE_PATH = "/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+PRAGMAS = {"journal_mode": "WAL", "busy_timeout": 30000}
+
+class Clock:
+    def __init__(self):
+        self.now = datetime.datetime(2024, 1, 1)
+    def __call__(self) -> datetime.datetime:
+        return self.now
+
+def make_matches(n: int) -> list:
+    return [Match(date=datetime.date(2024, 1, 1), home="A", score="1-0", away="B", match_id=f"m{i}",
+                  season="2023-2024", competition="Premier League") for i in range(n)]
+
+@pytest.fixture
+def config():
+    config = Config('config.yaml').load_config()
+    config["api_consumer"]["transport"] = {"retries": 0}
+    config["api_consumer"]["cache"] = {"enabled": False}
+    config["api_consumer"]["archive"] = {"enabled": False}
+    config["jobs"] = {"lease_seconds": 2, "heartbeat_seconds": 0.5, "claim_size": 3, "idle_timeout": 4, "poll_interval": 0.2}
+    return config
+
+def test_leases(tmp_path):
+    clock = Clock()
+    db = BasicDatabase(SQLiteDatabaseConnection(str(tmp_path / "db.sqlite")))
+    db.recreate_db()
+    queue = JobQueue(db, lease_seconds=60, max_attempts=2, clock=clock)
+    assert queue.enqueue("url", make_matches(6)) == 6 and queue.enqueue("url", make_matches(7)) == 1
+    a = [m.match_id for m in queue.claim("a", 3)]
+    b = [m.match_id for m in queue.claim("b", 3)]
+    assert a == ["m0", "m1", "m2"] and b == ["m3", "m4", "m5"]
+
+    clock.now += datetime.timedelta(seconds=30)
+    queue.heartbeat("b")
+    clock.now += datetime.timedelta(seconds=31)
+    # a stopped sending heartbeats, c takes its jobs and a cannot complete them any more
+    assert [m.match_id for m in queue.claim("c", 4)] == ["m0", "m1", "m2", "m6"]
+    with db.transaction():
+        assert queue.complete("a", a) == []
+        assert queue.complete("c", ["m0", "m1"]) == ["m0", "m1"]
+    # m2 was tried twice (a and c)
+    queue.fail("c", "m2", "HTTPError(500)")
+    queue.release("c")
+    assert queue.counts() == {"done": 2, "failed": 1, "queued": 1, "leased": 3}
+    assert [m.match_id for m in queue.claim("d", 10)] == ["m6"]
+    clock.now += datetime.timedelta(seconds=100)
+    assert [m.match_id for m in queue.claim("e", 10)] == ["m3", "m4", "m5", "m6"]
+    # a second expired lease fails the jobs
+    clock.now += datetime.timedelta(seconds=100)
+    assert queue.claim("f", 10) == []
+    assert queue.counts() == {"done": 2, "failed": 5}
+    assert db.get_custom_query(f"SELECT error_msg, COUNT(*) FROM {JOBS_TABLE_NAME} WHERE status = 'failed' GROUP BY error_msg") \
+        == [("HTTPError(500)", 1), ("lease expired", 4)]
+
+def test_failure_message_fits_its_column():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    queue = JobQueue(db)
+    queue.enqueue("url", make_matches(1))
+    queue.claim("a", 1)
+    queue.fail("a", "m0", "x" * 2 * ERROR_MSG_LENGTH)
+    assert db.get_custom_query(f"SELECT LENGTH(error_msg) FROM {JOBS_TABLE_NAME}") == [(ERROR_MSG_LENGTH,)]
+    azure = AzureDatabase(MagicMock())
+    azure.create_table(MatchJob, JOBS_TABLE_NAME)
+    ddl = azure.cur.execute.call_args.args[0]
+    assert f"error_msg NVARCHAR({ERROR_MSG_LENGTH})" in ddl and "url NVARCHAR(400)" in ddl
+
+def run_worker(config: dict, db_path: str, crash: bool = False) -> None:
+    db = BasicDatabase(SQLiteDatabaseConnection(db_path, PRAGMAS), "upsert")
+    api_consumer = APIConsumer(config, limiter=RateLimiter(rate=1000, capacity=1))
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    queue = JobQueue.from_config(db, config)
+    if crash:
+        # dies holding its leases
+        queue.claim("crashed", 3)
+        os._exit(1)
+    QueueWorker(scraper, queue, config).run()
+
+def test_worker_processes_share_the_queue(tmp_path, config: dict):
+    db_path = str(tmp_path / "db.sqlite")
+    db = BasicDatabase(SQLiteDatabaseConnection(db_path, PRAGMAS), "upsert")
+    db.recreate_db()
+    with StandInServer(fbref_route()) as server:
+        config["parser"]["base_url"] = server.url
+        seeder = QueueWorker(Scraper(Parser(APIConsumer(config), config), db, config), JobQueue.from_config(db, config), config)
+        seeder.seed([server.url + SCHEDULE_PATH])
+        db.execute(f"DELETE FROM {JOBS_TABLE_NAME} WHERE id > 20")
+
+        context = multiprocessing.get_context("fork")
+        crashed = context.Process(target=run_worker, args=(config, db_path, True))
+        crashed.start()
+        crashed.join()
+        workers = [context.Process(target=run_worker, args=(config, db_path)) for _ in range(3)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join(timeout=120)
+        assert [w.exitcode for w in workers] == [0, 0, 0]
+
+    assert db.get_custom_query(f"SELECT status, COUNT(*) FROM {JOBS_TABLE_NAME} GROUP BY status") == [("done", 20)]
+    assert db.get_custom_query(f"SELECT COUNT(*), COUNT(DISTINCT match_id) FROM {MATCHES_TABLE_NAME}") == [(20, 20)]
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {PLAYER_STATS_TABLE_NAME}") == [(20 * 32,)]
+    # the jobs of the crashed worker were taken over after their leases expired
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {JOBS_TABLE_NAME} WHERE attempts = 2") == [(3,)]
+    assert len(db.get_custom_query(f"SELECT DISTINCT worker FROM {JOBS_TABLE_NAME}")) > 1
+
+def test_worker_fails_rejected_match(tmp_path, config: dict):
+    config["jobs"].update({"idle_timeout": 0, "max_attempts": 2})
+    db = BasicDatabase(SQLiteDatabaseConnection(str(tmp_path / "db.sqlite")))
+    db.recreate_db()
+    with StandInServer(fbref_route()) as server:
+        config["parser"]["base_url"] = server.url
+        api_consumer = APIConsumer(config, limiter=RateLimiter(rate=1000, capacity=1))
+        worker = QueueWorker(Scraper(Parser(api_consumer, config), db, config), JobQueue.from_config(db, config), config)
+        worker.seed([server.url + SCHEDULE_PATH])
+        db.execute(f"DELETE FROM {JOBS_TABLE_NAME} WHERE id > 5")
+        rejected = db.get_custom_query(f"SELECT match_id FROM {JOBS_TABLE_NAME} WHERE id = 2")[0][0]
+        db.execute(f"CREATE TRIGGER reject_match BEFORE INSERT ON {MATCHES_TABLE_NAME} WHEN NEW.match_id = '{rejected}' "
+                   f"BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        assert worker.run() == 4
+
+    # the rejected job is tried again and then left failed, the rest of its claims is inserted
+    assert db.get_custom_query(f"SELECT match_id, status, attempts, error_msg FROM {JOBS_TABLE_NAME} WHERE status != 'done'") \
+        == [(rejected, "failed", 2, "IntegrityError('rejected')")]
+    assert db.get_custom_query(f"SELECT COUNT(*) FROM {MATCHES_TABLE_NAME}") == [(4,)]
+
+def test_worker_error_keeps_attempts(tmp_path, config: dict):
+    db = BasicDatabase(SQLiteDatabaseConnection(str(tmp_path / "db.sqlite")))
+    db.recreate_db()
+    queue = JobQueue(db, max_attempts=2)
+    queue.enqueue("url", make_matches(2))
+    worker = QueueWorker(MagicMock(), queue, config, worker_id="a")
+    worker._process = MagicMock(side_effect=RuntimeError("bad page"))
+    for attempts in (1, 2):
+        with pytest.raises(RuntimeError):
+            worker.run()
+        if attempts == 1:
+            assert queue.counts() == {"queued": 2}
+    # jobs crashing every worker are not handed out forever
+    assert db.get_custom_query(f"SELECT status, attempts FROM {JOBS_TABLE_NAME}") == [("failed", 2), ("failed", 2)]
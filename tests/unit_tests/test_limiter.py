@@ -0,0 +1,94 @@
+import pytest
+import threading
+import requests
+from unittest.mock import MagicMock
+from Scraper.limiter import RateLimiter, parse_retry_after
+from Scraper.api_consumer import APIConsumer
+
+class FakeClock:
+    """ Monotonic clock advanced by sleeps and by the test itself. """
+    def __init__(self):
+        self.now = 100.0
+    def __call__(self) -> float:
+        return self.now
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def api_consumer_config():
+    return {"api_consumer": {"requests_limit": 1, "sleep_time": 5, "time_limit": 5}}
+
+def test_first_request_does_not_wait(clock: FakeClock, api_consumer_config: dict):
+    limiter = RateLimiter.from_config(api_consumer_config["api_consumer"], clock=clock, sleep=clock.sleep)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 5
+
+def test_work_is_credited(clock: FakeClock, api_consumer_config: dict):
+    limiter = RateLimiter.from_config(api_consumer_config["api_consumer"], clock=clock, sleep=clock.sleep)
+    limiter.acquire()
+    clock.now += 3  # parsing and db writes
+    assert limiter.acquire() == pytest.approx(2)
+    clock.now += 7
+    assert limiter.acquire() == 0
+    assert limiter.stats.waiting_time == pytest.approx(2)
+    assert limiter.stats.working_time(clock.now) == pytest.approx(10)
+
+def test_burst_up_to_capacity(clock: FakeClock):
+    limiter = RateLimiter(rate=0.1, capacity=3, clock=clock, sleep=clock.sleep)
+    clock.now += 100
+    assert [limiter.acquire() for _ in range(4)] == [0, 0, 0, pytest.approx(10)]
+
+def test_retry_after_lowers_rate(clock: FakeClock):
+    limiter = RateLimiter(rate=1, capacity=1, backoff_factor=0.5, recovery_requests=2, clock=clock, sleep=clock.sleep)
+    limiter.acquire()
+    limiter.penalize(30)
+    assert limiter.rate == 0.5
+    assert limiter.acquire() == pytest.approx(30)
+    assert limiter.acquire() == pytest.approx(2)
+    limiter.record_success()
+    limiter.record_success()
+    assert limiter.rate == 1
+
+def test_rate_not_below_min_rate(clock: FakeClock):
+    limiter = RateLimiter(rate=1, min_rate=0.4, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        limiter.penalize(0)
+    assert limiter.rate == 0.4
+
+def test_shared_between_threads():
+    clock = FakeClock()
+    lock = threading.Lock()
+    limiter = RateLimiter(rate=1, capacity=1, clock=clock, sleep=lambda s: None)
+    delays = []
+    def worker():
+        for _ in range(10):
+            delay = limiter.reserve()
+            with lock:
+                delays.append(delay)
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # clock never moves, so every slot is one second after the previous one
+    assert sorted(delays) == [float(i) for i in range(40)]
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412480 - 60) == 60
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+def test_api_consumer_honours_retry_after(api_consumer_config: dict):
+    transport = MagicMock()
+    transport.get.return_value = MagicMock(status_code=429, headers={"Retry-After": "30"})
+    limiter = MagicMock()
+    api_consumer = APIConsumer(api_consumer_config, transport=transport, limiter=limiter)
+    with pytest.raises(requests.exceptions.HTTPError):
+        api_consumer.call("https://fbref.com/")
+    limiter.acquire.assert_called_once()
+    limiter.penalize.assert_called_once_with(30)
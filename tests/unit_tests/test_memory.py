@@ -0,0 +1,60 @@
+import gc
+import datetime
+import tracemalloc
+from unittest.mock import MagicMock
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+def make_scraper(config: dict) -> Scraper:
+    pages = list(match_pages().values())
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = lambda url: MagicMock(
+        text=load_page(SCHEDULE_PAGE) if url == SCHEDULE_URL else pages[len(url) % len(pages)])
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return Scraper(Parser(api_consumer, config), db, config)
+
+def traced_growth(run, times: int) -> int:
+    """ Bytes still allocated after run was called times more, with the garbage collector off. """
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        run()
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(times):
+            run()
+        return tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+
+def test_parse_trees_are_released():
+    # bs4 trees are reference cycles, without decompose every page stays until a garbage collection (~7MB each)
+    config = Config('config.yaml').load_config()
+    parser = Parser(MagicMock(), config)
+    html = next(iter(match_pages().values()))
+    schedule = load_page(SCHEDULE_PAGE)
+    now = datetime.datetime(2023, 11, 18)
+    assert traced_growth(lambda: parser.parse_players_stats_batch(html, "match", now), 3) < 2 ** 20
+    assert traced_growth(lambda: parser.parse_matches(schedule, SCHEDULE_URL, now), 3) < 2 ** 20
+
+def test_scrape_peak_memory_does_not_grow_with_matches():
+    config = Config('config.yaml').load_config()
+    config["scraper"] = {"mode": "serial", "stream_chunk_size": 3}
+    peaks = []
+    for matches in (3, 12):
+        scraper = make_scraper(config)
+        tracemalloc.start()
+        try:
+            scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=matches)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        assert scraper.matches_added == matches
+    assert peaks[1] < peaks[0] * 1.2
@@ -0,0 +1,85 @@
+import json
+import pickle
+import datetime
+from unittest.mock import MagicMock
+from Scraper.metrics import Metrics
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import RUN_METRICS_TABLE_NAME
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+def test_timers_and_counters():
+    m = Metrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.05, 0.5, 5.0):
+        m.observe("http_request", seconds)
+    m.inc("api_calls", 3)
+    m.inc("http_responses", status=200)
+    with m.timer("db_insert", table="matches"):
+        pass
+    summary = m.summary()
+    assert summary["stages"]["http_request"] == {"count": 4, "seconds": 5.6, "mean_seconds": 1.4,
+                                                 "p50_seconds": 0.1, "p95_seconds": None}
+    assert summary["stages"]["db_insert{table=matches}"]["count"] == 1
+    assert summary["counters"] == {"api_calls": 3, "http_responses{status=200}": 1}
+
+def test_prometheus_text():
+    m = Metrics(buckets=(0.1, 1.0))
+    m.observe("http_request", 0.05)
+    m.observe("http_request", 0.5)
+    m.inc("http_responses", status='5"00')
+    text = m.to_prometheus()
+    assert "# TYPE fda_stage_seconds histogram" in text
+    # buckets are cumulative
+    assert 'fda_stage_seconds_bucket{stage="http_request",le="0.1"} 1' in text
+    assert 'fda_stage_seconds_bucket{stage="http_request",le="1"} 2' in text
+    assert 'fda_stage_seconds_bucket{stage="http_request",le="+Inf"} 2' in text
+    assert 'fda_stage_seconds_count{stage="http_request"} 2' in text
+    assert 'fda_http_responses_total{status="5\\"00"} 1' in text
+
+def test_since_drain_and_pickle():
+    m = Metrics()
+    m.observe("html_parse", 0.2)
+    m.inc("matches_added")
+    snapshot = m.snapshot()
+    m.observe("html_parse", 0.3)
+    delta = m.since(snapshot)
+    assert delta.summary()["stages"]["html_parse"]["count"] == 1 and delta.counters == {}
+    # worker metrics travel back to the main process pickled
+    drained = pickle.loads(pickle.dumps(m.drain()))
+    assert m.timers == {} and drained.timers[("html_parse", ())].count == 2
+    main = Metrics()
+    main.merge(drained)
+    main.merge(drained)
+    assert main.summary()["stages"]["html_parse"]["count"] == 4
+
+def test_scrape_data_records_run_metrics(tmp_path):
+    config = Config('config.yaml').load_config()
+    config["parser"]["engine"] = "html.parser"
+    config["scraper"] = {"mode": "pipeline", "parse_workers": 1, "write_batch_size": 2}
+    config["metrics"] = {"table": True, "directory": str(tmp_path)}
+    pages = list(match_pages().values())
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = lambda url: MagicMock(
+        text=load_page(SCHEDULE_PAGE) if url == SCHEDULE_URL else pages[len(url) % len(pages)])
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    scraper = Scraper(Parser(api_consumer, config), db, config)
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=3)
+
+    rows = db.get_custom_query(f"SELECT name, kind, count, url, run_id FROM {RUN_METRICS_TABLE_NAME}")
+    recorded = {(name, kind): count for name, kind, count, _, _ in rows}
+    # parse_players_stats runs in the worker process
+    assert recorded[("parse_players_stats", "timer")] == 3
+    assert recorded[("parse_matches", "timer")] == 1
+    assert recorded[("write_batch", "timer")] >= 1
+    assert recorded[("matches_added", "counter")] == 3
+    assert {(url, run_id) for _, _, _, url, run_id in rows} == {(SCHEDULE_URL, scraper.run_id)}
+
+    scraper.export_metrics()
+    summary = json.loads((tmp_path / f"run_{scraper.run_id}.json").read_text())
+    assert summary["matches_added"] == 3 and summary["stages"]["validate"]["count"] == 3
+    assert "fda_stage_seconds_count" in (tmp_path / "scraper.prom").read_text()
@@ -0,0 +1,68 @@
+import pytest
+import datetime
+from unittest.mock import MagicMock
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.models import PlayerStats
+from Scraper.constants import PARSER_TECH_TABLE_NAME
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+@pytest.fixture
+def config():
+    return Config('config.yaml').load_config()
+
+@pytest.fixture
+def saved_match():
+    return next(iter(match_pages().items()))
+
+def make_parser(config: dict, html: str) -> Parser:
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime.now())
+    api_consumer.call.return_value = MagicMock(text=html)
+    return Parser(api_consumer, config)
+
+def test_get_players_stats(config: dict, saved_match: tuple):
+    match_id, html = saved_match
+    parser = make_parser(config, html)
+    players = parser.get_players_stats(match_id)
+
+    assert len(players) == 32
+    assert len({p.player_id for p in players}) == len(players)
+    assert {p.team for p in players} and all(p.match_id == match_id for p in players)
+    # stats coming from tables other than summary are merged in
+    assert all(p.passes_progressive_distance is not None and p.fouled is not None for p in players)
+    assert parser.player_stats_processed == len(players)
+
+def test_get_players_stats_inserts_parser_tech(config: dict, saved_match: tuple):
+    match_id, html = saved_match
+    config["parser"]["audit"] = "full"
+    parser = make_parser(config, html)
+    db = MagicMock()
+    players = parser.get_players_stats(match_id, db=db)
+    table, cols, values = db.insert_to_db.call_args.args
+    assert table == PARSER_TECH_TABLE_NAME
+    assert len(values) == len(players)
+
+def test_get_matches(config: dict):
+    parser = make_parser(config, load_page(SCHEDULE_PAGE))
+    matches = parser.get_matches("https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures")
+    assert len(matches) == 120
+    assert len({m.match_id for m in matches}) == len(matches)
+    assert matches[0].season == "2023-2024"
+    assert matches[0].competition == "Premier League"
+
+def test_iter_matches_yields_while_reading(config: dict):
+    config["parser"]["audit"] = "full"
+    parser = make_parser(config, load_page(SCHEDULE_PAGE))
+    db = MagicMock()
+    matches = parser.iter_matches("https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures", db=db)
+    first = next(matches)
+    # the first match comes before the rest of the schedule is read
+    assert parser.match_processed == 1 and not db.insert_to_db.called
+    matches.close()
+    # parser_tech rows of the matches read are logged once reading stops
+    table, cols, values = db.insert_to_db.call_args.args
+    assert table == PARSER_TECH_TABLE_NAME and len(values) == 1 and values[0][cols.index("match_id")] == first.match_id
+
+def test_get_competition(config: dict):
+    parser = make_parser(config, load_page(SCHEDULE_PAGE))
+    assert parser.get_competition("https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures") == "Premier League"
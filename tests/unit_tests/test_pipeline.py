@@ -0,0 +1,91 @@
+import pytest
+import datetime
+import requests
+from unittest.mock import MagicMock
+from Scraper.scraper import Scraper
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.checkpoints import CheckpointStore
+from Scraper.errors import CircuitOpenException
+from Scraper.constants import (MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME, PARSER_TECH_TABLE_NAME, DEAD_LETTERS_TABLE_NAME,
+                               CHECKPOINTS_TABLE_NAME)
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+@pytest.fixture
+def config():
+    config = Config('config.yaml').load_config()
+    config["parser"]["engine"] = "html.parser"
+    return config
+
+def make_scraper(config: dict, mode: str, parse_workers: int = 2, fail_on: str = None,
+                 error: Exception = requests.exceptions.HTTPError(500)) -> Scraper:
+    pages = list(match_pages().values())
+    def call(url):
+        if url == SCHEDULE_URL:
+            return MagicMock(text=load_page(SCHEDULE_PAGE))
+        if fail_on and url.endswith(fail_on):
+            raise error
+        # every match of the schedule is served by one of the saved match pages
+        return MagicMock(text=pages[sum(map(ord, url)) % len(pages)])
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = call
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    config = {**config, "scraper": {"mode": mode, "parse_workers": parse_workers, "queue_size": 2, "write_batch_size": 3}}
+    return Scraper(Parser(api_consumer, config), db, config)
+
+def table_content(db: BasicDatabase, table: str) -> list:
+    # ids depend on insert order of batches, compare content only
+    return sorted((row[1:] for row in db.get_custom_query(f"SELECT * FROM {table}")), key=repr)
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_pipeline_same_as_serial(config: dict, parse_workers: int):
+    serial = make_scraper(config, "serial")
+    serial.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=7)
+    pipeline = make_scraper(config, "pipeline", parse_workers)
+    pipeline.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=7)
+
+    assert pipeline.matches_added == serial.matches_added == 7
+    assert pipeline.players_stats_added == serial.players_stats_added == 7 * 32
+    assert pipeline.parser.player_stats_processed == serial.parser.player_stats_processed
+    for table in [MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME]:
+        assert table_content(pipeline.db, table) == table_content(serial.db, table)
+    assert len(table_content(pipeline.db, PARSER_TECH_TABLE_NAME)) == len(table_content(serial.db, PARSER_TECH_TABLE_NAME))
+
+def test_pipeline_keeps_matches_fetched_before_failure(config: dict):
+    matches = make_scraper(config, "serial").parser.get_matches(SCHEDULE_URL)
+    # the website went down
+    scraper = make_scraper(config, "pipeline", fail_on=matches[4].match_id, error=CircuitOpenException("fbref.com", 300))
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=10)
+    assert scraper.matches_added == 4
+    assert len(scraper.db.get_custom_query(f"SELECT * FROM {MATCHES_TABLE_NAME}")) == 4
+    assert scraper.players_stats_added == 4 * 32
+
+def test_pipeline_goes_on_after_failed_match(config: dict):
+    matches = make_scraper(config, "serial").parser.get_matches(SCHEDULE_URL)
+    scraper = make_scraper(config, "pipeline", fail_on=matches[4].match_id)
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=10)
+    assert scraper.matches_added == 9 and scraper.matches_failed == 1
+    assert scraper.db.get_custom_query(f"SELECT match_id, error_class FROM {DEAD_LETTERS_TABLE_NAME}") == [
+        (matches[4].match_id, "HTTPError")]
+
+def test_pipeline_isolates_rejected_insert(config: dict):
+    matches = make_scraper(config, "serial").parser.get_matches(SCHEDULE_URL)
+    scraper = make_scraper(config, "pipeline", parse_workers=0)
+    scraper.checkpoints = CheckpointStore(scraper.db)
+    rejected = matches[1].match_id
+    scraper.db.execute(f"CREATE TRIGGER reject BEFORE INSERT ON {MATCHES_TABLE_NAME} WHEN NEW.match_id = '{rejected}' "
+                       f"BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=7)
+
+    # the other matches of its batch of 3 are inserted
+    assert scraper.matches_added == 6 and scraper.matches_failed == 1
+    assert sorted(r[0] for r in scraper.db.get_custom_query(f"SELECT match_id FROM {MATCHES_TABLE_NAME}")) == sorted(
+        m.match_id for m in matches[:7] if m.match_id != rejected)
+    assert scraper.db.get_custom_query(f"SELECT COUNT(DISTINCT match_id) FROM {PLAYER_STATS_TABLE_NAME}") == [(6,)]
+    assert scraper.db.get_custom_query(f"SELECT match_id, error_msg FROM {DEAD_LETTERS_TABLE_NAME}") == [(rejected, "rejected")]
+    # marked failed, so the competition is finished
+    assert scraper.db.get_custom_query(f"SELECT COUNT(*) FROM {CHECKPOINTS_TABLE_NAME}") == [(0,)]
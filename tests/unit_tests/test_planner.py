@@ -0,0 +1,92 @@
+import datetime
+import pytest
+from unittest.mock import MagicMock
+from Scraper.planner import BackfillPlanner, season_url
+from Scraper.models import Match
+from Scraper.records import RecordBatch
+from Scraper.errors import NoScoreAndFixturesInUrlException
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import MATCHES_TABLE_NAME, PRIORITY_CURRENT, PRIORITY_RECENT, PRIORITY_HISTORIC
+
+PL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+CL = "https://fbref.com/en/comps/8/schedule/Champions-League-Scores-and-Fixtures"
+ECL = "https://fbref.com/en/comps/882/schedule/Europa-Conference-League-Scores-and-Fixtures"
+TODAY = datetime.date(2023, 11, 18)
+
+@pytest.fixture
+def config():
+    return {"api_consumer": {"requests_limit": 1, "time_limit": 5, "sleep_time": 5},
+            "planner": {"seasons": 4, "recent_seasons": 1, "season_start_month": 7, "season_days": 300,
+                        "default_matches_per_season": 10, "competition_names": {"premier-league": "Premier League"}},
+            "competitions": {"premier-league": PL, "champions-league": CL}}
+
+@pytest.fixture
+def parser():
+    parser = MagicMock()
+    parser.get_competition.side_effect = lambda url: {CL: "Champions League", ECL: "Conference League"}[url]
+    return parser
+
+@pytest.fixture
+def db():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return db
+
+def insert_matches(db: BasicDatabase, competition: str, season: str, n: int) -> None:
+    rows = RecordBatch.from_models(Match, [Match(date=datetime.date(2023, 1, 1), home="A", score="1-0", away="B",
+                                                 match_id=f"{competition[:2]}{season}{i}", season=season,
+                                                 competition=competition) for i in range(n)])
+    db.insert_to_db(MATCHES_TABLE_NAME, rows.columns, rows)
+
+def test_season_urls():
+    assert season_url(PL, "2021-2022") == \
+        "https://fbref.com/en/comps/9/2021-2022/schedule/2021-2022-Premier-League-Scores-and-Fixtures"
+    assert season_url(season_url(PL, "2021-2022")) == PL
+    with pytest.raises(NoScoreAndFixturesInUrlException):
+        season_url("https://fbref.com/en/comps/9/Premier-League-Stats")
+
+def test_plan_estimates_missing_matches(db: BasicDatabase, config: dict, parser: MagicMock):
+    insert_matches(db, "Premier League", "2022-2023", 12)
+    insert_matches(db, "Premier League", "2021-2022", 5)
+    insert_matches(db, "Premier League", "2023-2024", 2)
+    planner = BackfillPlanner(db, config, parser, today=TODAY)
+    items = planner.plan([PL, CL])
+
+    plan = [(i.priority, i.season, i.competition, i.matches_expected, i.matches_in_db, i.requests) for i in items]
+    # 12 matches in a full Premier League season, 140 of 300 days of the current one passed
+    assert plan == [(PRIORITY_CURRENT, "2023-2024", "Premier League", 6, 2, 5),
+                    (PRIORITY_CURRENT, "2023-2024", "Champions League", 5, 0, 6),
+                    (PRIORITY_RECENT, "2022-2023", "Champions League", 10, 0, 11),
+                    (PRIORITY_HISTORIC, "2021-2022", "Premier League", 12, 5, 8),
+                    (PRIORITY_HISTORIC, "2021-2022", "Champions League", 10, 0, 11),
+                    (PRIORITY_HISTORIC, "2020-2021", "Premier League", 12, 0, 13),
+                    (PRIORITY_HISTORIC, "2020-2021", "Champions League", 10, 0, 11)]
+    assert items[0].url == PL and items[3].url == season_url(PL, "2021-2022")
+    assert items[3].seconds == 40
+    assert planner.describe(items).endswith("7 seasons, 58 matches, 65 requests, 0h 06m at 5s per request")
+
+def test_competition_names(db: BasicDatabase, config: dict, parser: MagicMock):
+    # the slug of the Conference League url has an extra segment, the name comes from its schedule page
+    insert_matches(db, "Conference League", "2022-2023", 3)
+    planner = BackfillPlanner(db, config, parser, today=TODAY)
+    items = planner.plan([PL, season_url(ECL, "2022-2023")], seasons=2)
+
+    assert [(i.competition, i.season, i.matches_in_db) for i in items] == [
+        ("Premier League", "2023-2024", 0), ("Conference League", "2023-2024", 0), ("Premier League", "2022-2023", 0)]
+    # configured names don't cost a request, the others one per competition
+    parser.get_competition.assert_called_once_with(ECL)
+    with pytest.raises(ValueError):
+        BackfillPlanner(db, config, today=TODAY).plan([ECL])
+
+def test_historic_seasons_fill_the_budget(db: BasicDatabase, config: dict):
+    planner = BackfillPlanner(db, config, today=TODAY)
+    items = planner.plan([PL], seasons=4)
+    scraper = MagicMock()
+    now = [0.0]
+    scraper.scrape_data.side_effect = lambda url, limit: now.__setitem__(0, now[0] + 5 * (1 + (limit or 10)))
+
+    # current and recent season take 110s, 20s left for the historic ones
+    scraped = planner.run(scraper, items, budget_seconds=130, clock=lambda: now[0])
+    assert [i.season for i in scraped] == ["2023-2024", "2022-2023", "2021-2022"]
+    assert [c.args for c in scraper.scrape_data.call_args_list] == [
+        (PL, None), (season_url(PL, "2022-2023"), None), (season_url(PL, "2021-2022"), 3)]
@@ -0,0 +1,60 @@
+import pstats
+import datetime
+import tracemalloc
+from unittest.mock import MagicMock
+from Scraper.scraper import Scraper
+from Scraper.crawler import CrawlOrchestrator
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from tests.fixtures import load_page, match_pages, SCHEDULE_PAGE
+
+SCHEDULE_URL = "https://fbref.com/en/comps/9/schedule/Premier-League-Scores-and-Fixtures"
+
+def make_scraper(config: dict) -> Scraper:
+    pages = list(match_pages().values())
+    api_consumer = MagicMock(last_api_call_data=datetime.datetime(2023, 11, 18))
+    api_consumer.call.side_effect = lambda url: MagicMock(
+        text=load_page(SCHEDULE_PAGE) if url == SCHEDULE_URL else pages[len(url) % len(pages)])
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    return Scraper(Parser(api_consumer, config), db, config)
+
+def test_profiling_off_by_default():
+    config = Config('config.yaml').load_config()
+    assert not config["profiling"]["enabled"]
+    assert make_scraper(config).profiler is None
+
+def test_profiling_artifacts(tmp_path):
+    config = Config('config.yaml').load_config()
+    config["scraper"] = {"mode": "serial"}
+    config["profiling"] = {"enabled": True, "directory": str(tmp_path), "memory_every": 1, "sample_interval": 0.01}
+    scraper = make_scraper(config)
+    scraper.scrape_data(SCHEDULE_URL, number_of_matches_to_scrape=1)
+    scraper.profiler.close()
+    assert not tracemalloc.is_tracing()
+
+    run_dir = tmp_path / scraper.run_id
+    name = "Premier-League-Scores-and-Fixtures"
+    stats = pstats.Stats(str(run_dir / f"cprofile_{name}.prof"))
+    assert any(func[2] == "parse_players_stats_batch" for func in stats.stats)
+    assert "cumulative" in (run_dir / f"cprofile_{name}.txt").read_text()
+    memory = sorted(p.name for p in run_dir.glob("memory_*.txt"))
+    assert memory == [f"memory_001_after_get_matches_{name}.txt", "memory_002_flush_1.txt", f"memory_003_end_{name}.txt"]
+    assert "growth since the previous snapshot" in (run_dir / memory[-1]).read_text()
+    stacks = (run_dir / f"stacks_{name}.folded").read_text().splitlines()
+    assert stacks and all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+def test_crawler_profiles_every_competition(tmp_path):
+    config = Config('config.yaml').load_config()
+    config["profiling"] = {"enabled": True, "directory": str(tmp_path), "memory_every": 0, "sample_interval": 0.01}
+    config["crawler"] = {"fetch_concurrency": 2, "parse_workers": 0, "write_batch_size": 2}
+    scraper = make_scraper(config)
+    CrawlOrchestrator(scraper, config).run([SCHEDULE_URL], number_of_matches_to_scrape=2)
+    scraper.profiler.close()
+
+    run_dir = tmp_path / scraper.run_id
+    stats = pstats.Stats(str(run_dir / "cprofile_Premier-League-Scores-and-Fixtures.prof"))
+    assert {"parse_matches", "parse_players_stats_batch"} <= {func[2] for func in stats.stats}
+    assert any(func[2] == "insert_to_db" for func in pstats.Stats(str(run_dir / "cprofile_crawl_writes.prof")).stats)
+    assert (run_dir / "stacks_crawl.folded").exists()
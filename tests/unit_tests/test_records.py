@@ -0,0 +1,84 @@
+import pytest
+import pickle
+import datetime
+from pydantic import ValidationError
+from Scraper.records import RecordBatch, schema_for
+from Scraper.models import PlayerStats, ParserTech
+from Scraper.parser import Parser
+from Scraper.config import Config
+from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
+from Scraper.constants import PLAYER_STATS_TABLE_NAME
+from tests.fixtures import match_pages
+
+PLAYER = {"match_id": "1", "team": "TeamA", "player": "player_a", "player_id": "p1"}
+
+@pytest.fixture
+def config():
+    return Config('config.yaml').load_config()
+
+@pytest.fixture
+def saved_match():
+    return next(iter(match_pages().items()))
+
+def test_schema_compiled_once():
+    assert schema_for(PlayerStats) is schema_for(PlayerStats)
+    assert list(schema_for(PlayerStats).columns) == list(PlayerStats.get_empty_dict().keys())
+
+@pytest.mark.parametrize("field,value", [
+    ("goals", "3"), ("goals", "3.0"), ("goals", "3.5"), ("goals", "1,234"), ("goals", ""), ("goals", "1e3"),
+    ("goals", None), ("xg", "0.3"), ("xg", "1,2"), ("player", None), ("player", 3),
+])
+def test_coerce_same_as_model_validation(field: str, value):
+    schema = schema_for(PlayerStats)
+    try:
+        expected = tuple(PlayerStats(**{**PLAYER, field: value}).__dict__.values())
+    except ValidationError:
+        expected = "invalid"
+    try:
+        row = schema.coerce({**PLAYER, field: value})
+    except ValidationError:
+        row = "invalid"
+    assert row == expected
+
+def test_batch_rows_and_models(config: dict, saved_match: tuple):
+    match_id, html = saved_match
+    config["parser"]["audit"] = "full"
+    batch, parser_tech = Parser(None, config).parse_players_stats_batch(html, match_id, datetime.datetime.now())
+    assert len(batch) == len(parser_tech) == 32
+    models = batch.to_models()
+    # rows carry the same values full validation gives
+    assert [PlayerStats(**m.__dict__) for m in models] == models
+    assert list(batch)[0] == schema_for(PlayerStats).to_row(models[0])
+    assert batch.column("player_id") == [m.player_id for m in models]
+    assert list(batch[2:4]) == list(batch)[2:4]
+    assert list(pickle.loads(pickle.dumps(batch))) == list(batch)
+
+def test_invalid_row_logged_to_parser_tech(config: dict, saved_match: tuple):
+    match_id, html = saved_match
+    config["parser"]["audit"] = "compact"
+    parser = Parser(None, config)
+    index_table = parser._index_table
+    broken = []
+    def broken_index(table):
+        index = index_table(table)
+        broken.append(broken[0] if broken else next(iter(index)))
+        if broken[0] in index:
+            index[broken[0]]["goals"] = "n/a"
+        return index
+    parser._index_table = broken_index
+    batch, parser_tech = parser.parse_players_stats_batch(html, match_id, datetime.datetime.now())
+    # compact audit: the invalid player and a summary of the page
+    errors, summary = parser_tech
+    assert len(batch) == 31
+    assert errors.player_id == broken[0] and "n/a" in errors.error_msg
+    assert (summary.match_id, summary.row_count, summary.error_count, summary.status) == (match_id, 32, 1, "invalid_rows")
+    assert broken[0] not in batch.column("player_id")
+
+def test_insert_record_batch():
+    db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    db.recreate_db()
+    batch = RecordBatch(PlayerStats)
+    batch.append_values({**PLAYER, "goals": "2"})
+    batch.append_values({**PLAYER, "player_id": "p2", "xg": "0.4"})
+    db.insert_to_db(PLAYER_STATS_TABLE_NAME, batch.columns, batch)
+    assert db.get_custom_query(f"SELECT player_id, goals, xg FROM {PLAYER_STATS_TABLE_NAME}") == [("p1", 2, None), ("p2", None, 0.4)]
@@ -62,7 +62,7 @@ def players_mock_data():
 def test_scrape_data(mock_parser: MagicMock, mock_database: MagicMock, config: MagicMock, matches_mock_data: list, players_mock_data: list):
     scraper = Scraper(mock_parser, mock_database)
     mock_database.check_matches_not_in_db.return_value = matches_mock_data
-    mock_parser.get_matches.return_value = matches_mock_data
+    mock_parser.iter_matches.side_effect = lambda url, **kwargs: (m for m in matches_mock_data)
     mock_parser.get_players_stats = MagicMock(side_effect=lambda m, **kwargs: [p for p in players_mock_data if p.match_id == m])
     scraper.scrape_data(config["integration_tests"]["data_test_url"])
 
@@ -76,7 +76,7 @@ def test_scrape_data(mock_parser: MagicMock, mock_database: MagicMock, config: M
 def test_scrape_data_with_number_of_matches_to_scrape(mock_database: MagicMock, mock_parser: MagicMock, config: MagicMock, matches_mock_data: list, players_mock_data: list):
     scraper = Scraper(mock_parser, mock_database)
     mock_database.check_matches_not_in_db.return_value = matches_mock_data
-    mock_parser.get_matches.return_value = matches_mock_data
+    mock_parser.iter_matches.side_effect = lambda url, **kwargs: (m for m in matches_mock_data)
     mock_parser.get_players_stats.return_value = players_mock_data
     scraper.scrape_data(config["integration_tests"]["data_test_url"], number_of_matches_to_scrape=1)
     assert scraper.matches_added == 1
@@ -97,4 +97,14 @@ def test_scrape_data_with_recreate_db(mock_parser: MagicMock):
     columns = [x[0] for x in sqlite_db.cur.fetchall()]
     assert MATCHES_TABLE_NAME in columns
     assert PLAYER_STATS_TABLE_NAME in columns
-    assert PARSER_TECH_TABLE_NAME in columns
\ No newline at end of file
+    assert PARSER_TECH_TABLE_NAME in columns
+def test_scrape_data_updates_aggregates(mock_parser: MagicMock, config: dict, matches_mock_data: list, players_mock_data: list):
+    sqlite_db = BasicDatabase(SQLiteDatabaseConnection(":memory:"))
+    sqlite_db.recreate_db()
+    scraper = Scraper(mock_parser, sqlite_db, {"scraper": {"aggregates": True}})
+    mock_parser.iter_matches.side_effect = lambda url, **kwargs: (m for m in matches_mock_data)
+    mock_parser.get_players_stats = MagicMock(side_effect=lambda m, **kwargs: [p for p in players_mock_data if p.match_id == m])
+    scraper.scrape_data(config["integration_tests"]["data_test_url"])
+    assert scraper.inserted_match_ids == ["123", "124", "125"]
+    players = {p.player_id: p.matches for p in scraper.aggregates.player_season("Example League", "2023-2024")}
+    assert players == {"1": 2, "2": 1, "3": 1}
@@ -1,4 +1,6 @@
 import pytest
+import sqlite3
+from unittest.mock import MagicMock
 from Scraper.database import BasicDatabase, SQLiteDatabaseConnection
 from Scraper.models import Match, PlayerStats
 from Scraper.constants import MATCHES_TABLE_NAME, PLAYER_STATS_TABLE_NAME
@@ -42,4 +44,57 @@ def test_insert_to_db(sqlite_db):
     # Check if data is inserted
     sqlite_db.cur.execute("SELECT * FROM matches")
     data = sqlite_db.cur.fetchall()
-    assert data == [(1, "Round 1", None, None, None, None, None, None, None)]
\ No newline at end of file
+    assert data == [(1, "Round 1", None, None, None, None, None, None, None)]
+
+def test_transaction_commits_once(sqlite_db):
+    sqlite_db.create_table(Match, MATCHES_TABLE_NAME)
+    sqlite_db.con = MagicMock(wraps=sqlite_db.con)
+    with sqlite_db.transaction():
+        sqlite_db.insert_to_db("matches", ["round"], [("Round 1",)])
+        with sqlite_db.transaction():
+            sqlite_db.insert_to_db("matches", ["round"], [("Round 2",)])
+        assert sqlite_db.con.commit.call_count == 0
+    assert sqlite_db.con.commit.call_count == 1
+    assert sqlite_db.get_custom_query("SELECT round FROM matches") == [("Round 1",), ("Round 2",)]
+
+def test_transaction_rolls_back_on_error(sqlite_db):
+    sqlite_db.create_table(Match, MATCHES_TABLE_NAME)
+    sqlite_db.insert_to_db("matches", ["round"], [("Round 1",)])
+    with pytest.raises(ValueError):
+        with sqlite_db.transaction():
+            sqlite_db.insert_to_db("matches", ["round"], [("Round 2",)])
+            raise ValueError("players stats failed")
+    assert sqlite_db.get_custom_query("SELECT round FROM matches") == [("Round 1",)]
+    # commits work again after the rollback
+    sqlite_db.insert_to_db("matches", ["round"], [("Round 3",)])
+    assert sqlite_db.get_custom_query("SELECT round FROM matches") == [("Round 1",), ("Round 3",)]
+
+def test_create_indexes_from_models(sqlite_db):
+    sqlite_db.recreate_db()
+    indexes = {row[0] for row in sqlite_db.get_custom_query("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {"uq_matches", "ix_matches_competition_season", "uq_player_stats", "ix_player_stats_player_id",
+            "ix_parser_tech_match_id"} <= indexes
+    # safe to run again on an existing database
+    sqlite_db.create_indexes()
+
+def test_insert_duplicated_key_fails(sqlite_db):
+    sqlite_db.recreate_db()
+    sqlite_db.insert_to_db("player_stats", ["match_id", "team", "player", "player_id"], [("1", "A", "a", "p1")])
+    with pytest.raises(sqlite3.IntegrityError):
+        sqlite_db.insert_to_db("player_stats", ["match_id", "team", "player", "player_id"], [("1", "A", "a", "p1")])
+
+def test_upsert_is_idempotent():
+    sqlite_db = BasicDatabase(SQLiteDatabaseConnection(":memory:"), write_mode="upsert")
+    sqlite_db.recreate_db()
+    cols = ["match_id", "team", "player", "player_id", "goals"]
+    sqlite_db.insert_to_db("player_stats", cols, [("1", "A", "a", "p1", 0), ("1", "A", "b", "p2", 1)])
+    sqlite_db.insert_to_db("player_stats", cols, [("1", "A", "a", "p1", 2), ("1", "A", "b", "p2", 1)])
+    assert sqlite_db.get_custom_query("SELECT player_id, goals FROM player_stats ORDER BY player_id") == [("p1", 2), ("p2", 1)]
+    # tables without unique key keep every row
+    tech_cols = ["match_id", "parse_date", "parse_type"]
+    sqlite_db.insert_to_db("parser_tech", tech_cols, [("1", "2024-01-01", "match")] * 2)
+    assert sqlite_db.get_custom_query("SELECT COUNT(*) FROM parser_tech") == [(2,)]
+
+def test_unknown_write_mode():
+    with pytest.raises(ValueError):
+        BasicDatabase(SQLiteDatabaseConnection(":memory:"), write_mode="replace")
@@ -0,0 +1,93 @@
+import pytest
+import requests
+from unittest.mock import MagicMock
+from Scraper.transport import PooledTransport, CircuitBreaker
+from Scraper.api_consumer import APIConsumer
+from Scraper.errors import CircuitOpenException, ResponseTooLargeException
+from tests.fixtures.server import StandInServer
+
+PAGE = ("<html><body>" + "<table><tr><td data-stat='goals'>1</td></tr></table>" * 2000 + "</body></html>").encode()
+
+@pytest.fixture
+def transport_config():
+    return {"timeout": 5, "retries": 0, "backoff_factor": 0, "max_body_size_mb": 1,
+            "circuit_breaker": {"failure_threshold": 2, "reset_timeout": 60}}
+
+@pytest.fixture
+def server():
+    def route(path, headers):
+        if path.startswith("/error"):
+            return 500, {}, b"error"
+        if path.startswith("/missing"):
+            return 404, {}, b"not found"
+        if path.startswith("/busy"):
+            return 503, {"Retry-After": "1"}, b"busy"
+        if path.startswith("/huge"):
+            return 200, {"Content-Encoding": "identity"}, b"x" * (2 * 1024 * 1024)
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, PAGE
+    with StandInServer(route) as s:
+        yield s
+
+def test_connections_are_reused(server: StandInServer, transport_config: dict):
+    transport = PooledTransport(transport_config)
+    for i in range(3):
+        resp = transport.get(f"{server.url}/en/matches/{i}")
+        assert resp.status_code == 200
+    assert transport.stats.requests == 3
+    assert transport.stats.connections_opened == 1
+    assert transport.stats.connections_reused == 2
+
+def test_compressed_transfer(server: StandInServer, transport_config: dict):
+    transport = PooledTransport(transport_config)
+    resp = transport.get(f"{server.url}/en/matches/1")
+    assert resp.content == PAGE
+    assert "gzip" in resp.request.headers["Accept-Encoding"]
+    assert transport.stats.bytes_decoded == len(PAGE)
+    assert transport.stats.bytes_received < len(PAGE)
+    assert transport.stats.compression_ratio > 1
+
+def test_max_body_size(server: StandInServer, transport_config: dict):
+    transport = PooledTransport(transport_config)
+    with pytest.raises(ResponseTooLargeException):
+        transport.get(f"{server.url}/huge")
+
+def test_circuit_breaker_stops_requests(server: StandInServer, transport_config: dict):
+    transport = PooledTransport(transport_config)
+    for _ in range(2):
+        assert transport.get(f"{server.url}/error").status_code == 500
+    with pytest.raises(CircuitOpenException):
+        transport.get(f"{server.url}/error")
+    assert len(server.requests) == 2
+
+def test_only_transient_errors_are_retried(server: StandInServer, transport_config: dict):
+    transport = PooledTransport({**transport_config, "retries": 2})
+    assert transport.get(f"{server.url}/error").status_code == 500
+    # 404 fails at once, 503 goes back to the limiter without waiting for Retry-After here
+    assert transport.get(f"{server.url}/missing").status_code == 404
+    assert transport.get(f"{server.url}/busy").status_code == 503
+    assert server.requests == ["/error"] * 3 + ["/missing", "/busy"]
+
+def test_circuit_breaker_half_open():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request("fbref.com")
+    now[0] = 11
+    breaker.before_request("fbref.com")  # trial request
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request("fbref.com")
+    breaker.record_success()
+    breaker.before_request("fbref.com")
+    assert not breaker.is_open
+
+def test_api_consumer_uses_injected_transport():
+    transport = MagicMock()
+    transport.get.return_value = MagicMock(status_code=200)
+    config = {"api_consumer": {"requests_limit": 1, "sleep_time": 0, "time_limit": 0}}
+    api_consumer = APIConsumer(config, transport=transport)
+    api_consumer.call("https://fbref.com/")
+    transport.get.assert_called_once_with("https://fbref.com/", None)
+    transport.get.return_value = MagicMock(status_code=404)
+    with pytest.raises(requests.exceptions.HTTPError):
+        api_consumer.call("https://fbref.com/")